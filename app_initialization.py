@@ -1,4 +1,4 @@
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
 import sys
 import os
 from time import sleep
@@ -8,6 +8,7 @@ package_dir = os.path.abspath(os.path.join(current_dir, ".."))
 sys.path.append(package_dir)
 from iso_tp_layer.IsoTpConfig import IsoTpConfig
 from iso_tp_layer.IsoTp import IsoTp
+from iso_tp_layer.AsyncIsoTp import AsyncIsoTp
 from uds_layer.uds_client import UdsClient
 from iso_tp_layer.Address import Address
 from can_layer.can_communication import CANCommunication, CANConfiguration
@@ -15,6 +16,7 @@ from can_layer.enums import CANInterface
 from can_layer.CanExceptions import CANError
 from uds_layer.uds_enums import SessionType
 from uds_layer.server import Server
+from channel_manager import ChannelManager
 
 def init_uds_client(
     client_id: int = 0x33,
@@ -31,7 +33,8 @@ def init_uds_client(
         client_id: Optional ID for the UdsClient. Default is 0x33.
         can_config: Optional CANConfiguration object for CAN settings.
         isotp_config: Optional IsoTpConfig object for ISO-TP layer configuration.
-        filters: Optional list of CAN filters.
+        filters: Optional list of CAN filters. By default the filters are computed from the addresses
+                 registered with the ISO-TP layer (the servers and active sessions) and follow them.
     """
     try:
         # Step 1: Initialize UDS Client
@@ -45,7 +48,9 @@ def init_uds_client(
                 stmin=10,
                 on_recv_success=client.receive_message,
                 on_recv_error=client.on_fail_receive,
-                recv_id=0x55
+                recv_id=0x55,
+                dispatcher_workers=4,
+                deliver_memoryview=True
             )
         isotp_layer = IsoTp(isotp_config)
         client.set_isotp_send(isotp_layer.send)
@@ -64,19 +69,124 @@ def init_uds_client(
         can_comm = CANCommunication(can_config)
 
         # Step 4: Set CAN filters
-        if not filters:
-            filters = [{"can_id": client_id, "can_mask": 0x7FF, "extended": False}]
-        can_comm.set_filters(filters)
+        if filters:
+            can_comm.set_filters(filters)
+        else:
+            # The responses of every server come to the client's ID, so adding or removing a
+            # server does not change the filter
+            isotp_layer.register_address(Address(txid=client_id))
+            isotp_layer.set_on_rx_ids_changed(can_comm.update_rx_filters)
 
         # Step 5: Start receiving CAN messages
         can_comm.start_receiving()
 
         # Step 6: Set send function for ISO-TP layer
         isotp_layer.set_send_fn(can_comm.send_message)
+        isotp_layer.set_bus_load_fn(can_comm.bus_load.get_load)
+        can_comm.add_connection_listener(isotp_layer.on_connection_changed)
+        if can_config.tx_queue_size > 0:
+            isotp_layer.set_send_batch_fn(can_comm.send_batch)
 
         # Return the initialized UDS client
         return client
 
     except CANError as e:
         print(f"CAN operation failed: {e.message}")
-        return None
\ No newline at end of file
+        return None
+
+
+def init_async_isotp(
+    can_config: CANConfiguration,
+    isotp_config: Optional[IsoTpConfig] = None
+) -> Optional[Tuple[AsyncIsoTp, CANCommunication]]:
+    """
+    Initializes an asyncio ISO-TP layer and its CAN communication, receiving on the running event
+    loop. Must be called from a coroutine; the sessions are then driven with AsyncIsoTp.send and
+    AsyncIsoTp.recv from the same loop.
+
+    Args:
+        can_config: CANConfiguration for CAN settings, its recv_callback is set here. A tx_queue_size
+                    greater than 0 keeps the consecutive frames off the loop.
+        isotp_config: Optional IsoTpConfig object for ISO-TP layer configuration.
+
+    Returns the AsyncIsoTp and the CANCommunication (to close them).
+    """
+    try:
+        if not isotp_config:
+            isotp_config = IsoTpConfig(
+                max_block_size=8,
+                timeout=1000,
+                stmin=10,
+                on_recv_success=None,
+                on_recv_error=None,
+                recv_id=0x55,
+                deliver_memoryview=True
+            )
+        async_isotp = AsyncIsoTp(isotp_config)
+        isotp_layer = async_isotp.isotp
+        can_config.recv_callback = async_isotp.recv_can_message
+        can_comm = CANCommunication(can_config)
+
+        isotp_layer.set_on_rx_ids_changed(can_comm.update_rx_filters)
+        isotp_layer.set_send_fn(can_comm.send_message)
+        isotp_layer.set_bus_load_fn(can_comm.bus_load.get_load)
+        can_comm.add_connection_listener(isotp_layer.on_connection_changed)
+        if can_config.tx_queue_size > 0:
+            isotp_layer.set_send_batch_fn(can_comm.send_batch)
+        can_comm.start_receiving_async()
+        return async_isotp, can_comm
+
+    except CANError as e:
+        print(f"CAN operation failed: {e.message}")
+        return None
+
+
+def init_multi_channel_uds_client(
+    channels: Dict[str, CANConfiguration],
+    routes: Dict[int, str],
+    client_id: int = 0x33,
+    isotp_config: Optional[IsoTpConfig] = None
+) -> Optional[Tuple[UdsClient, ChannelManager]]:
+    """
+    Initializes one UDS client driving ECUs on several CAN channels, each channel with its own
+    CAN bus, reception thread and ISO-TP layer, so that the ECUs of different channels are
+    flashed in parallel.
+
+    Args:
+        channels: CANConfiguration of every channel by name, their recv_callback is set here.
+        routes: Channel name of every ECU, by the ECU's CAN ID (the server_can_id of the client).
+        client_id: Optional ID for the UdsClient. Default is 0x33.
+        isotp_config: Optional IsoTpConfig, copied for every channel.
+
+    Returns the UdsClient and the ChannelManager (to close the channels).
+    """
+    manager = None
+    try:
+        client = UdsClient(client_id=client_id)
+        if not isotp_config:
+            isotp_config = IsoTpConfig(
+                max_block_size=8,
+                timeout=1000,
+                stmin=10,
+                on_recv_success=client.receive_message,
+                on_recv_error=client.on_fail_receive,
+                recv_id=0x55,
+                dispatcher_workers=4,
+                deliver_memoryview=True
+            )
+        manager = ChannelManager(isotp_config)
+        for name, can_config in channels.items():
+            channel = manager.add_channel(name, can_config)
+            # The responses of every server come to the client's ID, on every channel
+            channel.isotp.register_address(Address(txid=client_id))
+        for can_id, name in routes.items():
+            manager.route(can_id, name)
+
+        client.set_isotp_send(manager.send)
+        return client, manager
+
+    except CANError as e:
+        print(f"CAN operation failed: {e.message}")
+        if manager is not None:
+            manager.close()
+        return None
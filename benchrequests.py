@@ -0,0 +1,46 @@
+import logging
+import os
+import time
+import sys
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+from logger import Logger, ProtocolType, flush_logs
+from iso_tp_layer.Address import Address
+from iso_tp_layer.send_request.SendRequest import SendRequest
+from iso_tp_layer.recv_request.RecvRequest import RecvRequest
+
+# Micro-benchmark: cost of constructing the per-message request objects and their loggers.
+
+ROUNDS = 2000
+
+
+def legacy_logger(protocol: ProtocolType):
+    """What Logger(protocol) did before the registry: makedirs, clear the handlers and open three files."""
+    log_directory = os.path.join(current_dir, "logs", protocol.value)
+    os.makedirs(log_directory, exist_ok=True)
+    for name, filename in ((f"{protocol.value}_success", "success.log"), (f"{protocol.value}_error", "error.log"),
+                           (f"{protocol.value}_communication", "general_logs.log")):
+        logger = logging.getLogger(f"legacy_{name}")
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
+        logger.addHandler(logging.FileHandler(os.path.join(log_directory, filename)))
+
+
+def bench(label: str, fn):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28}: {elapsed / ROUNDS * 1e6:10.1f} us per object")
+
+
+if __name__ == "__main__":
+    address = Address(txid=0x33, rxid=0x55)
+    bench("legacy Logger()", lambda: legacy_logger(ProtocolType.ISO_TP))
+    bench("Logger() from registry", lambda: Logger(ProtocolType.ISO_TP))
+    bench("SendRequest", lambda: SendRequest(txfn=None, rxfn=None, update_progress=None, on_error=None,
+                                             address=address))
+    bench("RecvRequest", lambda: RecvRequest(address=address, block_size=8, timeout=1000, stmin=0,
+                                             on_success=None, on_error=None, send_frame=None))
+    flush_logs()
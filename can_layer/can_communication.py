@@ -1,5 +1,7 @@
+import asyncio
 import can
-from typing import Callable, List, Dict, Optional
+from typing import Callable, Iterable, List, Dict, Optional, Sequence, Union
+from collections import deque
 import time
 import threading
 import sys
@@ -8,7 +10,15 @@ import os
 current_dir = os.path.dirname(os.path.abspath(__file__))
 package_dir = os.path.abspath(os.path.join(current_dir, ".."))
 sys.path.append(package_dir)
-from can_layer.enums import CANInterface
+from can_layer.enums import CANInterface, CANFrameFormat
+from can_layer.trace import FrameTrace, DIRECTION_RX, DIRECTION_TX
+from can_layer.session_capture import SessionRecorder
+from can_layer.statistics import CANStatistics
+from can_layer.bus_load import BusLoadEstimator
+from can_layer.models import CANConfig, VirtualBusConfig
+from can_layer.virtual_bus import VirtualBus
+from can_layer.tx_queue import TxQueue, wait_until, is_no_buffer_space
+from can_layer.filters import compile_filters
 from can_layer.CanExceptions import (
     CANError,
     CANInitializationError,
@@ -23,7 +33,19 @@ from can_layer.CanExceptions import (
 
 package_dir = os.path.abspath(os.path.join(package_dir, ".."))
 sys.path.append(package_dir)
-from logger import Logger, LogType, ProtocolType
+from logger import get_logger, LogType, ProtocolType
+from metrics import counter
+import tracing
+
+TX_FRAMES = counter("can_tx_frames_total", "CAN frames sent")
+RX_FRAMES = counter("can_rx_frames_total", "CAN frames received")
+TX_BYTES = counter("can_tx_bytes_total", "CAN payload bytes sent")
+RX_BYTES = counter("can_rx_bytes_total", "CAN payload bytes received")
+TX_RETRIES = counter("can_tx_retries_total", "Failed CAN send attempts")
+TX_FAILURES = counter("can_tx_failures_total", "CAN frames given up after all send attempts")
+TX_ENOBUFS = counter("can_tx_enobufs_total", "Send attempts retried because the interface transmit buffer was full")
+RX_ERRORS = counter("can_rx_errors_total", "Errors raised while receiving CAN frames")
+RECONNECTS = counter("can_reconnects_total", "CAN bus reconnections after repeated errors or a bus-off")
 
 
 class CANConfiguration:
@@ -37,7 +59,18 @@ class CANConfiguration:
                  app_name: str = "UDS",
                  fd_flag: bool = False,
                  extended_flag: bool = False,
-                 bitrate: int = 500000):
+                 bitrate: int = 500000,
+                 bitrate_switch: bool = False,
+                 data_bitrate: int = 2000000,
+                 bus_load_window: float = 1.0,
+                 worst_case_stuffing: bool = True,
+                 virtual_config: Optional[VirtualBusConfig] = None,
+                 tx_queue_size: int = 0,
+                 rx_queue_size: int = 16384,
+                 auto_reconnect: bool = False,
+                 reconnect_delay: float = 1.0,
+                 max_reconnect_delay: float = 30.0,
+                 error_threshold: int = 10):
         """
         Initialize CAN configuration.
         
@@ -48,6 +81,19 @@ class CANConfiguration:
             fd_flag: Flag for CAN FD support
             extended_flag: Flag for extended CAN ID support
             bitrate: CAN bus bitrate
+            bitrate_switch: Send CAN FD frames with the data phase at data_bitrate (BRS)
+            data_bitrate: CAN FD data phase bitrate
+            bus_load_window: Sliding window of the bus load estimate in seconds
+            worst_case_stuffing: Estimate the bus load with the maximum number of stuff bits (constant
+                                 cost); False counts the actual stuff bits, which means building the
+                                 frame bits and their CRC for every frame sent and received
+            virtual_config: Timing, loss and latency of the in-process bus used with CANInterface.VIRTUAL
+            tx_queue_size: Frames queued for the transmit writer thread, 0 sends from the caller's thread
+            rx_queue_size: Receive queue of the driver in frames (Vector, a power of 2)
+            auto_reconnect: Reopen the bus after error_threshold consecutive errors or a bus-off
+            reconnect_delay: Delay before the first reconnection attempt in seconds, doubled after each failure
+            max_reconnect_delay: Upper bound of the delay between two reconnection attempts
+            error_threshold: Consecutive send or receive errors after which the bus is reconnected
         """
         self.interface = interface
         self.channel = channel
@@ -55,6 +101,17 @@ class CANConfiguration:
         self.fd_flag = fd_flag
         self.extended_flag = extended_flag
         self.bitrate = bitrate
+        self.bitrate_switch = bitrate_switch
+        self.data_bitrate = data_bitrate
+        self.bus_load_window = bus_load_window
+        self.worst_case_stuffing = worst_case_stuffing
+        self.virtual_config = virtual_config
+        self.tx_queue_size = tx_queue_size
+        self.rx_queue_size = rx_queue_size
+        self.auto_reconnect = auto_reconnect
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.error_threshold = error_threshold
         self.recv_callback = recv_callback
         self.serial_number = serial_number
 
@@ -64,10 +121,49 @@ class CANConfiguration:
             raise CANConfigurationError("Invalid channel number")
         if not isinstance(self.bitrate, int) or self.bitrate <= 0:
             raise CANConfigurationError("Invalid bitrate")
+        if self.fd_flag and (not isinstance(self.data_bitrate, int) or self.data_bitrate <= 0):
+            raise CANConfigurationError("Invalid data bitrate")
+        if not isinstance(self.bus_load_window, (int, float)) or self.bus_load_window <= 0:
+            raise CANConfigurationError("Invalid bus load window")
+        if not isinstance(self.tx_queue_size, int) or self.tx_queue_size < 0:
+            raise CANConfigurationError("Invalid transmit queue size")
+        if not isinstance(self.rx_queue_size, int) or self.rx_queue_size <= 0:
+            raise CANConfigurationError("Invalid receive queue size")
+        if self.reconnect_delay <= 0 or self.max_reconnect_delay < self.reconnect_delay:
+            raise CANConfigurationError("Invalid reconnect delay")
+        if not isinstance(self.error_threshold, int) or self.error_threshold <= 0:
+            raise CANConfigurationError("Invalid error threshold")
         if not isinstance(self.app_name, str) or not self.app_name:
             raise CANConfigurationError("Invalid application name")
 
 
+    @classmethod
+    def from_can_config(cls, config: CANConfig, serial_number, recv_callback: Callable) -> "CANConfiguration":
+        """
+        Build the configuration from a can_layer.models.CANConfig.
+
+        Args:
+            config: Interface, channel, bitrates, frame format and queue sizes
+            serial_number: Serial number of the interface (Vector)
+            recv_callback: Called with every received can.Message
+        """
+        return cls(serial_number=serial_number,
+                   recv_callback=recv_callback,
+                   interface=config.interface,
+                   channel=config.channel,
+                   app_name=config.app_name,
+                   fd_flag=config.fd_flag,
+                   extended_flag=config.frame_format == CANFrameFormat.EXTENDED,
+                   bitrate=config.baud_rate.value,
+                   bitrate_switch=config.bitrate_switch,
+                   data_bitrate=config.data_bitrate,
+                   tx_queue_size=config.tx_queue_size,
+                   rx_queue_size=config.rx_queue_size,
+                   auto_reconnect=config.auto_reconnect,
+                   reconnect_delay=config.reconnect_delay,
+                   error_threshold=config.error_threshold)
+
+
 class CANCommunication:
     """Main class for CAN communication handling."""
 
@@ -79,34 +175,159 @@ class CANCommunication:
             config: CANConfiguration object containing setup parameters
         """
         self.config = config
-        self.logger = Logger(ProtocolType.CAN)
+        self.logger = get_logger(ProtocolType.CAN)
         self.bus = None
+        self._trace: Optional[FrameTrace] = None
+        self._stop_receiving: Optional[threading.Event] = None  # Set to stop the reception thread
+        self._receive_loop: Optional[asyncio.AbstractEventLoop] = None  # Event loop of the asyncio reception
+        self._receive_fileno: Optional[int] = None  # Descriptor watched by the event loop
+        self._notifier: Optional[can.Notifier] = None  # Reception without a descriptor
+        self._receive_task: Optional[asyncio.Task] = None
+        self.statistics = CANStatistics()
+        self.bus_load = BusLoadEstimator(bitrate=config.bitrate,
+                                         data_bitrate=config.data_bitrate if config.fd_flag else None,
+                                         window=config.bus_load_window,
+                                         worst_case_stuffing=config.worst_case_stuffing)
+        self._message_pool = deque()  # Sent can.Message objects, reused for the next frames
+        self._tx_queue: Optional[TxQueue] = None
+        self._filters: Optional[List[Dict]] = None  # Applied again after a reconnection
+        self._consecutive_errors = 0
+        self._connected = threading.Event()  # Cleared while the bus is reconnected
+        self._closed = threading.Event()
+        self._reconnect_lock = threading.Lock()
+        self._reconnect_thread: Optional[threading.Thread] = None
+        self._connection_listeners: List[Callable[[bool], None]] = []
+        self.reconnects = 0
         self._initialize_bus()
+        self._connected.set()
+        if config.tx_queue_size > 0:
+            # With auto_reconnect a failing frame is retried until the error threshold pauses the queue
+            self._tx_queue = TxQueue(transmit=self._transmit, size=config.tx_queue_size,
+                                     on_done=self._release_message, on_failed=self._on_transmit_failed,
+                                     on_retry=self._on_transmit_retry,
+                                     retries=config.error_threshold + 1 if config.auto_reconnect else 3)
 
     def start_receiving(self):
         """
         Start a thread that continuously receives CAN messages with no timeout.
+        The thread stops when the bus is closed.
         """
         if not self.bus:
             raise CANError("CAN bus not initialized")
+        if self._receive_loop is not None:
+            raise CANError("CAN reception already runs on an event loop")
+
+        stop_event = threading.Event()
+        self._stop_receiving = stop_event
+
+        # With auto_reconnect the bus state is checked every second
+        timeout = 1.0 if self.config.auto_reconnect else 900
 
         def _receive_loop():
             self.logger.log_message(log_type=LogType.INITIALIZATION, message="Starting CAN message reception loop")
-            while True:
+            while not stop_event.is_set():
                 try:
-                    self.receive_message(timeout=900)  # Wait indefinitely for messages
+                    if self.receive_message(timeout=timeout) is None and self.config.auto_reconnect:
+                        self._check_bus_state()
                 except Exception as e:
+                    if stop_event.is_set():
+                        break  # The bus was closed while waiting
                     error = CANReceptionError(
                         message="Error during continuous message reception",
                         original_exception=e
                     )
                     self.logger.log_message(log_type=LogType.ERROR, message=f"{error}")
+                    self._on_bus_error()
+            self.logger.log_message(log_type=LogType.ACKNOWLEDGMENT, message="CAN message reception loop stopped")
 
         # Start the thread
         self._receiving_thread = threading.Thread(target=_receive_loop, daemon=True)
         self._receiving_thread.start()
         self.logger.log_message(log_type=LogType.INITIALIZATION, message="CAN reception thread started successfully")
 
+    def start_receiving_async(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """
+        Receive the CAN messages on an asyncio event loop instead of a thread; recv_callback is then
+        called from the loop. Several CANCommunication instances can share one loop.
+
+        When the bus has a file descriptor (SocketCAN), the loop watches it and reads the pending
+        frames without blocking when it becomes readable, no thread is involved. Otherwise a
+        python-can Notifier reads the bus and hands the frames to the loop through an
+        AsyncBufferedReader.
+
+        Args:
+            loop: Event loop to receive on, the running loop if None
+        """
+        if not self.bus:
+            raise CANError("CAN bus not initialized")
+        if self._stop_receiving is not None or self._receive_loop is not None:
+            raise CANError("CAN reception already started")
+        loop = loop or asyncio.get_running_loop()
+
+        try:
+            fileno = self.bus.fileno()
+        except NotImplementedError:
+            fileno = -1
+        if fileno >= 0:
+            loop.add_reader(fileno, self._on_readable)
+            self._receive_fileno = fileno
+            mode = f"descriptor {fileno}"
+        else:
+            reader = can.AsyncBufferedReader()
+            self._notifier = can.Notifier(self.bus, [reader], timeout=0.1, loop=loop)
+            self._receive_task = loop.create_task(self._consume(reader))
+            mode = "notifier"
+        self._receive_loop = loop
+        self.logger.log_message(log_type=LogType.INITIALIZATION,
+                                message=f"CAN reception started on the event loop ({mode})")
+
+    def stop_receiving_async(self):
+        """Stop the reception started by start_receiving_async. Call it from the event loop's thread."""
+        loop, self._receive_loop = self._receive_loop, None
+        if loop is None:
+            return
+        if self._receive_fileno is not None:
+            if not loop.is_closed():
+                loop.remove_reader(self._receive_fileno)
+            self._receive_fileno = None
+        if self._notifier is not None:
+            self._notifier.stop()
+            self._notifier = None
+        if self._receive_task is not None:
+            self._receive_task.cancel()
+            self._receive_task = None
+        self.logger.log_message(log_type=LogType.ACKNOWLEDGMENT, message="CAN reception on the event loop stopped")
+
+    def _on_readable(self, max_frames: int = 256):
+        """Event loop callback: dispatch the frames pending on the bus, at most `max_frames` per call
+        so that the other channels served by the loop get their turn."""
+        bus = self.bus
+        if bus is None:
+            return
+        try:
+            for _ in range(max_frames):
+                message = bus.recv(timeout=0)
+                if message is None:
+                    return
+                self._dispatch(message)
+        except Exception as e:
+            if getattr(bus, "_is_shutdown", False):
+                return
+            RX_ERRORS.inc()
+            self.statistics.error_count += 1
+            self.statistics.last_error_time = time.time()
+            error = CANReceptionError(message="Error receiving message", original_exception=e)
+            self.logger.log_message(log_type=LogType.ERROR, message=f"{error}")
+
+    async def _consume(self, reader: can.AsyncBufferedReader):
+        async for message in reader:
+            try:
+                self._dispatch(message)
+            except Exception as e:
+                RX_ERRORS.inc()
+                error = CANReceptionError(message="Error processing received message", original_exception=e)
+                self.logger.log_message(log_type=LogType.ERROR, message=f"{error}")
+
     def _initialize_bus(self):
         """Initialize the CAN bus with the provided configuration."""
         try:
@@ -116,8 +337,9 @@ class CANCommunication:
                 print("Before")
                 self.bus = can.Bus(
                     interface="socketcan",
-                    channel=f"can0",  # For SocketCAN, use 'can0', 'vcan0', etc.
-                    bitrate=f"{self.config.bitrate}"
+                    channel=f"can{self.config.channel}",  # Channel 0 is can0, 1 is can1...
+                    bitrate=f"{self.config.bitrate}",
+                    fd=self.config.fd_flag
                 )
                 print("After")
             elif self.config.interface == CANInterface.VECTOR:
@@ -127,7 +349,17 @@ class CANCommunication:
                     app_name=self.config.app_name,
                     fd=self.config.fd_flag,
                     bitrate=self.config.bitrate,
-                    serial=self.config.serial_number
+                    data_bitrate=self.config.data_bitrate if self.config.fd_flag else None,
+                    serial=self.config.serial_number,
+                    rx_queue_size=self.config.rx_queue_size
+                )
+            elif self.config.interface == CANInterface.VIRTUAL:
+                self.bus = VirtualBus(
+                    channel=self.config.channel,
+                    bitrate=self.config.bitrate,
+                    data_bitrate=self.config.data_bitrate if self.config.fd_flag else None,
+                    fd=self.config.fd_flag,
+                    config=self.config.virtual_config
                 )
             else:
                 raise CANConfigurationError("Unsupported CAN interface")
@@ -148,6 +380,18 @@ class CANCommunication:
             raise error
 
 
+    def set_trace(self, trace: Optional[Union[FrameTrace, SessionRecorder]]):
+        """
+        Record every sent and received frame in a binary trace.
+
+        Args:
+            trace: FrameTrace (ring of the last frames) or SessionRecorder (whole session, for replay)
+                   to append to, or None to stop tracing
+        """
+        self._trace = trace
+        self.logger.log_message(log_type=LogType.CONFIGURATION,
+                                message=f"Frame trace {'set to ' + trace.path if trace else 'disabled'}")
+
     def set_filters(self, filters: List[Dict]):
         """
         Set message filters for the CAN bus.
@@ -160,6 +404,7 @@ class CANCommunication:
                 raise CANError("CAN bus not initialized")
 
             self.bus.set_filters(filters)
+            self._filters = filters
             self.logger.log_message(log_type=LogType.ACKNOWLEDGMENT, message=f"Filters set successfully: {filters}")
 
         except Exception as e:
@@ -170,6 +415,27 @@ class CANCommunication:
             self.logger.log_message(log_type=LogType.ERROR, message=f"{error}")
             raise error
 
+    def update_rx_filters(self, rx_ids: Iterable[int]):
+        """
+        Set the acceptance filters to the smallest set of id/mask pairs accepting exactly `rx_ids`,
+        so that the other frames are dropped by the controller or the kernel. An empty set removes
+        the filters, python-can has no filter accepting no frame.
+
+        Vector interfaces apply a single filter in hardware, the IDs are then merged into one id/mask
+        pair and the extra IDs it accepts are dropped by python-can.
+
+        Args:
+            rx_ids: Arbitration IDs to receive, e.g. IsoTp.get_rx_ids()
+        """
+        max_filters = 1 if self.config.interface == CANInterface.VECTOR else None
+        try:
+            filters = compile_filters(rx_ids, extended=self.config.extended_flag, max_filters=max_filters)
+        except ValueError as e:
+            error = CANFilterError(message="Failed to compile CAN filters", original_exception=e)
+            self.logger.log_message(log_type=LogType.ERROR, message=f"{error}")
+            raise error
+        self.set_filters(filters)
+
     def send_message(self,
                      arbitration_id: int,
                      data: bytearray,
@@ -190,45 +456,180 @@ class CANCommunication:
         Returns:
             bool: True if message was sent successfully, False otherwise
         """
-        if not self.bus:
+        if not self.bus and self._connected.is_set():
             raise CANError("CAN bus not initialized")
 
-        message = can.Message(
-            arbitration_id=arbitration_id,
-            data=data,
-            is_extended_id=self.config.extended_flag,
-            is_fd=self.config.fd_flag
-        )
-
+        message = self._acquire_message(arbitration_id, data)
+        if self._tx_queue is not None:
+            # The writer thread sends and retries, the caller is not blocked by the interface
+            if self._tx_queue.put(message, timeout=timeout):
+                return True
+            self._release_message(message)
+            TX_FAILURES.inc()
+            self.logger.log_message(log_type=LogType.ERROR,
+                                    message=f"Transmit queue full, message 0x{arbitration_id:X} dropped")
+            return False
+
+        traced = tracing.ENABLED
+        if traced:
+            start = tracing.now()
         attempts_remaining = retries
         while attempts_remaining > 0:
             try:
+                if not self._connected.is_set():
+                    # The bus is being reconnected, wait for it rather than failing right away
+                    self._connected.wait(timeout)
+                bus = self.bus
+                if bus is None:
+                    raise CANError("CAN bus not connected")
                 # Send the message
-                self.bus.send(message)
+                bus.send(message)
+                if traced:
+                    tracing.record_span("can.send", start, arbitration_id=arbitration_id)
+                self._on_sent(message)
                 self.logger.log_message(log_type=LogType.SEND,
-                                        message=f"Message sent: ID=0x{arbitration_id:X}, Data=0x{data.hex().upper()}, "
+                                        message=lambda: f"Message sent: ID=0x{arbitration_id:X}, Data=0x{data.hex().upper()}, "
                                                 f"Attempts remaining: {attempts_remaining}"
                                         )
+                self._release_message(message)
                 return True
 
             except Exception as e:
                 attempts_remaining -= 1
+                TX_RETRIES.inc()
+                self.statistics.error_count += 1
+                self.statistics.last_error_time = time.time()
+                self._on_bus_error()
                 error = CANTransmissionError(
                     message=f"Failed to send message (attempts left: {attempts_remaining})",
                     original_exception=e
                 )
                 self.logger.log_message(log_type=LogType.ERROR, message=f"{error}")
 
-                if attempts_remaining > 0:
+                if attempts_remaining > 0 and self._connected.is_set():
+                    # During a reconnection the next attempt waits for the bus instead
                     time.sleep(retry_delay)
                 continue
 
+        self._release_message(message)
+        TX_FAILURES.inc()
         error = CANAcknowledgmentError(
             message=f"Failed to send message 0x{arbitration_id:X} after all retries"
         )
         self.logger.log_message(log_type=LogType.ERROR, message=f"{error}")
         return False
 
+    def send_batch(self,
+                   arbitration_id: int,
+                   frames: Sequence[bytes],
+                   separation_time: float = 0.0,
+                   initial_separation: float = 0.0,
+                   on_complete: Optional[Callable[[Optional[Exception]], None]] = None,
+                   timeout: float = 1.0) -> bool:
+        """
+        Send frames with the same ID back to back, e.g. a block of ISO-TP consecutive frames.
+
+        With a transmit queue the frames are queued in one call and paced by the writer thread;
+        the payloads are copied, so the caller may reuse its buffers once the call returns.
+        Without a transmit queue they are sent from the caller's thread.
+
+        Args:
+            arbitration_id: CAN message ID
+            frames: Payload of each frame
+            separation_time: Minimum time in seconds between two frames of the batch
+            initial_separation: Minimum time between the previous frame sent and the first one
+            on_complete: Called with None once every frame was sent, or with the error of the
+                         frame given up (the rest of the batch is not sent)
+            timeout: Maximum time to wait for space in the transmit queue
+
+        Returns:
+            bool: False if the frames could not be queued (or sent, without a transmit queue)
+        """
+        if not self.bus and self._connected.is_set():
+            raise CANError("CAN bus not initialized")
+
+        if self._tx_queue is None:
+            deadline = time.perf_counter() + initial_separation
+            for frame in frames:
+                wait_until(deadline)
+                if not self.send_message(arbitration_id, frame, timeout=timeout):
+                    error = CANAcknowledgmentError(message=f"Failed to send message 0x{arbitration_id:X} after all retries")
+                    if on_complete is not None:
+                        on_complete(error)
+                    return False
+                deadline = time.perf_counter() + separation_time
+            if on_complete is not None:
+                on_complete(None)
+            return True
+
+        messages = [self._acquire_message(arbitration_id, frame) for frame in frames]
+        if self._tx_queue.put_batch(messages, separation_time, initial_separation, on_complete, timeout):
+            return True
+        TX_FAILURES.inc()
+        self.logger.log_message(log_type=LogType.ERROR,
+                                message=f"Transmit queue full, batch of {len(messages)} frames 0x{arbitration_id:X} not queued")
+        return False
+
+    def _acquire_message(self, arbitration_id: int, data) -> can.Message:
+        """Return a can.Message carrying a copy of `data`, reusing a sent message when one is free."""
+        try:
+            message = self._message_pool.pop()
+        except IndexError:
+            message = can.Message(is_extended_id=self.config.extended_flag)
+        message.arbitration_id = arbitration_id
+        message.data[:] = data
+        length = len(message.data)
+        message.dlc = length
+        message.is_extended_id = self.config.extended_flag
+        message.is_fd = self.config.fd_flag or length > 8
+        message.bitrate_switch = self.config.fd_flag and self.config.bitrate_switch
+        return message
+
+    def _release_message(self, message: can.Message):
+        if len(self._message_pool) < 64:
+            self._message_pool.append(message)
+
+    def _on_sent(self, message: can.Message):
+        """Bookkeeping of a frame handed to the interface."""
+        self._consecutive_errors = 0
+        if self._trace is not None:
+            self._trace.record_message(DIRECTION_TX, message)
+        length = len(message.data)
+        TX_FRAMES.inc()
+        TX_BYTES.inc(length)
+        self.statistics.tx_count += 1
+        self.statistics.total_bytes_transferred += length
+        self.statistics.last_message_timestamp = time.time()
+        self.statistics.update_bus_load(self.bus_load.add_message(message))
+
+    def _transmit(self, message: can.Message):
+        """Send one frame from the transmit queue writer thread."""
+        bus = self.bus
+        if bus is None:
+            raise CANError("CAN bus not initialized")
+        bus.send(message)
+        self._on_sent(message)
+        self.logger.log_message(log_type=LogType.SEND,
+                                message=lambda: f"Message sent: ID=0x{message.arbitration_id:X}, "
+                                        f"Data=0x{message.data.hex().upper()}")
+
+    def _on_transmit_retry(self, message: can.Message, error: Exception):
+        TX_RETRIES.inc()
+        self.statistics.error_count += 1
+        self.statistics.last_error_time = time.time()
+        if is_no_buffer_space(error):
+            TX_ENOBUFS.inc()  # A full buffer is back pressure, not a bus failure
+        else:
+            self._on_bus_error()
+
+    def _on_transmit_failed(self, message: can.Message, error: Exception):
+        TX_FAILURES.inc()
+        error = CANTransmissionError(
+            message=f"Failed to send message 0x{message.arbitration_id:X} from the transmit queue",
+            original_exception=error
+        )
+        self.logger.log_message(log_type=LogType.ERROR, message=f"{error}")
+
     def receive_message(self, timeout: float = 1.0) -> Optional[can.Message]:
         """
         Receive a CAN message.
@@ -242,24 +643,19 @@ class CANCommunication:
         if not self.bus:
             raise CANError("CAN bus not initialized")
 
+        bus = self.bus
         try:
-            message = self.bus.recv(timeout=timeout)
-            if not message or message.arbitration_id == 0x0 or len(message.data) == 0:
-                return
-            if message:
-                self.logger.log_message(log_type=LogType.RECEIVE,
-                                        message=f"Message received: ID=0x{message.arbitration_id:X}, "
-                                                f"Data=0x{message.data.hex().upper()}")
-
-                self.config.recv_callback(message)
-
-            else:
-                self.logger.log_message(log_type=LogType.WARNING,
-                                        message=
-                                        f"No message received within timeout period ({timeout}s)")
-            return None
+            message = bus.recv(timeout=timeout)
+            if message is None:
+                return None  # Timeout
+            return message if self._dispatch(message) else None
 
         except Exception as e:
+            if getattr(bus, "_is_shutdown", False):
+                return None  # The bus was closed while waiting, not a reception error
+            RX_ERRORS.inc()
+            self.statistics.error_count += 1
+            self.statistics.last_error_time = time.time()
             error = CANReceptionError(
                 message="Error receiving message",
                 original_exception=e
@@ -267,13 +663,49 @@ class CANCommunication:
             self.logger.log_message(log_type=LogType.ERROR, message=f"{error}")
             raise error
 
+    def _dispatch(self, message: can.Message) -> bool:
+        """Account for a received frame and pass it to the receive callback. Return False if it is ignored."""
+        self._consecutive_errors = 0
+        if message.arbitration_id == 0x0 or len(message.data) == 0:
+            return False
+        if self._trace is not None:
+            self._trace.record_message(DIRECTION_RX, message)
+        RX_FRAMES.inc()
+        RX_BYTES.inc(len(message.data))
+        self.statistics.rx_count += 1
+        self.statistics.total_bytes_transferred += len(message.data)
+        self.statistics.last_message_timestamp = message.timestamp
+        if message.is_error_frame:
+            self.statistics.error_frames += 1
+        else:
+            self.statistics.update_bus_load(self.bus_load.add_message(message))
+        if self.logger.is_enabled(LogType.RECEIVE):
+            self.logger.log_message(log_type=LogType.RECEIVE,
+                                    message=f"Message received: ID=0x{message.arbitration_id:X}, "
+                                            f"Data=0x{message.data.hex().upper()}")
+
+        if tracing.ENABLED:
+            # Every received frame starts a transaction, ISO-TP keeps the one of the first frame
+            start = tracing.now()
+            previous = tracing.set_correlation_id(tracing.new_correlation_id())
+            try:
+                self.config.recv_callback(message)
+            finally:
+                tracing.record_span("can.receive", start, arbitration_id=message.arbitration_id)
+                tracing.set_correlation_id(previous)
+        else:
+            self.config.recv_callback(message)
+        return True
+
     def close(self):
         """Close the CAN bus connection."""
         try:
-            if self.bus:
-                self.bus.shutdown()
-                self.logger.log_message(log_type=LogType.ACKNOWLEDGMENT, message="CAN bus shut down successfully")
-                self.bus = None
+            self._closed.set()
+            self._connected.set()  # Releases the senders waiting for a reconnection
+            if self._tx_queue is not None:
+                self._tx_queue.stop()
+                self._tx_queue = None
+            self._shutdown_bus()
 
         except Exception as e:
             error = CANShutdownError(
@@ -283,6 +715,118 @@ class CANCommunication:
             self.logger.log_message(log_type=LogType.ERROR, message=f"{error}")
             raise error
 
+    def _shutdown_bus(self):
+        """Stop the reception and shut the bus down. The transmit queue is kept."""
+        if self._stop_receiving is not None:
+            self._stop_receiving.set()
+            self._stop_receiving = None
+        self.stop_receiving_async()
+        bus, self.bus = self.bus, None
+        if bus:
+            bus.shutdown()
+            self.logger.log_message(log_type=LogType.ACKNOWLEDGMENT, message="CAN bus shut down successfully")
+
+    def add_connection_listener(self, fn: Callable[[bool], None]):
+        """
+        Call `fn(False)` when the bus goes down for a reconnection and `fn(True)` once it is back,
+        e.g. IsoTp.on_connection_changed to keep the ISO-TP sessions from timing out meanwhile.
+        """
+        self._connection_listeners.append(fn)
+
+    def _notify_connection(self, connected: bool):
+        for listener in self._connection_listeners:
+            try:
+                listener(connected)
+            except Exception as e:
+                self.logger.log_message(log_type=LogType.ERROR, message=f"Connection listener failed: {e}")
+
+    def _on_bus_error(self):
+        """Count a send or receive error, reconnect after error_threshold consecutive errors."""
+        self._consecutive_errors += 1
+        if self.config.auto_reconnect and self._consecutive_errors >= self.config.error_threshold:
+            self._start_reconnect(f"{self._consecutive_errors} consecutive errors")
+
+    def _check_bus_state(self):
+        bus = self.bus
+        if bus is not None and getattr(bus, "state", None) == can.BusState.ERROR:
+            self._start_reconnect("bus-off")
+
+    def _start_reconnect(self, reason: str):
+        with self._reconnect_lock:
+            if self._reconnect_thread is not None or self._closed.is_set():
+                return
+            # Senders wait for the new bus from now on, the frame failing in the writer is kept
+            self._connected.clear()
+            if self._tx_queue is not None:
+                self._tx_queue.pause()
+            self._reconnect_thread = threading.Thread(target=self._reconnect, args=(reason,), daemon=True,
+                                                      name="CAN-Reconnect")
+            self._reconnect_thread.start()
+
+    def _reconnect(self, reason: str):
+        """
+        Reopen the bus with exponential backoff. The frames of the transmit queue are held and sent
+        once the bus is back; the reception (thread or event loop) and the filters are restored.
+        """
+        self.logger.log_message(log_type=LogType.WARNING, message=f"CAN bus failure ({reason}), reconnecting")
+        self._connected.clear()
+        self._notify_connection(False)
+        try:
+            self._reopen(self.config.reconnect_delay)
+        finally:
+            with self._reconnect_lock:
+                self._reconnect_thread = None
+
+    def _reopen(self, delay: float = 0.0, retry: bool = True):
+        """
+        Shut the bus down and open it again. With `retry` a failed opening is retried after a doubling
+        delay until it succeeds or close() is called, otherwise the error is raised.
+        """
+        if self._tx_queue is not None:
+            self._tx_queue.pause()
+        was_receiving = self._stop_receiving is not None
+        receive_loop = self._receive_loop
+        try:
+            self._shutdown_bus()
+        except Exception as e:
+            self.logger.log_message(log_type=LogType.WARNING, message=f"Error shutting down the failed bus: {e}")
+
+        attempt = 0
+        while True:
+            if delay and self._closed.wait(delay):
+                return
+            if self._closed.is_set():
+                return
+            attempt += 1
+            try:
+                self._initialize_bus()
+                break
+            except CANError:
+                if not retry:
+                    raise
+                delay = min(max(delay, self.config.reconnect_delay / 2) * 2, self.config.max_reconnect_delay)
+                self.logger.log_message(log_type=LogType.WARNING,
+                                        message=f"Reconnection attempt {attempt} failed, next in {delay:.1f}s")
+        if self._closed.is_set():
+            self._shutdown_bus()  # Closed while the bus was being opened
+            return
+
+        if self._filters is not None:
+            self.bus.set_filters(self._filters)
+        if was_receiving:
+            self.start_receiving()
+        elif receive_loop is not None:
+            receive_loop.call_soon_threadsafe(self.start_receiving_async, receive_loop)
+        self._consecutive_errors = 0
+        self.reconnects += 1
+        RECONNECTS.inc()
+        self._connected.set()
+        if self._tx_queue is not None:
+            self._tx_queue.resume()
+        self._notify_connection(True)
+        self.logger.log_message(log_type=LogType.ACKNOWLEDGMENT,
+                                message=f"CAN bus reconnected after {attempt} attempt(s)")
+
     def __enter__(self):
         """Context manager entry."""
         return self
@@ -298,18 +842,31 @@ class CANCommunication:
         return self.bus is not None
 
     def reset(self):
-        """Reset the CAN bus connection."""
+        """Reset the CAN bus connection. The frames of the transmit queue are kept and sent afterwards."""
         self.logger.log_message(log_type=LogType.ACKNOWLEDGMENT, message="Resetting CAN bus connection")
-        self.close()
-        self._initialize_bus()
+        self._connected.clear()
+        try:
+            self._reopen(retry=False)
+        finally:
+            self._connected.set()
 
-    def flush_receive_buffer(self):
-        """Flush the receive buffer by reading all pending messages."""
+    def flush_receive_buffer(self) -> int:
+        """
+        Discard the frames already received by the interface, without waiting for new ones.
+
+        Returns:
+            int: Number of frames discarded
+        """
+        if not self.bus:
+            raise CANError("CAN bus not initialized")
         try:
             self.logger.log_message(log_type=LogType.ACKNOWLEDGMENT, message="Flushing receive buffer")
-            while self.receive_message(timeout=0.1):
-                pass
-            self.logger.log_message(log_type=LogType.ACKNOWLEDGMENT, message="Receive buffer flushed successfully")
+            flushed = 0
+            while self.bus.recv(timeout=0) is not None:
+                flushed += 1
+            self.logger.log_message(log_type=LogType.ACKNOWLEDGMENT,
+                                    message=f"Receive buffer flushed successfully ({flushed} frames)")
+            return flushed
         except Exception as e:
             error = CANError(
                 message="Error flushing receive buffer",
@@ -330,6 +887,13 @@ class CANCommunication:
                 "errors": getattr(self.bus, "errors", 0),
                 "state": getattr(self.bus, "state", "unknown")
             }
+            # Counters kept by this class, independent of what the interface reports
+            bus_load = self.bus_load.get_statistics()
+            self.statistics.update_bus_load(bus_load["bus_load"])  # Decays when the bus is idle
+            stats.update(self.statistics.get_statistics_dict())
+            stats.update(bus_load)
+            if self._tx_queue is not None:
+                stats.update(self._tx_queue.get_statistics())
 
             self.logger.log_message(log_type=LogType.ACKNOWLEDGMENT, message=f"Bus statistics retrieved: {stats}")
             return stats
@@ -348,6 +912,9 @@ class CANCommunication:
             if not self.bus:
                 raise CANError("CAN bus not initialized")
 
+            self.statistics = CANStatistics()
+            self.bus_load.reset()
+
             if hasattr(self.bus, "clear_statistics"):
                 self.bus.clear_statistics()
                 self.logger.log_message(log_type=LogType.ACKNOWLEDGMENT, message="Bus statistics cleared successfully")
@@ -0,0 +1,158 @@
+"""
+Acceptance filter compilation.
+
+compile_filters turns a set of CAN identifiers into python-can filters (id/mask pairs) that
+accept exactly these identifiers, with as few pairs as possible. An id/mask pair is a cube of
+the identifier bits (the bits outside the mask are free), so the identifiers are first merged
+into prime implicants (Quine-McCluskey) and the smallest set of implicants covering all of them
+is then selected: the essential implicants first, the rest by an exhaustive search bounded by a
+greedy solution.
+
+When the controller supports fewer filters than the exact cover needs, the closest cubes are
+merged further; the filters then accept some extra identifiers, which are dropped in software.
+"""
+from collections import defaultdict
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+STANDARD_ID_MASK = 0x7FF
+EXTENDED_ID_MASK = 0x1FFFFFFF
+
+# Number of search steps after which the cover search keeps the best cover found
+_SEARCH_LIMIT = 20000
+
+Cube = Tuple[int, int]  # (identifier bits, mask of the compared bits), bits outside the mask are 0
+
+
+def _prime_implicants(ids: Iterable[int], width_mask: int) -> List[Cube]:
+    """Merge the identifiers into the largest cubes containing only identifiers of the set."""
+    current = {(can_id, width_mask) for can_id in ids}
+    primes = set()
+    while current:
+        by_mask = defaultdict(set)
+        for value, mask in current:
+            by_mask[mask].add(value)
+        merged = set()
+        used = set()
+        for mask, values in by_mask.items():
+            for value in values:
+                bits = mask & ~value  # A cube pairs with the one differing by a single bit it has at 0
+                while bits:
+                    bit = bits & -bits
+                    bits ^= bit
+                    if value | bit in values:
+                        merged.add((value, mask & ~bit))
+                        used.add((value, mask))
+                        used.add((value | bit, mask))
+        primes |= current - used
+        current = merged
+    return sorted(primes)
+
+
+def _select_cover(ids: FrozenSet[int], primes: List[Cube]) -> List[Cube]:
+    """Return a smallest set of prime implicants covering every identifier."""
+    covers = {prime: frozenset(can_id for can_id in ids if (can_id ^ prime[0]) & prime[1] == 0)
+              for prime in primes}
+    by_id = defaultdict(list)
+    for prime, covered in covers.items():
+        for can_id in covered:
+            by_id[can_id].append(prime)
+
+    chosen = []
+    remaining = set(ids)
+    # Essential implicants: the only ones covering some identifier
+    for can_id in ids:
+        candidates = by_id[can_id]
+        if len(candidates) == 1 and candidates[0] not in chosen:
+            chosen.append(candidates[0])
+            remaining -= covers[candidates[0]]
+    if not remaining:
+        return chosen
+
+    # Greedy cover as the upper bound of the search
+    best = []
+    uncovered = set(remaining)
+    while uncovered:
+        prime = max(primes, key=lambda p: len(covers[p] & uncovered))
+        best.append(prime)
+        uncovered -= covers[prime]
+
+    steps = 0
+
+    def search(uncovered: FrozenSet[int], selection: List[Cube]):
+        nonlocal best, steps
+        steps += 1
+        if not uncovered:
+            if len(selection) < len(best):
+                best = list(selection)
+            return
+        if len(selection) + 1 >= len(best) or steps > _SEARCH_LIMIT:
+            return
+        # Branch on the identifier with the fewest implicants covering it
+        can_id = min(uncovered, key=lambda i: len(by_id[i]))
+        for prime in sorted(by_id[can_id], key=lambda p: -len(covers[p] & uncovered)):
+            selection.append(prime)
+            search(uncovered - covers[prime], selection)
+            selection.pop()
+
+    search(frozenset(remaining), [])
+    return chosen + best
+
+
+def _merge(cubes: List[Cube], max_filters: int, width_mask: int) -> List[Cube]:
+    """Merge the pairs of cubes adding the fewest identifiers until at most `max_filters` remain."""
+    cubes = list(cubes)
+    while len(cubes) > max_filters:
+        best = None
+        for first in range(len(cubes)):
+            for second in range(first + 1, len(cubes)):
+                (value_a, mask_a), (value_b, mask_b) = cubes[first], cubes[second]
+                mask = mask_a & mask_b & ~(value_a ^ value_b)
+                free_bits = bin(width_mask & ~mask).count("1")
+                if best is None or free_bits < best[0]:
+                    best = (free_bits, first, second, (value_a & mask, mask))
+        _, first, second, merged = best
+        value, mask = merged
+        # The merged cube may contain other cubes
+        cubes = [cube for index, cube in enumerate(cubes)
+                 if index not in (first, second) and not ((cube[0] ^ value) & mask == 0 and cube[1] & mask == mask)]
+        cubes.append(merged)
+    return cubes
+
+
+def compile_filters(ids: Iterable[int], extended: bool = False, max_filters: Optional[int] = None) -> List[Dict]:
+    """
+    Compute the acceptance filters of a set of identifiers.
+
+    Args:
+        ids: CAN identifiers to accept
+        extended: 29-bit identifiers, the filters then only match extended frames (standard frames otherwise)
+        max_filters: Maximum number of filters, None for no limit. With a limit the filters may accept
+                     identifiers outside the set.
+
+    Returns:
+        List[Dict]: python-can filters ({"can_id", "can_mask", "extended"}), empty when `ids` is empty
+    """
+    width_mask = EXTENDED_ID_MASK if extended else STANDARD_ID_MASK
+    ids = frozenset(ids)
+    for can_id in ids:
+        if not 0 <= can_id <= width_mask:
+            raise ValueError(f"Invalid {'extended' if extended else 'standard'} CAN identifier 0x{can_id:X}")
+    if max_filters is not None and max_filters < 1:
+        raise ValueError("max_filters must be greater than 0.")
+    if not ids:
+        return []
+
+    cubes = _select_cover(ids, _prime_implicants(ids, width_mask))
+    if max_filters is not None and len(cubes) > max_filters:
+        cubes = _merge(cubes, max_filters, width_mask)
+    return [{"can_id": value, "can_mask": mask, "extended": extended} for value, mask in sorted(cubes)]
+
+
+def filters_match(filters: List[Dict], arbitration_id: int, is_extended_id: bool = False) -> bool:
+    """Return True if a frame passes the filters, with the semantics of python-can's BusABC."""
+    for can_filter in filters:
+        if "extended" in can_filter and can_filter["extended"] != is_extended_id:
+            continue
+        if (can_filter["can_id"] ^ arbitration_id) & can_filter["can_mask"] == 0:
+            return True
+    return False
@@ -29,6 +29,18 @@ class CANConfig:
     error_threshold: int = 10
 
 
+@dataclass
+class VirtualBusConfig:
+    """Behaviour of the in-process virtual bus (CANInterface.VIRTUAL)."""
+    bitrate_timing: bool = False  # Deliver frames after their transmission time at the bitrate, with arbitration
+    loss_rate: float = 0.0  # Probability that a receiver misses a frame
+    latency: float = 0.0  # Delay in seconds added to every delivery
+    latency_jitter: float = 0.0  # Random extra delay in seconds, between 0 and this value
+    seed: Optional[int] = None  # Seed of the loss and jitter generator, for reproducible runs
+    tx_queue_size: int = 64  # Frames a node can queue for transmission before send() blocks
+    receive_own_messages: bool = False
+
+
 @dataclass
 class CANMessage:
     arbitration_id: int
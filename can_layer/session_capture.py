@@ -0,0 +1,227 @@
+"""
+Capture and replay of complete CAN sessions.
+
+SessionRecorder appends every frame sent and received by a CANCommunication to a compact binary
+file: a header, then one variable-size record per frame (monotonic timestamp, identifier,
+direction and flags, payload), about 22 bytes for a classic CAN frame. Unlike the ring of
+can_layer.trace.FrameTrace nothing is overwritten, so a whole flash session is kept. The
+recorder has the record/record_message interface of FrameTrace and is installed with
+CANCommunication.set_trace.
+
+SessionReplayer feeds the received frames of a capture back into a receive function, e.g.
+IsoTp.recv_can_message, with the recorded timing, N times faster, or as fast as possible. The
+replayed frames do not react to what the stack under test sends: the ECU's responses come at
+the recorded times, which is what makes runs comparable.
+"""
+import struct
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, Optional, Union
+import sys
+import os
+import can
+current_dir = os.path.dirname(os.path.abspath(__file__))
+package_dir = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(package_dir)
+from can_layer.trace import TraceRecord, DIRECTION_RX, DIRECTION_TX, FLAG_EXTENDED_ID, FLAG_FD, \
+    FLAG_BITRATE_SWITCH, FLAG_ERROR_FRAME
+from can_layer.tx_queue import wait_until
+
+SESSION_MAGIC = b"CANSESS1"
+SESSION_VERSION = 1
+
+# magic, version, wall clock and monotonic time at creation (ns)
+_HEADER = struct.Struct("<8sHqQ")
+# nanoseconds since creation, arbitration id, direction (bit 7) and flags, data length
+_RECORD = struct.Struct("<QIBB")
+_DIRECTION_BIT = 0x80
+
+_CAN_FD_DLC = {12: 9, 16: 10, 20: 11, 24: 12, 32: 13, 48: 14, 64: 15}
+
+
+class SessionRecorder:
+    """Writer of a session capture, safe to share between the send and receive threads."""
+
+    def __init__(self, path: str, buffer_size: int = 65536):
+        """
+        Args:
+            path: Capture file, created or truncated
+            buffer_size: Bytes collected in memory before they are written to the file
+        """
+        self.path = path
+        self._buffer_size = buffer_size
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "wb")
+        self._start_ns = time.monotonic_ns()
+        self._file.write(_HEADER.pack(SESSION_MAGIC, SESSION_VERSION, time.time_ns(), self._start_ns))
+        self._buffer = bytearray()
+        self._lock = threading.Lock()
+        self.frames = 0
+
+    def record(self, direction: int, arbitration_id: int, data: Union[bytes, bytearray, memoryview],
+               flags: int = 0):
+        """
+        Append one frame.
+
+        Args:
+            direction: DIRECTION_RX or DIRECTION_TX
+            arbitration_id: CAN identifier
+            data: Frame payload, up to 64 bytes
+            flags: can_layer.trace FLAG_* bits
+        """
+        timestamp = time.monotonic_ns() - self._start_ns
+        with self._lock:
+            if self._file is None:
+                return
+            self._buffer += _RECORD.pack(timestamp, arbitration_id,
+                                         (_DIRECTION_BIT if direction == DIRECTION_TX else 0) | flags, len(data))
+            self._buffer += data
+            self.frames += 1
+            if len(self._buffer) >= self._buffer_size:
+                self._file.write(self._buffer)
+                self._buffer.clear()
+
+    def record_message(self, direction: int, message: can.Message):
+        """Append a can.Message."""
+        flags = 0
+        if message.is_extended_id:
+            flags |= FLAG_EXTENDED_ID
+        if message.is_fd:
+            flags |= FLAG_FD
+        if message.bitrate_switch:
+            flags |= FLAG_BITRATE_SWITCH
+        if message.is_error_frame:
+            flags |= FLAG_ERROR_FRAME
+        self.record(direction, message.arbitration_id, message.data, flags)
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.write(self._buffer)
+                self._buffer.clear()
+                self._file.flush()
+
+    def close(self):
+        """Write the buffered records and close the file."""
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(self._buffer)
+            self._buffer.clear()
+            self._file.close()
+            self._file = None
+
+
+def read_session(path: str) -> Iterator[TraceRecord]:
+    """
+    Read the records of a capture, in recording order. A capture cut short (the process was
+    killed) is read up to its last complete record.
+
+    Args:
+        path: Capture file written by SessionRecorder
+    """
+    with open(path, "rb") as file:
+        content = file.read()
+    if len(content) < _HEADER.size:
+        raise ValueError(f"{path} is not a session capture.")
+    magic, version, _, _ = _HEADER.unpack_from(content, 0)
+    if magic != SESSION_MAGIC or version != SESSION_VERSION:
+        raise ValueError(f"{path} is not a session capture (version {SESSION_VERSION}).")
+    offset = _HEADER.size
+    end = len(content)
+    while offset + _RECORD.size <= end:
+        timestamp, arbitration_id, flags, length = _RECORD.unpack_from(content, offset)
+        offset += _RECORD.size
+        if offset + length > end:
+            break
+        direction = DIRECTION_TX if flags & _DIRECTION_BIT else DIRECTION_RX
+        yield TraceRecord(timestamp, direction, flags & ~_DIRECTION_BIT, _CAN_FD_DLC.get(length, length),
+                          arbitration_id, content[offset:offset + length])
+        offset += length
+
+
+def read_session_start(path: str) -> tuple:
+    """Return (wall clock ns, monotonic ns) at the creation of the capture, to convert timestamps."""
+    with open(path, "rb") as file:
+        _, _, wall_ns, monotonic_ns = _HEADER.unpack(file.read(_HEADER.size))
+    return wall_ns, monotonic_ns
+
+
+class SessionReplayer:
+    """Feeds the frames of a capture to a receive function with the recorded timing."""
+
+    def __init__(self, source: Union[str, Iterable[TraceRecord]], recv_fn: Callable[[can.Message], None],
+                 speed: Optional[float] = 1.0, directions: tuple = (DIRECTION_RX,),
+                 channel=None):
+        """
+        Args:
+            source: Capture file, or records as returned by read_session
+            recv_fn: Called with every replayed frame, e.g. IsoTp.recv_can_message
+            speed: 1.0 replays in real time, N replays N times faster, None as fast as possible
+            directions: Directions of the frames replayed, the received frames by default
+            channel: channel attribute of the replayed messages
+        """
+        if speed is not None and speed <= 0:
+            raise ValueError("speed must be greater than 0, or None.")
+        self._records = read_session(source) if isinstance(source, str) else source
+        self._recv_fn = recv_fn
+        self._speed = speed
+        self._directions = directions
+        self._channel = channel
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.frames_replayed = 0
+        self.max_lag = 0.0  # Largest delay in seconds between the scheduled and the actual delivery
+        self.duration = 0.0
+
+    def run(self):
+        """Replay the capture in the calling thread, until its end or stop()."""
+        start = time.perf_counter()
+        first_timestamp = None
+        for record in self._records:
+            if self._stopped.is_set():
+                break
+            if record.direction not in self._directions:
+                continue
+            if first_timestamp is None:
+                first_timestamp = record.timestamp_ns
+            if self._speed is not None:
+                due = start + (record.timestamp_ns - first_timestamp) / 1e9 / self._speed
+                wait_until(due)
+                lag = time.perf_counter() - due
+                if lag > self.max_lag:
+                    self.max_lag = lag
+            self._recv_fn(self._to_message(record))
+            self.frames_replayed += 1
+        self.duration = time.perf_counter() - start
+
+    def _to_message(self, record: TraceRecord) -> can.Message:
+        flags = record.flags
+        return can.Message(timestamp=time.time(), arbitration_id=record.arbitration_id,
+                           is_extended_id=bool(flags & FLAG_EXTENDED_ID),
+                           is_fd=bool(flags & FLAG_FD), bitrate_switch=bool(flags & FLAG_BITRATE_SWITCH),
+                           is_error_frame=bool(flags & FLAG_ERROR_FRAME),
+                           data=record.data, channel=self._channel, is_rx=True)
+
+    def start(self):
+        """Replay in a background thread."""
+        self._thread = threading.Thread(target=self.run, daemon=True, name="SessionReplay")
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait for the end of a replay started with start(). Return False on timeout."""
+        if self._thread is None:
+            return True
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def get_statistics(self) -> Dict:
+        return {
+            "frames_replayed": self.frames_replayed,
+            "duration": self.duration,
+            "max_lag_us": self.max_lag * 1e6,
+        }
@@ -0,0 +1,75 @@
+import random
+import sys
+import os
+current_dir = os.path.dirname(os.path.abspath(__file__))
+package_dir = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(package_dir)
+from can_layer.bus_load import frame_bits
+
+# Bit counts of classic CAN frames against a reference built bit by bit from the frame fields
+# (ISO 11898-1): bitwise CRC-15, then a stuff bit after every five equal bits up to the CRC.
+
+
+def reference_crc15(bits: str) -> str:
+    crc = 0
+    for bit in bits:
+        feedback = int(bit) ^ (crc >> 14)
+        crc = (crc << 1) & 0x7FFF
+        if feedback:
+            crc ^= 0x4599
+    return format(crc, "015b")
+
+
+def reference_frame_bits(arbitration_id: int, data: bytes, is_extended_id: bool, is_remote_frame: bool) -> int:
+    rtr = "1" if is_remote_frame else "0"
+    dlc = format(len(data), "04b")
+    if is_extended_id:
+        # SOF, base id, SRR, IDE, id extension, RTR, r1, r0, DLC
+        header = "0" + format(arbitration_id >> 18, "011b") + "11" + format(arbitration_id & 0x3FFFF, "018b") \
+                 + rtr + "00" + dlc
+    else:
+        # SOF, identifier, RTR, IDE, r0, DLC
+        header = "0" + format(arbitration_id, "011b") + rtr + "00" + dlc
+    payload = "" if is_remote_frame else "".join(format(byte, "08b") for byte in data)
+    stuffed = header + payload
+    stuffed += reference_crc15(stuffed)
+    stuff_bits = 0
+    previous, run = None, 0
+    for bit in stuffed:
+        run = run + 1 if bit == previous else 1
+        previous = bit
+        if run == 5:
+            # The stuff bit has the opposite value and starts a new run
+            stuff_bits += 1
+            previous, run = "1" if bit == "0" else "0", 1
+    # CRC delimiter, ACK slot and delimiter, end of frame and intermission
+    return len(stuffed) + stuff_bits + 13
+
+
+rng = random.Random(11898)
+mismatches = 0
+cases = 0
+for is_extended_id in (False, True):
+    for _ in range(3000):
+        arbitration_id = rng.getrandbits(29 if is_extended_id else 11)
+        data = bytes(rng.getrandbits(8) for _ in range(rng.randint(0, 8)))
+        if rng.random() < 0.3:
+            # Long runs of equal bits, where stuffing matters most
+            data = bytes([rng.choice((0x00, 0xFF))] * len(data))
+        is_remote_frame = rng.random() < 0.1
+        expected = reference_frame_bits(arbitration_id, data, is_extended_id, is_remote_frame)
+        actual, _ = frame_bits(arbitration_id, data, is_extended_id=is_extended_id, is_remote_frame=is_remote_frame,
+                               dlc=len(data) if is_remote_frame else None)
+        cases += 1
+        if actual != expected:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"Mismatch: id 0x{arbitration_id:X} extended={is_extended_id} remote={is_remote_frame} "
+                      f"data {data.hex()}: {actual} bits, expected {expected}")
+        worst_case, _ = frame_bits(arbitration_id, data, is_extended_id=is_extended_id,
+                                   is_remote_frame=is_remote_frame, dlc=len(data) if is_remote_frame else None,
+                                   worst_case_stuffing=True)
+        assert worst_case >= actual, "worst case stuffing below the actual count"
+
+print(f"{cases - mismatches}/{cases} frames match the bit-level reference")
+assert mismatches == 0
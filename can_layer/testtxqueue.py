@@ -0,0 +1,35 @@
+import threading
+import time
+import sys
+import os
+current_dir = os.path.dirname(os.path.abspath(__file__))
+package_dir = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(package_dir)
+import can
+from can_layer.tx_queue import TxQueue
+
+# A frame queued with put() while a slowly paced batch is pending is sent right away, and the
+# batch keeps its separation time between frames.
+
+SEPARATION_TIME = 0.02
+
+sent = []
+tx_queue = TxQueue(transmit=lambda message: sent.append((message.arbitration_id, time.perf_counter())), size=64)
+batch_done = threading.Event()
+batch = [can.Message(arbitration_id=0x100 + index) for index in range(10)]
+tx_queue.put_batch(batch, separation_time=SEPARATION_TIME, on_complete=lambda error: batch_done.set())
+
+time.sleep(1.5 * SEPARATION_TIME)
+queued_at = time.perf_counter()
+tx_queue.put(can.Message(arbitration_id=0x7E8))
+batch_done.wait(2)
+tx_queue.stop()
+
+single_sent_at = [sent_at for arbitration_id, sent_at in sent if arbitration_id == 0x7E8][0]
+batch_sent_at = [sent_at for arbitration_id, sent_at in sent if arbitration_id != 0x7E8]
+gaps = [after - before for before, after in zip(batch_sent_at, batch_sent_at[1:])]
+print(f"put() frame sent after {(single_sent_at - queued_at) * 1000:.2f} ms, "
+      f"batch gaps {min(gaps) * 1000:.2f}-{max(gaps) * 1000:.2f} ms")
+assert len(batch_sent_at) == len(batch)
+assert single_sent_at - queued_at < SEPARATION_TIME / 2, "put() frame waited behind the batch"
+assert min(gaps) >= SEPARATION_TIME, "batch frames sent closer than the separation time"
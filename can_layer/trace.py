@@ -0,0 +1,149 @@
+"""
+Binary frame trace.
+
+Frames are appended as fixed-size records to a memory-mapped ring file, so tracing a frame is a
+copy into the map plus a struct.pack_into, with no string formatting and no system call. When the
+ring is full the oldest records are overwritten; records are ordered by their monotonic timestamp,
+so a trace left open by a crashed process can still be read. can_layer.trace_decoder turns a trace back into ISO-TP and UDS
+transactions.
+"""
+import itertools
+import mmap
+import os
+import struct
+import time
+from typing import Iterator, NamedTuple, Union
+
+TRACE_MAGIC = b"CANTRACE"
+TRACE_VERSION = 1
+
+# magic, version, record size, capacity, records written, wall clock and monotonic time at creation (ns)
+_HEADER = struct.Struct("<8sHHIQqQ")
+_COUNT = struct.Struct("<Q")
+_COUNT_OFFSET = 16
+HEADER_SIZE = 64
+
+# monotonic time (ns), direction, flags, dlc, data length, arbitration id, followed by 64 data bytes
+_RECORD_HEADER = struct.Struct("<QBBBBI")
+_TIMESTAMP = struct.Struct("<Q")
+RECORD_DATA_SIZE = 64
+RECORD_SIZE = _RECORD_HEADER.size + RECORD_DATA_SIZE  # 80 bytes
+
+DIRECTION_RX = 0
+DIRECTION_TX = 1
+
+FLAG_EXTENDED_ID = 0x01
+FLAG_FD = 0x02
+FLAG_BITRATE_SWITCH = 0x04
+FLAG_ERROR_FRAME = 0x08
+FLAG_ISO_TP = 0x10  # Recorded by the ISO-TP layer rather than the CAN layer
+
+_CAN_FD_DLC = {12: 9, 16: 10, 20: 11, 24: 12, 32: 13, 48: 14, 64: 15}
+
+
+class TraceRecord(NamedTuple):
+    timestamp_ns: int
+    direction: int
+    flags: int
+    dlc: int
+    arbitration_id: int
+    data: bytes
+
+
+class FrameTrace:
+    """Writer of a binary frame trace, safe to share between the CAN and ISO-TP threads."""
+
+    def __init__(self, path: str, capacity: int = 65536):
+        """
+        :param path: Trace file, created or truncated.
+        :param capacity: Number of records kept in the ring.
+        """
+        if capacity <= 0:
+            raise ValueError("capacity must be greater than 0.")
+        self.path = path
+        self.capacity = capacity
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "w+b")
+        self._file.truncate(HEADER_SIZE + capacity * RECORD_SIZE)
+        self._map = mmap.mmap(self._file.fileno(), HEADER_SIZE + capacity * RECORD_SIZE)
+        _HEADER.pack_into(self._map, 0, TRACE_MAGIC, TRACE_VERSION, RECORD_SIZE, capacity, 0,
+                          time.time_ns(), time.monotonic_ns())
+        self._slots = itertools.count()  # Atomic slot allocation, writers never share a record
+
+    def record(self, direction: int, arbitration_id: int, data: Union[bytes, bytearray, memoryview],
+               flags: int = 0):
+        """
+        Append one frame.
+
+        :param direction: DIRECTION_RX or DIRECTION_TX.
+        :param arbitration_id: CAN identifier.
+        :param data: Frame payload, up to 64 bytes.
+        :param flags: FLAG_* bits.
+        """
+        offset = HEADER_SIZE + (next(self._slots) % self.capacity) * RECORD_SIZE
+        length = len(data)
+        if length > RECORD_DATA_SIZE:
+            data = data[:RECORD_DATA_SIZE]
+            length = RECORD_DATA_SIZE
+        # The slot may hold an older record once the ring wraps: its timestamp is cleared before the
+        # data is overwritten and the header goes last, so a reader skips the slot (timestamp 0)
+        # instead of pairing the old header with the new data
+        _TIMESTAMP.pack_into(self._map, offset, 0)
+        self._map[offset + 16:offset + 16 + length] = data
+        _RECORD_HEADER.pack_into(self._map, offset, time.monotonic_ns(), direction, flags,
+                                 _CAN_FD_DLC.get(length, length), length, arbitration_id)
+
+    def record_message(self, direction: int, message):
+        """Append a can.Message."""
+        flags = 0
+        if message.is_extended_id:
+            flags |= FLAG_EXTENDED_ID
+        if message.is_fd:
+            flags |= FLAG_FD
+        if message.bitrate_switch:
+            flags |= FLAG_BITRATE_SWITCH
+        if message.is_error_frame:
+            flags |= FLAG_ERROR_FRAME
+        self.record(direction, message.arbitration_id, message.data, flags)
+
+    def close(self):
+        """Write the record count and close the file."""
+        if self._map is None:
+            return
+        _COUNT.pack_into(self._map, _COUNT_OFFSET, next(self._slots))  # Records written, for information
+        self._map.flush()
+        self._map.close()
+        self._file.close()
+        self._map = None
+
+
+def read_trace(path: str) -> Iterator[TraceRecord]:
+    """
+    Read the records of a trace file, oldest first.
+
+    :param path: Trace file written by FrameTrace.
+    """
+    with open(path, "rb") as file:
+        content = file.read()
+    magic, _, record_size, capacity, count, _, _ = _HEADER.unpack_from(content, 0)
+    if magic != TRACE_MAGIC or record_size != RECORD_SIZE:
+        raise ValueError(f"{path} is not a frame trace (version {TRACE_VERSION}).")
+    records = []
+    for index in range(min(count, capacity) if count else capacity):  # count is 0 if never closed
+        offset = HEADER_SIZE + index * RECORD_SIZE
+        timestamp, direction, flags, dlc, length, arbitration_id = _RECORD_HEADER.unpack_from(content, offset)
+        if timestamp == 0:
+            continue  # Slot never written, or being rewritten
+        data_offset = offset + _RECORD_HEADER.size
+        records.append(TraceRecord(timestamp, direction, flags, dlc, arbitration_id,
+                                   content[data_offset:data_offset + length]))
+    records.sort(key=lambda record: record.timestamp_ns)
+    return iter(records)
+
+
+def read_trace_start(path: str) -> tuple:
+    """Return (wall clock ns, monotonic ns) at the creation of the trace, to convert timestamps."""
+    with open(path, "rb") as file:
+        _, _, _, _, _, wall_ns, monotonic_ns = _HEADER.unpack(file.read(_HEADER.size))
+    return wall_ns, monotonic_ns
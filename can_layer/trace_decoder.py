@@ -0,0 +1,188 @@
+"""
+Offline decoder of binary frame traces.
+
+Reassembles the ISO-TP messages of a trace written by can_layer.trace.FrameTrace and pairs UDS
+requests with their responses. Run as a script to print the transactions of a trace file:
+
+    python can_layer/trace_decoder.py logs/flash.trace
+"""
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+import sys
+import os
+current_dir = os.path.dirname(os.path.abspath(__file__))
+package_dir = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(package_dir)
+from can_layer.trace import TraceRecord, DIRECTION_TX, FLAG_ISO_TP, read_trace
+from iso_tp_layer.frames.FrameCodec import decode_frame
+from iso_tp_layer.frames.FrameType import FrameType
+
+NEGATIVE_RESPONSE_SID = 0x7F
+NRC_RESPONSE_PENDING = 0x78
+
+
+@dataclass
+class IsoTpTransaction:
+    arbitration_id: int
+    direction: int
+    start_ns: int
+    end_ns: int
+    data: bytes
+    frames: int
+    flow_control_frames: int = 0
+    complete: bool = True
+
+
+@dataclass
+class UdsTransaction:
+    request: IsoTpTransaction
+    response: Optional[IsoTpTransaction] = None
+    pending_responses: int = 0  # NRC 0x78 responses received before the final one
+    nrc: Optional[int] = None
+
+    @property
+    def sid(self) -> int:
+        return self.request.data[0]
+
+    @property
+    def latency_ns(self) -> Optional[int]:
+        if self.response is None:
+            return None
+        return self.response.end_ns - self.request.end_ns
+
+
+@dataclass
+class _Reassembly:
+    start_ns: int
+    expected_length: int
+    data: bytearray
+    frames: int = 1
+    next_sequence: int = 1
+    flow_control_frames: int = 0
+
+
+def decode_isotp(records: Iterable[TraceRecord]) -> List[IsoTpTransaction]:
+    """
+    Reassemble the ISO-TP messages of a trace.
+
+    Flow control frames are attributed to the transfer running in the opposite direction.
+    Records written by the ISO-TP layer (FLAG_ISO_TP) are skipped when the CAN layer also traced,
+    so that each frame is decoded once.
+
+    :return: The messages in completion order; truncated transfers are returned with complete=False.
+    """
+    records = list(records)
+    if any(not record.flags & FLAG_ISO_TP for record in records):
+        records = [record for record in records if not record.flags & FLAG_ISO_TP]
+
+    transactions: List[IsoTpTransaction] = []
+    active: Dict[Tuple[int, int], _Reassembly] = {}
+    for record in records:
+        key = (record.direction, record.arbitration_id)
+        try:
+            frame = decode_frame(record.data)
+        except ValueError:
+            continue
+
+        if frame.frameType == FrameType.SingleFrame:
+            transactions.append(IsoTpTransaction(record.arbitration_id, record.direction, record.timestamp_ns,
+                                                 record.timestamp_ns, bytes(frame.data), 1))
+        elif frame.frameType == FrameType.FirstFrame:
+            stale = active.pop(key, None)
+            if stale is not None:
+                transactions.append(_incomplete(key, stale))
+            active[key] = _Reassembly(record.timestamp_ns, frame.dataLength, bytearray(frame.data))
+        elif frame.frameType == FrameType.ConsecutiveFrame:
+            reassembly = active.get(key)
+            if reassembly is None or frame.sequenceNumber != reassembly.next_sequence:
+                if reassembly is not None:
+                    transactions.append(_incomplete(key, active.pop(key)))
+                continue
+            reassembly.data += frame.data
+            reassembly.frames += 1
+            reassembly.next_sequence = (reassembly.next_sequence + 1) % 16
+            if len(reassembly.data) >= reassembly.expected_length:
+                del active[key]
+                transactions.append(IsoTpTransaction(
+                    record.arbitration_id, record.direction, reassembly.start_ns, record.timestamp_ns,
+                    bytes(reassembly.data[:reassembly.expected_length]), reassembly.frames,
+                    reassembly.flow_control_frames))
+        elif frame.frameType == FrameType.FlowControlFrame:
+            # A flow control frame answers the transfer running in the other direction
+            for (direction, _), reassembly in active.items():
+                if direction != record.direction:
+                    reassembly.flow_control_frames += 1
+                    break
+
+    for key, reassembly in active.items():
+        transactions.append(_incomplete(key, reassembly))
+    return transactions
+
+
+def _incomplete(key: Tuple[int, int], reassembly: _Reassembly) -> IsoTpTransaction:
+    direction, arbitration_id = key
+    return IsoTpTransaction(arbitration_id, direction, reassembly.start_ns, reassembly.start_ns,
+                            bytes(reassembly.data), reassembly.frames, reassembly.flow_control_frames,
+                            complete=False)
+
+
+def decode_uds(transactions: Iterable[IsoTpTransaction]) -> List[UdsTransaction]:
+    """
+    Pair UDS requests with their responses.
+
+    A response (SID + 0x40, or 0x7F with the request SID) closes the oldest open request with the
+    matching SID sent in the other direction; NRC 0x78 (response pending) keeps it open.
+    """
+    result: List[UdsTransaction] = []
+    open_requests: List[UdsTransaction] = []
+    for transaction in transactions:
+        if not transaction.complete or not transaction.data:
+            continue
+        sid = transaction.data[0]
+        if sid == NEGATIVE_RESPONSE_SID and len(transaction.data) >= 3:
+            request_sid, nrc = transaction.data[1], transaction.data[2]
+        elif sid >= 0x40 and sid != NEGATIVE_RESPONSE_SID:
+            request_sid, nrc = sid - 0x40, None
+        else:
+            request_sid = None
+
+        match = None
+        if request_sid is not None:
+            match = next((uds for uds in open_requests
+                          if uds.sid == request_sid and uds.request.direction != transaction.direction), None)
+        if match is None:
+            uds = UdsTransaction(request=transaction)
+            open_requests.append(uds)
+            result.append(uds)
+            continue
+        if nrc == NRC_RESPONSE_PENDING:
+            match.pending_responses += 1
+            continue
+        match.response = transaction
+        match.nrc = nrc
+        open_requests.remove(match)
+    return result
+
+
+def decode_trace(path: str) -> List[UdsTransaction]:
+    """Read a trace file and return its UDS transactions."""
+    return decode_uds(decode_isotp(read_trace(path)))
+
+
+def _format(uds: UdsTransaction) -> str:
+    direction = "TX" if uds.request.direction == DIRECTION_TX else "RX"
+    text = (f"{direction} 0x{uds.request.arbitration_id:X} SID 0x{uds.sid:02X} "
+            f"({len(uds.request.data)} bytes, {uds.request.frames} frames)")
+    if uds.response is None:
+        return text + " -> no response"
+    outcome = f"NRC 0x{uds.nrc:02X}" if uds.nrc is not None else "positive"
+    return (text + f" -> {outcome} ({len(uds.response.data)} bytes) in {uds.latency_ns / 1e6:.3f} ms"
+            + (f", {uds.pending_responses} x response pending" if uds.pending_responses else ""))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python trace_decoder.py <trace file>")
+        sys.exit(1)
+    for uds_transaction in decode_trace(sys.argv[1]):
+        print(_format(uds_transaction))
@@ -0,0 +1,323 @@
+"""
+Transmit queue of CANCommunication.
+
+Frames are queued by the protocol threads and sent by one writer thread, so that a sender is
+never blocked by the interface: a full controller buffer (ENOBUFS) is retried after a backoff of
+tens of microseconds instead of stalling the caller. A batch of frames (e.g. an ISO-TP block of
+consecutive frames) is queued in one call with the separation time to keep between its frames;
+the writer paces them against the time the previous frame of a batch was actually sent.
+
+Single frames queued with put() (flow control, single and first frames) are not paced by a batch:
+they are kept apart and sent ahead of the batch frames still queued, also while the writer waits
+for the separation time of the next batch frame.
+"""
+import errno
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional, Sequence
+import can
+
+# Backoff after a failed send, doubled on each retry
+INITIAL_BACKOFF = 0.00002
+MAX_BACKOFF = 0.002
+
+# Time before a deadline at which sleeping stops and busy waiting starts
+SPIN_THRESHOLD = 0.0005
+
+
+def wait_until(deadline: float):
+    """Block until time.perf_counter() reaches `deadline`, sleeping first and spinning for the remainder."""
+    remaining = deadline - time.perf_counter()
+    if remaining > SPIN_THRESHOLD:
+        time.sleep(remaining - SPIN_THRESHOLD)
+    while time.perf_counter() < deadline:
+        pass
+
+
+def is_no_buffer_space(error: BaseException) -> bool:
+    """Return True if a send failed because the transmit buffer of the interface was full."""
+    while error is not None:
+        if getattr(error, "errno", None) == errno.ENOBUFS or getattr(error, "error_code", None) == errno.ENOBUFS:
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class _Batch:
+    __slots__ = ("remaining", "on_complete", "error")
+
+    def __init__(self, size: int, on_complete: Optional[Callable[[Optional[Exception]], None]]):
+        self.remaining = size
+        self.on_complete = on_complete
+        self.error: Optional[Exception] = None
+
+
+class TxQueue:
+    """Bounded frame queue served by a writer thread."""
+
+    def __init__(self, transmit: Callable[[can.Message], None], size: int,
+                 on_done: Callable[[can.Message], None] = None,
+                 on_failed: Callable[[can.Message, Exception], None] = None,
+                 on_retry: Callable[[can.Message, Exception], None] = None,
+                 retries: int = 3, enobufs_timeout: float = 1.0, name: str = "CAN-TX"):
+        """
+        Args:
+            transmit: Sends one frame, raising on failure (bus.send plus the bookkeeping of the caller)
+            size: Maximum number of queued frames, put() blocks when the queue is full
+            on_done: Called with every frame once it was sent or given up, e.g. to reuse the message
+            on_failed: Called with a frame given up and the last error
+            on_retry: Called with a frame and the error before each retry
+            retries: Attempts for errors other than ENOBUFS
+            enobufs_timeout: Time in seconds a frame is retried while the transmit buffer is full
+        """
+        if size <= 0:
+            raise ValueError("size must be greater than 0.")
+        self._transmit = transmit
+        self._size = size
+        self._on_done = on_done
+        self._on_failed = on_failed
+        self._on_retry = on_retry
+        self._retries = max(1, retries)
+        self._enobufs_timeout = enobufs_timeout
+        self._queue: deque = deque()  # Batch frames, (message, separation time before it, batch)
+        self._priority: deque = deque()  # Frames from put(), (message, separation time before it, None)
+        self._condition = threading.Condition()
+        self._running = True
+        self._paused = False
+        self._last_sent: Optional[float] = None
+        self._last_batch_sent: Optional[float] = None
+        self.frames_sent = 0
+        self.priority_frames = 0
+        self.frames_failed = 0
+        self.enobufs_retries = 0
+        self.retries = 0
+        self.max_depth = 0
+        self._thread = threading.Thread(target=self._run, daemon=True, name=name)
+        self._thread.start()
+
+    def __len__(self):
+        return len(self._queue) + len(self._priority)
+
+    def put(self, message: can.Message, separation_time: float = 0.0, timeout: Optional[float] = None) -> bool:
+        """
+        Queue one frame, sent ahead of the batch frames still queued.
+
+        Args:
+            separation_time: Minimum time in seconds between the previous frame sent and this one
+            timeout: Maximum time to wait for space in the queue, None waits indefinitely
+
+        Returns:
+            bool: False if the queue stayed full for `timeout` or is stopped
+        """
+        return self._put(self._priority, [(message, separation_time, None)], timeout, None)
+
+    def put_batch(self, messages: Sequence[can.Message], separation_time: float = 0.0,
+                  initial_separation: float = 0.0,
+                  on_complete: Optional[Callable[[Optional[Exception]], None]] = None,
+                  timeout: Optional[float] = None) -> bool:
+        """
+        Queue frames to be sent back to back, in order.
+
+        Args:
+            separation_time: Minimum time in seconds between two frames of the batch
+            initial_separation: Minimum time between the frame sent before the batch and its first frame
+            on_complete: Called from the writer thread with None once every frame was sent, or with
+                         the error of the first frame given up (the rest of the batch is dropped)
+            timeout: Maximum time to wait for space in the queue, None waits indefinitely
+
+        Returns:
+            bool: False if the queue stayed full for `timeout` or is stopped, the frames of the
+            batch already queued are then dropped and on_complete is not called
+        """
+        if not messages:
+            if on_complete is not None:
+                on_complete(None)
+            return True
+        batch = _Batch(len(messages), on_complete)
+        entries = [(message, separation_time if index else initial_separation, batch)
+                   for index, message in enumerate(messages)]
+        return self._put(self._queue, entries, timeout, batch)
+
+    def _put(self, lane: deque, entries, timeout: Optional[float], batch: Optional[_Batch]) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        index = 0
+        with self._condition:
+            while index < len(entries):
+                free = self._size - len(self)
+                if free <= 0:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if not self._running or (remaining is not None and remaining <= 0):
+                        break
+                    self._condition.wait(remaining)
+                    continue
+                if not self._running:
+                    break
+                lane.extend(entries[index:index + free])
+                index += free
+                if len(self) > self.max_depth:
+                    self.max_depth = len(self)
+                self._condition.notify_all()
+            else:
+                return True
+            if batch is not None:
+                # The caller is told by the return value, the frames already queued are dropped
+                batch.error = can.CanOperationError("Transmit queue full")
+                batch.on_complete = None
+        return False
+
+    def _run(self):
+        while True:
+            with self._condition:
+                entry, deadline = self._next()
+                if entry is None:
+                    return
+                self._condition.notify_all()  # Space for a waiting producer
+
+            message, separation_time, batch = entry
+            if batch is not None and batch.error is not None:
+                self._finish(message)  # An earlier frame of the batch was given up
+                continue
+            if deadline is not None:
+                wait_until(deadline)
+
+            error = self._send(message)
+            self._last_sent = time.perf_counter()
+            if error is None:
+                self.frames_sent += 1
+                if batch is None:
+                    self.priority_frames += 1
+                else:
+                    self._last_batch_sent = self._last_sent
+                    batch.remaining -= 1
+                    if batch.remaining == 0 and batch.on_complete is not None:
+                        batch.on_complete(None)
+            else:
+                self.frames_failed += 1
+                if self._on_failed is not None:
+                    self._on_failed(message, error)
+                if batch is not None:
+                    batch.error = error
+                    if batch.on_complete is not None:
+                        batch.on_complete(error)
+            self._finish(message)
+
+    def _next(self):
+        """
+        Wait for the next frame to send, called with the condition held.
+
+        A batch frame is taken off the queue only shortly before its separation time ends, until then
+        the writer waits on the condition so that a frame queued by put() meanwhile is sent first.
+
+        Returns:
+            The entry and the time.perf_counter() deadline to wait for before sending it (or None),
+            (None, None) once the queue is stopped
+        """
+        while self._running:
+            if self._paused:
+                self._condition.wait()
+                continue
+            if self._priority:
+                entry = self._priority.popleft()
+                separation_time = entry[1]
+                if separation_time and self._last_sent is not None:
+                    return entry, self._last_sent + separation_time
+                return entry, None
+            if not self._queue:
+                self._condition.wait()
+                continue
+            _, separation_time, batch = self._queue[0]
+            if batch.error is not None or not separation_time or self._last_batch_sent is None:
+                return self._queue.popleft(), None
+            deadline = self._last_batch_sent + separation_time
+            remaining = deadline - time.perf_counter()
+            if remaining <= SPIN_THRESHOLD:
+                return self._queue.popleft(), deadline
+            self._condition.wait(remaining - SPIN_THRESHOLD)
+        return None, None
+
+    def _send(self, message: can.Message) -> Optional[Exception]:
+        """Send a frame, retrying with a short exponential backoff. Return the last error if given up."""
+        backoff = INITIAL_BACKOFF
+        attempts = 0
+        enobufs_deadline = None
+        while True:
+            try:
+                self._transmit(message)
+                return None
+            except Exception as e:
+                if self._paused:
+                    # The bus is being reconnected, the frame is sent again once it is back
+                    with self._condition:
+                        while self._running and self._paused:
+                            self._condition.wait()
+                    if not self._running:
+                        return e
+                    backoff = INITIAL_BACKOFF
+                    attempts = 0
+                    enobufs_deadline = None
+                    continue
+                if is_no_buffer_space(e):
+                    # The controller's buffer is full: the frame is retried until it drains
+                    now = time.perf_counter()
+                    if enobufs_deadline is None:
+                        enobufs_deadline = now + self._enobufs_timeout
+                    elif now >= enobufs_deadline:
+                        return e
+                    self.enobufs_retries += 1
+                else:
+                    attempts += 1
+                    if attempts >= self._retries or not self._running:
+                        return e
+                self.retries += 1
+                if self._on_retry is not None:
+                    self._on_retry(message, e)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+
+    def _finish(self, message: can.Message):
+        if self._on_done is not None:
+            self._on_done(message)
+
+    def pause(self):
+        """Hold the queued frames, e.g. while the bus is reconnected. A frame failing meanwhile is kept."""
+        with self._condition:
+            self._paused = True
+
+    def resume(self):
+        with self._condition:
+            self._paused = False
+            self._last_sent = None  # The bus was idle, the next frame is not delayed
+            self._last_batch_sent = None
+            self._condition.notify_all()
+
+    def is_paused(self) -> bool:
+        return self._paused
+
+    def stop(self, timeout: float = 1.0):
+        """Stop the writer, the frames still queued are dropped."""
+        with self._condition:
+            self._running = False
+            dropped = list(self._priority) + list(self._queue)
+            self._priority.clear()
+            self._queue.clear()
+            self._condition.notify_all()
+        for message, _, batch in dropped:
+            if batch is not None and batch.error is None:
+                batch.error = can.CanOperationError("Transmit queue stopped")
+                if batch.on_complete is not None:
+                    batch.on_complete(batch.error)
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def get_statistics(self) -> Dict:
+        return {
+            "tx_queue_depth": len(self),
+            "tx_queue_max_depth": self.max_depth,
+            "tx_queue_size": self._size,
+            "tx_queue_sent": self.frames_sent,
+            "tx_queue_priority_sent": self.priority_frames,
+            "tx_queue_failed": self.frames_failed,
+            "tx_queue_retries": self.retries,
+            "tx_queue_enobufs_retries": self.enobufs_retries,
+        }
@@ -0,0 +1,268 @@
+"""
+In-process virtual CAN bus.
+
+VirtualBus is a python-can bus whose frames are exchanged with the other VirtualBus instances
+of the same channel in the process, so that several CANCommunication instances (a tester and
+simulated ECUs) can be linked without hardware or a vcan interface.
+
+Without bitrate timing a frame is delivered to the other nodes from the sending thread, before
+send() returns. With bitrate timing a wire thread per channel transmits the queued frames one
+at a time: the frame that wins arbitration (lowest identifier) among the frames pending when the
+bus becomes free is delivered after its transmission time at the bitrate, computed from its
+exact bit count (can_layer.bus_load.frame_bits). Frame loss and delivery latency are drawn from
+a seeded generator, so a run can be reproduced.
+"""
+import errno
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+import sys
+import os
+import can
+current_dir = os.path.dirname(os.path.abspath(__file__))
+package_dir = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(package_dir)
+from can_layer.bus_load import frame_bits
+from can_layer.models import VirtualBusConfig
+
+
+def _arbitration_key(message: can.Message) -> Tuple[int, int, int, int]:
+    """
+    Sort key of a frame in arbitration, the smallest wins.
+    The base identifier is compared first; a standard frame beats an extended frame with the same
+    base identifier and a data frame beats a remote frame.
+    """
+    if message.is_extended_id:
+        return message.arbitration_id >> 18, 1, message.arbitration_id & 0x3FFFF, int(message.is_remote_frame)
+    return message.arbitration_id, 0, 0, int(message.is_remote_frame)
+
+
+class VirtualCANHub:
+    """The wire of one virtual channel, shared by the VirtualBus nodes attached to it."""
+
+    def __init__(self, channel, bitrate: int, data_bitrate: Optional[int], config: VirtualBusConfig):
+        if not 0.0 <= config.loss_rate <= 1.0:
+            raise ValueError("loss_rate must be between 0 and 1.")
+        if config.latency < 0 or config.latency_jitter < 0:
+            raise ValueError("latency and latency_jitter must be greater than or equal to 0.")
+        self.channel = channel
+        self.bitrate = bitrate
+        self.data_bitrate = data_bitrate or bitrate
+        self.config = config
+        self._nodes: List["VirtualBus"] = []
+        self._random = random.Random(config.seed)
+        self._condition = threading.Condition()  # Guards the nodes, their transmit queues and the generator
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self._bus_free_at = 0.0  # Ideal end of the last transmitted frame (perf_counter)
+        self.frames_transmitted = 0
+        self.frames_lost = 0
+        self.busy_time = 0.0
+
+    def attach(self, node: "VirtualBus"):
+        with self._condition:
+            self._nodes.append(node)
+            if self.config.bitrate_timing and not self._running:
+                self._running = True
+                self._thread = threading.Thread(target=self._run, daemon=True,
+                                                name=f"VirtualCAN-{self.channel}")
+                self._thread.start()
+
+    def detach(self, node: "VirtualBus") -> bool:
+        """Remove a node, return True when it was the last one."""
+        with self._condition:
+            if node in self._nodes:
+                self._nodes.remove(node)
+            if self._nodes:
+                return False
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+        return True
+
+    def transmit(self, node: "VirtualBus", message: can.Message, timeout: Optional[float]):
+        """Deliver a frame now, or queue it for the wire thread when bitrate timing is enabled."""
+        with self._condition:
+            if not self.config.bitrate_timing:
+                self.frames_transmitted += 1
+                self._deliver(node, message, bytes(message.data))
+                return
+            # The transmit queue models the controller's buffer: a full queue blocks the sender
+            if not self._condition.wait_for(lambda: len(node.tx_queue) < node.tx_queue_size or not self._running,
+                                            timeout):
+                raise can.CanOperationError("Virtual CAN transmit queue full", error_code=errno.ENOBUFS)
+            if not self._running:
+                raise can.CanOperationError("Virtual CAN channel closed")
+            # The payload is copied now, the caller may reuse its buffer once send() returns
+            node.tx_queue.append((time.perf_counter(), message, bytes(message.data)))
+            self._condition.notify_all()
+
+    def _run(self):
+        """Wire thread: transmit the queued frames one by one in arbitration order."""
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: not self._running or any(node.tx_queue for node in self._nodes))
+                if not self._running:
+                    return
+                heads = [(node.tx_queue[0][0], node) for node in self._nodes if node.tx_queue]
+                # Frames queued before the bus became free all take part in the arbitration
+                cutoff = max(self._bus_free_at, min(queued_at for queued_at, _ in heads))
+                sender = min((node for queued_at, node in heads if queued_at <= cutoff),
+                             key=lambda node: _arbitration_key(node.tx_queue[0][1]))
+                queued_at, message, data = sender.tx_queue.popleft()
+                self._condition.notify_all()  # A sender blocked on a full queue can continue
+
+            nominal_bits, data_bits = frame_bits(message.arbitration_id, data, message.is_extended_id,
+                                                 message.is_fd, message.bitrate_switch, message.is_remote_frame,
+                                                 message.dlc)
+            duration = nominal_bits / self.bitrate + data_bits / self.data_bitrate
+            # Frames follow each other on the ideal timeline, so sleep overshoot does not reduce the throughput
+            end = max(queued_at, self._bus_free_at) + duration
+            remaining = end - time.perf_counter()
+            if remaining > 0:
+                time.sleep(remaining)
+            self._bus_free_at = end
+
+            with self._condition:
+                self.frames_transmitted += 1
+                self.busy_time += duration
+                self._deliver(sender, message, data)
+
+    def _deliver(self, sender: "VirtualBus", message: can.Message, data: bytes):
+        """Hand a frame to the receive queue of every node, called with the lock held."""
+        timestamp = time.time()
+        config = self.config
+        for node in self._nodes:
+            if node is sender and not node.receive_own_messages:
+                continue
+            if config.loss_rate and self._random.random() < config.loss_rate:
+                self.frames_lost += 1
+                continue
+            delay = config.latency
+            if config.latency_jitter:
+                delay += self._random.uniform(0.0, config.latency_jitter)
+            node.put(can.Message(timestamp=timestamp, arbitration_id=message.arbitration_id,
+                                 is_extended_id=message.is_extended_id, is_remote_frame=message.is_remote_frame,
+                                 is_error_frame=message.is_error_frame, dlc=message.dlc, data=data,
+                                 is_fd=message.is_fd, bitrate_switch=message.bitrate_switch,
+                                 error_state_indicator=message.error_state_indicator, channel=self.channel,
+                                 is_rx=node is not sender),
+                     delay)
+
+    def get_statistics(self) -> Dict:
+        with self._condition:
+            return {
+                "nodes": len(self._nodes),
+                "frames_transmitted": self.frames_transmitted,
+                "frames_lost": self.frames_lost,
+                "busy_time": self.busy_time,
+            }
+
+
+_hubs: Dict[object, VirtualCANHub] = {}
+_hubs_lock = threading.Lock()
+
+
+def get_hub(channel) -> Optional[VirtualCANHub]:
+    """Return the hub of a virtual channel, None if no node is attached."""
+    return _hubs.get(channel)
+
+
+class VirtualBus(can.BusABC):
+    """python-can bus attached to an in-process virtual channel."""
+
+    def __init__(self, channel=0, bitrate: int = 500000, data_bitrate: Optional[int] = None, fd: bool = False,
+                 config: Optional[VirtualBusConfig] = None, can_filters=None, **kwargs):
+        """
+        Args:
+            channel: Name of the virtual channel, the nodes with the same channel see each other's frames
+            bitrate: Nominal bitrate, all the nodes of a channel must use the same
+            data_bitrate: CAN FD data phase bitrate
+            fd: CAN FD node
+            config: Timing, loss and latency of the channel, taken from the first node attached.
+                    receive_own_messages and tx_queue_size apply to this node.
+            can_filters: python-can acceptance filters
+        """
+        config = config or VirtualBusConfig()
+        if config.tx_queue_size <= 0:
+            raise ValueError("tx_queue_size must be greater than 0.")
+        with _hubs_lock:
+            hub = _hubs.get(channel)
+            if hub is None:
+                hub = _hubs[channel] = VirtualCANHub(channel, bitrate, data_bitrate if fd else None, config)
+            elif hub.bitrate != bitrate:
+                raise can.CanInitializationError(
+                    f"Virtual channel {channel} runs at {hub.bitrate} bit/s, not {bitrate} bit/s")
+            self._hub = hub
+            self.channel_info = f"Virtual CAN channel {channel}"
+            self.receive_own_messages = config.receive_own_messages
+            self.tx_queue_size = config.tx_queue_size
+            self.tx_queue: deque = deque()  # (perf_counter when queued, message, payload), with bitrate timing
+            self._rx_queue: deque = deque()  # (monotonic delivery time, message)
+            self._rx_condition = threading.Condition()
+            self._last_delivery = 0.0
+            self.messages_sent = 0
+            self.messages_received = 0
+            self._fd = fd
+            super().__init__(channel=channel, can_filters=can_filters, **kwargs)
+            hub.attach(self)
+
+    def put(self, message: can.Message, delay: float = 0.0):
+        """Queue a received frame, readable after `delay` seconds. Frames are never reordered."""
+        with self._rx_condition:
+            deliver_at = 0.0
+            if delay:
+                deliver_at = max(time.monotonic() + delay, self._last_delivery)
+                self._last_delivery = deliver_at
+            self._rx_queue.append((deliver_at, message))
+            self._rx_condition.notify()
+
+    def send(self, msg: can.Message, timeout: Optional[float] = None):
+        self._check_open()
+        if msg.is_fd and not self._fd:
+            raise can.CanOperationError("CAN FD frame sent on a classic CAN node")
+        self._hub.transmit(self, msg, timeout)
+        self.messages_sent += 1
+
+    def _recv_internal(self, timeout: Optional[float]) -> Tuple[Optional[can.Message], bool]:
+        self._check_open()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._rx_condition:
+            while not self._is_shutdown:
+                now = time.monotonic()
+                if self._rx_queue:
+                    deliver_at, message = self._rx_queue[0]
+                    if deliver_at <= now:
+                        self._rx_queue.popleft()
+                        self.messages_received += 1
+                        return message, False
+                    wait = deliver_at - now
+                else:
+                    wait = None
+                if deadline is not None:
+                    if now >= deadline:
+                        return None, False
+                    wait = deadline - now if wait is None else min(wait, deadline - now)
+                self._rx_condition.wait(wait)
+            return None, False
+
+    def _check_open(self):
+        if self._is_shutdown:
+            raise can.CanOperationError("Virtual CAN bus is shut down")
+
+    def get_statistics(self) -> Dict:
+        """Return the counters of the channel."""
+        return self._hub.get_statistics()
+
+    def shutdown(self):
+        if self._is_shutdown:
+            return
+        super().shutdown()
+        with _hubs_lock:
+            if self._hub.detach(self) and _hubs.get(self._hub.channel) is self._hub:
+                del _hubs[self._hub.channel]
+        with self._rx_condition:
+            self._rx_condition.notify_all()
@@ -0,0 +1,150 @@
+"""
+Several CAN channels served in parallel.
+
+Every channel has its own CANCommunication (bus, reception thread, optional TX queue) and its
+own IsoTp instance, so the sessions of ECUs on different buses never share a thread or a lock.
+Sessions are routed to a channel by the target ID of their address (address._rxid, the ID the
+requests are sent to); the responses received on a channel are handled by the IsoTp of that
+channel, which also sends its flow control frames there. ChannelManager.send has the signature
+of IsoTp.send, so a single UdsClient can drive the ECUs of every channel.
+"""
+import copy
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Union
+from bitarray import bitarray
+import sys
+import os
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+from can_layer.can_communication import CANCommunication, CANConfiguration
+from can_layer.CanExceptions import CANConfigurationError
+from iso_tp_layer.Address import Address
+from iso_tp_layer.IsoTp import IsoTp
+from iso_tp_layer.IsoTpConfig import IsoTpConfig
+from logger import get_logger, LogType, ProtocolType
+
+
+@dataclass
+class Channel:
+    """One CAN channel with its protocol stack."""
+    name: str
+    can: CANCommunication
+    isotp: IsoTp
+
+
+class ChannelManager:
+    """Opens several CAN channels and routes ISO-TP sessions to them by address."""
+
+    def __init__(self, isotp_config: IsoTpConfig, auto_filters: bool = True):
+        """
+        Args:
+            isotp_config: ISO-TP settings, copied for every channel (callbacks and recv_id included)
+            auto_filters: Keep the acceptance filters of every channel to the IDs registered on it,
+                          see CANCommunication.update_rx_filters
+        """
+        self._isotp_config = isotp_config
+        self._auto_filters = auto_filters
+        self._channels: Dict[str, Channel] = {}
+        self._routes: Dict[int, str] = {}  # Target ID -> channel name
+        self._lock = threading.Lock()
+        self.logger = get_logger(ProtocolType.CAN)
+
+    def add_channel(self, name: str, can_config: CANConfiguration,
+                    isotp_config: Optional[IsoTpConfig] = None) -> Channel:
+        """
+        Open a channel and start receiving on it.
+
+        Args:
+            name: Name of the channel, used in the routes
+            can_config: Bus settings of the channel, its recv_callback is replaced by the channel's IsoTp
+            isotp_config: ISO-TP settings of this channel, a copy of the manager's settings if None
+        """
+        with self._lock:
+            if name in self._channels:
+                raise CANConfigurationError(f"Channel {name} already exists")
+        isotp = IsoTp(copy.copy(isotp_config or self._isotp_config))
+        can_config.recv_callback = isotp.recv_can_message
+        try:
+            can_comm = CANCommunication(can_config)
+        except Exception:
+            isotp.close()
+            raise
+        isotp.set_send_fn(can_comm.send_message)
+        if can_config.tx_queue_size > 0:
+            isotp.set_send_batch_fn(can_comm.send_batch)
+        isotp.set_bus_load_fn(can_comm.bus_load.get_load)
+        can_comm.add_connection_listener(isotp.on_connection_changed)
+        if self._auto_filters:
+            isotp.set_on_rx_ids_changed(can_comm.update_rx_filters)
+        can_comm.start_receiving()
+
+        channel = Channel(name=name, can=can_comm, isotp=isotp)
+        with self._lock:
+            self._channels[name] = channel
+        self.logger.log_message(log_type=LogType.INITIALIZATION,
+                                message=f"Channel {name} opened on {can_config.interface.name} channel {can_config.channel}")
+        return channel
+
+    def route(self, target_id: int, channel_name: str):
+        """Send the sessions addressed to `target_id` (address._rxid) on the given channel."""
+        with self._lock:
+            if channel_name not in self._channels:
+                raise CANConfigurationError(f"Unknown channel {channel_name}")
+            self._routes[target_id] = channel_name
+        self.logger.log_message(log_type=LogType.CONFIGURATION,
+                                message=f"ID 0x{target_id:X} routed to channel {channel_name}")
+
+    def unroute(self, target_id: int):
+        with self._lock:
+            self._routes.pop(target_id, None)
+
+    def get_channel(self, name: str) -> Channel:
+        return self._channels[name]
+
+    def get_channels(self) -> List[Channel]:
+        with self._lock:
+            return list(self._channels.values())
+
+    def channel_for(self, address: Address) -> Channel:
+        """Return the channel of an address; with a single channel, routes are optional."""
+        with self._lock:
+            name = self._routes.get(address._rxid)
+            if name is not None:
+                return self._channels[name]
+            if len(self._channels) == 1:
+                return next(iter(self._channels.values()))
+        raise CANConfigurationError(f"No channel routed for ID 0x{address._rxid:X}")
+
+    def send(self, data: Union[bytes, bytearray, bitarray], address: Address, on_success: Callable,
+             on_error: Callable):
+        """IsoTp.send on the channel of `address`."""
+        try:
+            channel = self.channel_for(address)
+        except CANConfigurationError as e:
+            self.logger.log_message(log_type=LogType.ERROR, message=f"{e}")
+            on_error(e)
+            return
+        channel.isotp.send(data, address, on_success, on_error)
+
+    def register_address(self, address: Address):
+        """IsoTp.register_address on the channel of `address`."""
+        self.channel_for(address).isotp.register_address(address)
+
+    def unregister_address(self, address: Address):
+        self.channel_for(address).isotp.unregister_address(address)
+
+    def get_statistics(self) -> Dict[str, Dict]:
+        """Return the bus statistics of every channel."""
+        return {channel.name: channel.can.get_bus_statistics() for channel in self.get_channels()}
+
+    def close(self):
+        """Close every channel."""
+        with self._lock:
+            channels = list(self._channels.values())
+            self._channels.clear()
+            self._routes.clear()
+        for channel in channels:
+            channel.isotp.close()
+            channel.can.close()
+            self.logger.log_message(log_type=LogType.ACKNOWLEDGMENT, message=f"Channel {channel.name} closed")
@@ -17,7 +17,7 @@ import sys
 import os
 from time import sleep
 from typing import List
-from logger import Logger, LogType, ProtocolType
+from logger import get_logger, LogType, ProtocolType
 import os
 import sys
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -54,7 +54,7 @@ class ECUUpdateClient:
         self.retry_delay = 5  # seconds
         self.running = False
         self.update_check_interval = 3600  # 1 hour
-        self.logger=Logger(protocol=ProtocolType.HMI_CLIENT)
+        self.logger=get_logger(ProtocolType.HMI_CLIENT)
         self.chunk_size = 8192  # 8KB chunks for file transfer
         self.uds_client=None
         current_dir = os.path.dirname(os.path.abspath(__file__))
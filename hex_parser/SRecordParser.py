@@ -8,7 +8,7 @@ from typing import List
 current_dir = os.path.dirname(os.path.abspath(__file__))
 package_dir = os.path.abspath(os.path.join(current_dir, ".."))
 sys.path.append(package_dir)
-from logger import Logger, LogType, ProtocolType
+from logger import get_logger, LogType, ProtocolType
 
 
 class RecordType(Enum):
@@ -85,7 +85,7 @@ class SRecordParser:
         self._records_count = -1
         self._start_address = -1
         self._file_extension = None
-        self._logger = Logger(ProtocolType.HEX_PARSER)
+        self._logger = get_logger(ProtocolType.HEX_PARSER)
         self._logger.log_message(log_type=LogType.INITIALIZATION,
                                  message="Parser Initialized Successfully.")
         
@@ -21,6 +21,11 @@ class Address:
         self._txid = txid
         self._rxid = rxid
 
+    @property
+    def key(self) -> tuple:
+        """Hashable identity of the address, used to index ISO-TP sessions: (txid, rxid, addressing mode)."""
+        return self._txid, self._rxid, getattr(self.addressing_mode, "value", self.addressing_mode)
+
     def __repr__(self):
         return (f"Address(addressing_mode={self.addressing_mode}, "
                 f"txid={self._txid}, rxid={self._rxid})")
@@ -0,0 +1,377 @@
+"""
+asyncio facade of the ISO-TP layer.
+
+AsyncIsoTp runs the transfers of every session on one event loop: `await send(data, address)`
+returns once the message is sent (or raises the ISO-TP error), and `async for message in
+recv(address)` yields the messages received from a peer. The received CAN frames are processed
+inline on the loop (see CANCommunication.start_receiving_async), the flow control frames wake
+the sending coroutine directly and STmin (plus the extra separation time of the bus load
+governor) is kept with loop timers, so no thread is started per frame or per transfer; a
+sub-millisecond STmin is rounded up to the resolution of those timers. The N_Cr receive
+timeouts are still served by the single timer thread of the underlying IsoTp; like the other
+errors of a reception (wrong sequence number, ...) they are handed back to the loop and raised
+by the receive() or recv() call of that peer.
+
+The send function of the CAN layer may block (bus.send, retries, a reconnection), so frames are
+never sent from the loop: they are handed to one sending thread of the facade, which keeps
+their order, and the coroutine awaits the result. With a CAN transmit queue
+(CANConfiguration.tx_queue_size > 0, IsoTp.set_send_batch_fn) the consecutive frames of a block
+are handed to the CAN writer thread at once instead, and the coroutine only awaits their
+completion.
+"""
+import asyncio
+import copy
+import functools
+from concurrent.futures import Future, ThreadPoolExecutor
+import threading
+import time
+from typing import AsyncIterator, Callable, Dict, Optional, Union
+from bitarray import bitarray
+import can
+import sys
+import os
+current_dir = os.path.dirname(os.path.abspath(__file__))
+package_dir = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(package_dir)
+from iso_tp_layer.Address import Address
+from iso_tp_layer.IsoTp import IsoTp
+from iso_tp_layer.IsoTpConfig import IsoTpConfig
+from iso_tp_layer.Exceptions import MessageLengthExceededException, FlowStatusAbortException, \
+    InvalidFlowStatusException, TimeoutException, TransmitQueueFullException
+from iso_tp_layer.frames.FlowStatus import FlowStatus
+from iso_tp_layer.frames.FrameCodec import MAX_FRAME_LENGTH, FF_DL_MAX, decode_frame, encode_single, \
+    encode_first, encode_consecutive, first_frame_header_length, single_frame_capacity
+from iso_tp_layer.send_request.SendRequest import BATCH_FRAMES
+from iso_tp_layer.send_request.StminPacer import decode_stmin
+from iso_tp_layer.IsoTpMetrics import MESSAGES, FLOW_CONTROL_WAITS, TIMEOUTS, RX_FRAMES_BY_PCI
+from logger import get_logger, LogType, ProtocolType
+
+
+class _ExecutorIsoTp(IsoTp):
+    """
+    IsoTp whose flow control frames, sent while a frame is processed on the loop, go to the sending
+    thread, and whose receive sessions report their errors with the address of the peer.
+    """
+
+    def __init__(self, config: IsoTpConfig, executor: ThreadPoolExecutor, on_session_error: Callable):
+        super().__init__(config)
+        self._executor = executor
+        self._on_session_error = on_session_error
+
+    def _recv_error_fn(self, address: Address) -> Callable:
+        return functools.partial(self._on_session_error, address)
+
+    def _send_frame(self, address: Address, frame):
+        self._executor.submit(IsoTp._send_frame, self, address, frame).add_done_callback(self._on_frame_sent)
+
+    def _on_frame_sent(self, future: Future):
+        if future.exception() is not None:
+            self.logger.log_message(log_type=LogType.ERROR, message=f"Failed to send frame: {future.exception()}")
+
+
+class AsyncIsoTp:
+    """Awaitable send and receive over an IsoTp instance, all sessions driven by one event loop."""
+
+    def __init__(self, iso_tp_config: IsoTpConfig, loop: Optional[asyncio.AbstractEventLoop] = None,
+                 recv_queue_size: int = 64, tx_padding: int = 0xFF):
+        """
+        :param iso_tp_config: ISO-TP settings. The configuration is copied: its receive callbacks
+                              are replaced by the queues of recv() and the dispatcher is not used.
+        :param loop: Event loop running the sessions, the running loop of the first call if None.
+        :param recv_queue_size: Received messages kept per peer until recv() takes them; the oldest
+                                message is dropped when the queue is full.
+        :param tx_padding: Padding byte of the single and consecutive frames.
+        """
+        if recv_queue_size <= 0:
+            raise ValueError("recv_queue_size must be greater than 0.")
+        config = copy.copy(iso_tp_config)
+        config.on_recv_success = self._on_recv_success
+        config.on_recv_error = self._on_recv_error
+        config.dispatcher_workers = 0
+        self._config = config
+        # One thread sends every frame, in order, so that the loop never waits for the CAN layer
+        self._send_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="AsyncIsoTpSend")
+        # Reassembly, flow control of the received messages and CAN wiring
+        self.isotp = _ExecutorIsoTp(config, self._send_executor, self._on_session_error)
+        self._loop = loop
+        self._loop_thread: Optional[int] = None  # Thread of the loop, known once a coroutine ran on it
+        self._recv_queue_size = recv_queue_size
+        self._tx_padding = tx_padding
+        self._recv_queues: Dict[int, asyncio.Queue] = {}  # Received messages by peer ID (address._txid)
+        self._flow_controls: Dict[int, asyncio.Queue] = {}  # Flow control frames of the active senders
+        self._send_locks: Dict[int, asyncio.Lock] = {}  # One transfer at a time per peer
+        self.logger = get_logger(ProtocolType.ISO_TP)
+        try:
+            # Created from a coroutine: bound to its loop right away
+            self._bind_loop()
+        except RuntimeError:
+            pass
+
+    def _bind_loop(self) -> asyncio.AbstractEventLoop:
+        """Bind the facade to the running loop, called from its coroutines."""
+        loop = asyncio.get_running_loop()
+        if self._loop is None:
+            self._loop = loop
+        elif loop is not self._loop:
+            raise RuntimeError("AsyncIsoTp is used from another event loop than its own.")
+        self._loop_thread = threading.get_ident()
+        return loop
+
+    def _on_loop(self) -> bool:
+        return self._loop_thread is not None and threading.get_ident() == self._loop_thread
+
+    def recv_can_message(self, message: can.Message):
+        """
+        Receive callback of CANCommunication. Called on the loop (start_receiving_async) the frame is
+        processed right away; called from another thread, it is handed over to the loop.
+        """
+        if self._on_loop():
+            self._process_can_message(message)
+        elif self._loop is not None:
+            self._loop.call_soon_threadsafe(self._process_can_message, message)
+        else:
+            self.logger.log_message(log_type=LogType.WARNING,
+                                    message=f"Frame 0x{message.arbitration_id:X} received before the event loop is bound, dropped")
+
+    def _process_can_message(self, message: can.Message):
+        data = message.data
+        if data and data[0] & 0xF0 == 0x30:
+            # Flow control frames go straight to the sending coroutine of that peer
+            RX_FRAMES_BY_PCI[3].inc()
+            queue = self._flow_controls.get(message.arbitration_id)
+            if queue is None:
+                self.logger.log_message(log_type=LogType.WARNING,
+                                        message=f"Flow control frame from 0x{message.arbitration_id:X} without active transfer")
+                return
+            try:
+                queue.put_nowait(decode_frame(data))
+            except ValueError as e:
+                self.logger.log_message(log_type=LogType.ERROR, message=f"Invalid flow control frame: {e}")
+            return
+        self.isotp.process_can_message(message)
+
+    def _on_recv_success(self, message, address: Address):
+        if self._on_loop():
+            self._deliver(message, address)
+        else:
+            self._loop.call_soon_threadsafe(self._deliver, message, address)
+
+    def _deliver(self, message, address: Address):
+        queue = self._get_recv_queue(address._txid)
+        if queue.full():
+            queue.get_nowait()
+            self.logger.log_message(log_type=LogType.WARNING,
+                                    message=f"Receive queue of 0x{address._txid:X} full, oldest message dropped")
+        queue.put_nowait(message)
+
+    def _on_recv_error(self, error: Exception):
+        # A frame that belongs to no reception (e.g. an invalid one), there is nobody to tell
+        self.logger.log_message(log_type=LogType.WARNING, message=f"Reception failed: {error}")
+
+    def _on_session_error(self, address: Address, error: Exception):
+        """A reception from `address` failed: the error is queued like a message, in arrival order."""
+        self.logger.log_message(log_type=LogType.WARNING, message=f"Reception from {address} failed: {error}")
+        if self._on_loop():
+            self._deliver(error, address)
+        elif self._loop is not None:
+            self._loop.call_soon_threadsafe(self._deliver, error, address)
+
+    def _get_recv_queue(self, peer_id: int) -> asyncio.Queue:
+        queue = self._recv_queues.get(peer_id)
+        if queue is None:
+            queue = self._recv_queues[peer_id] = asyncio.Queue(self._recv_queue_size)
+        return queue
+
+    async def recv(self, address: Address) -> AsyncIterator[Union[bitarray, memoryview]]:
+        """
+        Yield the messages received from a peer, in arrival order, until the iteration is stopped.
+        :param address: The address of the peer, as given to send(); its frames arrive on address._txid.
+        :raises IsoTpException: A reception from the peer failed (N_Cr timeout, wrong sequence number, ...),
+                                which ends the iteration.
+        """
+        self._bind_loop()
+        queue = self._get_recv_queue(address._txid)
+        # The peer's frames must pass the acceptance filters while someone listens
+        self.isotp.register_address(address)
+        try:
+            while True:
+                yield _message(await queue.get())
+        finally:
+            self.isotp.unregister_address(address)
+
+    async def receive(self, address: Address, timeout: Optional[float] = None) -> Union[bitarray, memoryview]:
+        """
+        Wait for the next message of a peer.
+        :param timeout: Time in seconds, asyncio.TimeoutError is raised when it expires. None waits forever.
+        :raises IsoTpException: The reception of that message failed (N_Cr timeout, wrong sequence number, ...).
+        """
+        self._bind_loop()
+        self.isotp.register_address(address)
+        try:
+            return _message(await asyncio.wait_for(self._get_recv_queue(address._txid).get(), timeout))
+        finally:
+            self.isotp.unregister_address(address)
+
+    async def send(self, data: Union[bytes, bytearray, bitarray], address: Address,
+                   on_progress: Optional[Callable[[float], None]] = None):
+        """
+        Send a message and return once its last frame was sent.
+        :param data: The message.
+        :param address: The address of the peer: frames are sent to address._rxid, its flow control
+                        frames arrive on address._txid.
+        :param on_progress: Called with the sent fraction (0.0-1.0) after every frame or batch.
+        :raises IsoTpException: Flow control timeout (N_Bs), abort or invalid flow status, message too long.
+        """
+        loop = self._bind_loop()
+        data = data.tobytes() if isinstance(data, bitarray) else bytes(data)
+        lock = self._send_locks.get(address._txid)
+        if lock is None:
+            lock = self._send_locks[address._txid] = asyncio.Lock()
+        async with lock:
+            self.isotp.register_address(address)
+            self._flow_controls[address._txid] = asyncio.Queue()
+            try:
+                if len(data) <= single_frame_capacity(self._config.tx_dl):
+                    await self._send_to_can(loop, address, encode_single(bytearray(MAX_FRAME_LENGTH), data, self._tx_padding))
+                else:
+                    await self._send_multi_frame(loop, data, address, on_progress)
+                MESSAGES.labels("tx", "success").inc()
+            except Exception as e:
+                MESSAGES.labels("tx", "error").inc()
+                self.logger.log_message(log_type=LogType.ERROR, message=f"Error while sending message to {address}: {e}")
+                raise
+            finally:
+                del self._flow_controls[address._txid]
+                self.isotp.unregister_address(address)
+        if on_progress is not None:
+            on_progress(1.0)
+
+    async def _send_multi_frame(self, loop: asyncio.AbstractEventLoop, data: bytes, address: Address,
+                                on_progress: Optional[Callable[[float], None]]):
+        total_length = len(data)
+        if total_length > FF_DL_MAX:
+            raise MessageLengthExceededException()
+        tx_dl = self._config.tx_dl
+        cf_data_length = tx_dl - 1
+        frame_buffer = bytearray(MAX_FRAME_LENGTH)
+        first_length = tx_dl - first_frame_header_length(total_length)
+        await self._send_to_can(loop, address, encode_first(frame_buffer, total_length, data[:first_length]))
+
+        remaining = memoryview(data)[first_length:]
+        index = 0
+        sequence_number = 1
+        batched = self._config.send_batch_fn is not None
+        batch_buffer = memoryview(bytearray(BATCH_FRAMES * MAX_FRAME_LENGTH)) if batched else None
+        while index < len(remaining):
+            block_size, stmin = await self._wait_flow_control(address)
+            flow_controls = self._flow_controls[address._txid]
+            block_end = len(remaining)
+            if block_size > 0:
+                block_end = min(block_end, index + block_size * cf_data_length)
+
+            if batched:
+                first_batch = True
+                while index < block_end:
+                    _check_abort(flow_controls)
+                    interval = stmin + self._extra_stmin()
+                    frames = []
+                    offset = 0
+                    while index < block_end and len(frames) < BATCH_FRAMES:
+                        frames.append(encode_consecutive(batch_buffer[offset:offset + MAX_FRAME_LENGTH], sequence_number,
+                                                         remaining[index:index + cf_data_length], self._tx_padding))
+                        offset += MAX_FRAME_LENGTH
+                        index += cf_data_length
+                        sequence_number = (sequence_number + 1) % 16
+                    sent = loop.create_future()
+                    on_complete = lambda error: loop.call_soon_threadsafe(_set_result, sent, error)
+                    if not self.isotp._send_batch_to_can(address, frames, interval, 0.0 if first_batch else interval,
+                                                         on_complete):
+                        raise TransmitQueueFullException()
+                    first_batch = False
+                    # The batch buffer is reused by the next batch once these frames are sent
+                    error = await sent
+                    if error is not None:
+                        raise error
+                    if on_progress is not None:
+                        on_progress(min(first_length + index, total_length) / total_length)
+            else:
+                # The first frame after a flow control frame is not delayed
+                due = time.perf_counter()
+                while index < block_end:
+                    await _sleep_until(loop, due)
+                    _check_abort(flow_controls)
+                    await self._send_to_can(loop, address, encode_consecutive(frame_buffer, sequence_number,
+                                                                              remaining[index:index + cf_data_length],
+                                                                              self._tx_padding))
+                    due = time.perf_counter() + stmin + self._extra_stmin()
+                    index += cf_data_length
+                    sequence_number = (sequence_number + 1) % 16
+                    if on_progress is not None:
+                        on_progress(min(first_length + index, total_length) / total_length)
+
+    def _extra_stmin(self) -> float:
+        """Separation time added to STmin by the bus load governor of the underlying IsoTp, if any."""
+        governor = self.isotp._governor
+        return governor.get_extra_stmin() if governor is not None else 0.0
+
+    def _send_to_can(self, loop: asyncio.AbstractEventLoop, address: Address, frame) -> asyncio.Future:
+        """Send one frame from the sending thread; the frame buffer may be reused once the result is awaited."""
+        return loop.run_in_executor(self._send_executor, self.isotp._send_to_can, address, frame)
+
+    async def _wait_flow_control(self, address: Address) -> tuple:
+        """Wait for a Continue flow control frame of the peer (N_Bs). Return (block size, STmin in seconds)."""
+        queue = self._flow_controls[address._txid]
+        timeout = self._config.timeout / 1000.0 if self._config.timeout > 0 else None
+        while True:
+            try:
+                control_frame = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                TIMEOUTS.labels("N_Bs").inc()
+                raise TimeoutException()
+            flow_status = control_frame.flowStatus
+            if flow_status == FlowStatus.Continue:
+                return control_frame.blockSize, decode_stmin(control_frame.separationTime)
+            if flow_status == FlowStatus.Wait:
+                # The receiver is not ready yet, wait for the next control frame with a fresh deadline
+                FLOW_CONTROL_WAITS.inc()
+                continue
+            if flow_status == FlowStatus.Abort:
+                raise FlowStatusAbortException()
+            raise InvalidFlowStatusException(flow_status.value)
+
+    def close(self):
+        """Stop the timer thread of the underlying IsoTp and the sending thread."""
+        self.isotp.close()
+        self._send_executor.shutdown(wait=False)
+
+
+def _check_abort(flow_controls: asyncio.Queue):
+    """Stop a transfer aborted by the peer in the middle of a block; other flow control frames are ignored there."""
+    while not flow_controls.empty():
+        if flow_controls.get_nowait().flowStatus == FlowStatus.Abort:
+            raise FlowStatusAbortException()
+
+
+def _message(item):
+    """Return a message taken from a receive queue, or raise the error of a failed reception queued instead."""
+    if isinstance(item, Exception):
+        raise item
+    return item
+
+
+def _set_result(future: asyncio.Future, result):
+    if not future.done():
+        future.set_result(result)
+
+
+async def _sleep_until(loop: asyncio.AbstractEventLoop, due: float):
+    """Wait until perf_counter() reaches `due` on a timer of the loop, which runs the other sessions meanwhile."""
+    remaining = due - time.perf_counter()
+    while remaining > 0:
+        woken = loop.create_future()
+        timer = loop.call_at(loop.time() + remaining, _set_result, woken, None)
+        try:
+            await woken
+        finally:
+            timer.cancel()
+        remaining = due - time.perf_counter()
@@ -0,0 +1,80 @@
+import threading
+import time
+from typing import Callable, Dict
+
+
+class BusLoadGovernor:
+    """
+    Throttles ISO-TP senders when the measured bus load passes a ceiling.
+
+    The governor adds an extra separation time to the STmin requested by the receiver. It
+    follows an additive-increase / multiplicative-decrease scheme on the sending rate: above the
+    ceiling the extra time doubles (starting at one step), below the ceiling minus the hysteresis
+    it shrinks by one step, in between it is kept. The load is polled at most once per update
+    interval, so a sender asking before each consecutive frame costs a clock read most of the time.
+
+    One governor is shared by all the send requests of an IsoTp instance.
+    """
+
+    def __init__(self, load_fn: Callable[[], float], ceiling: float = 0.7, hysteresis: float = 0.1,
+                 step: float = 0.0005, max_extra_stmin: float = 0.02, update_interval: float = 0.01):
+        """
+        :param load_fn: Returns the current bus load between 0.0 and 1.0, e.g. CANCommunication.bus_load.get_load.
+        :param ceiling: Bus load above which the senders are slowed down.
+        :param hysteresis: The extra separation time is reduced only below ceiling - hysteresis.
+        :param step: Smallest extra separation time in seconds, and the amount it is reduced by.
+        :param max_extra_stmin: Upper bound of the extra separation time in seconds.
+        :param update_interval: Minimum time in seconds between two reads of the bus load.
+        """
+        if not 0.0 < ceiling <= 1.0:
+            raise ValueError("ceiling must be between 0 and 1.")
+        if not 0.0 <= hysteresis < ceiling:
+            raise ValueError("hysteresis must be between 0 and the ceiling.")
+        if step <= 0 or max_extra_stmin < step:
+            raise ValueError("step must be greater than 0 and at most max_extra_stmin.")
+        self._load_fn = load_fn
+        self._ceiling = ceiling
+        self._recovery = ceiling - hysteresis
+        self._step = step
+        self._max_extra_stmin = max_extra_stmin
+        self._update_interval = update_interval
+        self._extra_stmin = 0.0
+        self._next_update = 0.0
+        self._load = 0.0
+        self._increases = 0
+        self._peak_extra_stmin = 0.0
+        self._lock = threading.Lock()
+
+    def get_extra_stmin(self) -> float:
+        """Return the separation time in seconds to add before the next consecutive frame."""
+        now = time.monotonic()
+        if now < self._next_update:
+            return self._extra_stmin
+        with self._lock:
+            if now >= self._next_update:
+                self._next_update = now + self._update_interval
+                self._update(self._load_fn())
+            return self._extra_stmin
+
+    def _update(self, load: float):
+        self._load = load
+        if load > self._ceiling:
+            self._extra_stmin = min(self._max_extra_stmin, max(self._step, self._extra_stmin * 2))
+            self._increases += 1
+            if self._extra_stmin > self._peak_extra_stmin:
+                self._peak_extra_stmin = self._extra_stmin
+        elif load < self._recovery and self._extra_stmin > 0:
+            self._extra_stmin = max(0.0, self._extra_stmin - self._step)
+
+    def is_throttling(self) -> bool:
+        return self._extra_stmin > 0
+
+    def get_statistics(self) -> Dict:
+        """Return the last bus load read and the current and peak extra separation time in microseconds."""
+        return {
+            "bus_load": self._load,
+            "ceiling": self._ceiling,
+            "extra_stmin_us": self._extra_stmin * 1e6,
+            "peak_extra_stmin_us": self._peak_extra_stmin * 1e6,
+            "increases": self._increases,
+        }
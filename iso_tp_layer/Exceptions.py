@@ -43,7 +43,7 @@ class MessageSizeExceededException(IsoTpException):
 class MessageLengthExceededException(IsoTpException):
     """Raised when the message length exceeds the ISO-TP limit."""
     def __init__(self):
-        super().__init__("Message length exceeds the maximum limit of 4095 bytes for ISO-TP.")
+        super().__init__("Message length exceeds the maximum limit of 4294967295 bytes for ISO-TP.")
 
 
 class FlowStatusAbortException(IsoTpException):
@@ -62,3 +62,9 @@ class TimeoutException(IsoTpException):
     """Raised when the message length exceeds the ISO-TP limit."""
     def __init__(self):
         super().__init__("Timeout Elapsed!")
+
+
+class TransmitQueueFullException(IsoTpException):
+    """Raised when consecutive frames could not be queued for transmission by the CAN layer."""
+    def __init__(self):
+        super().__init__("CAN transmit queue full, consecutive frames not sent.")
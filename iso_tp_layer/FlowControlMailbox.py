@@ -0,0 +1,62 @@
+from collections import deque
+from typing import Optional
+import threading
+import sys
+import os
+current_dir = os.path.dirname(os.path.abspath(__file__))
+package_dir = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(package_dir)
+from iso_tp_layer.frames.FlowControlFrameMessage import FlowControlFrameMessage
+
+
+class FlowControlMailbox:
+    """
+    Holds the flow control frames received for one address until a sender consumes them.
+
+    A sender blocked in get() is woken as soon as a frame is put, or when interrupt() is called
+    (for example when its N_Bs deadline expires).
+    """
+
+    def __init__(self):
+        self._frames = deque()
+        self._condition = threading.Condition()
+        self._interrupted = False
+
+    def put(self, frame: FlowControlFrameMessage):
+        with self._condition:
+            self._frames.append(frame)
+            self._condition.notify_all()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[FlowControlFrameMessage]:
+        """
+        Remove and return the oldest flow control frame, waiting for one if needed.
+
+        :param timeout: Maximum time to wait in seconds, None waits until a frame arrives or
+                        the mailbox is interrupted.
+        :return: The frame, or None on timeout or interruption.
+        """
+        with self._condition:
+            if not self._frames and not self._interrupted:
+                self._condition.wait_for(lambda: self._frames or self._interrupted, timeout)
+            if self._interrupted:
+                self._interrupted = False
+                return None
+            if self._frames:
+                return self._frames.popleft()
+            return None
+
+    def interrupt(self):
+        """Wake the waiting sender without a frame."""
+        with self._condition:
+            self._interrupted = True
+            self._condition.notify_all()
+
+    def clear(self):
+        """Drop stale frames, e.g. left over from an aborted transfer."""
+        with self._condition:
+            self._frames.clear()
+            self._interrupted = False
+
+    def __len__(self):
+        with self._condition:
+            return len(self._frames)
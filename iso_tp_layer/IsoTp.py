@@ -1,4 +1,4 @@
-from typing import Callable, List, Union
+from typing import Callable, Dict, List, Optional, Union
 from bitarray import bitarray
 import sys
 import os
@@ -16,12 +16,21 @@ from iso_tp_layer.frames.FlowStatus import FlowStatus
 from iso_tp_layer.frames.FrameMessage import FrameMessage
 from iso_tp_layer.frames.FrameType import FrameType
 from iso_tp_layer.frames.SingleFrameMessage import SingleFrameMessage
+from iso_tp_layer.frames.FrameCodec import decode_frame, encode_frame
 from iso_tp_layer.recv_request.RecvRequest import RecvRequest
+from iso_tp_layer.RecvDispatcher import RecvDispatcher
+from iso_tp_layer.TimerService import TimerService
+from iso_tp_layer.FlowControlMailbox import FlowControlMailbox
 from iso_tp_layer.send_request.SendRequest import SendRequest
-from logger import Logger, LogType, ProtocolType
+from iso_tp_layer.BusLoadGovernor import BusLoadGovernor
+from iso_tp_layer.IsoTpMetrics import RX_FRAMES_BY_PCI, TX_FRAMES_BY_PCI
+from can_layer.trace import DIRECTION_RX, DIRECTION_TX, FLAG_ISO_TP
+from logger import get_logger, LogType, ProtocolType
+import tracing
 
 
 def _parse_message(data: bitarray) -> Union[FrameMessage, None]:
+    """Bitarray based frame parser, kept for compatibility. IsoTp itself uses FrameCodec.decode_frame."""
     if not data or len(data) < 8:
         raise ValueError("The input bitarray is empty or invalid.")
 
@@ -33,6 +42,10 @@ def _parse_message(data: bitarray) -> Union[FrameMessage, None]:
         # Single Frame
         data_length = pci_byte & 0xF
         frame_data = data[8:8 + (data_length * 8)]  # Extract data bits
+        if data_length == 0 and len(data) > 64:
+            # CAN FD escape sequence, the length is in the second byte
+            data_length = int(data[8:16].tobytes()[0])
+            frame_data = data[16:16 + (data_length * 8)]
         return SingleFrameMessage(dataLength=data_length, data=frame_data)
 
     elif frame_type == FrameType.FirstFrame.value:
@@ -41,6 +54,12 @@ def _parse_message(data: bitarray) -> Union[FrameMessage, None]:
             raise ValueError("Invalid First Frame: Insufficient data.")
         data_length = ((pci_byte & 0xF) << 8) | int(data[8:16].tobytes()[0])
         frame_data = data[16:]  # Extract remaining bits
+        if data_length == 0:
+            # Escape sequence, the length follows as a 32-bit value
+            if len(data) < 48:
+                raise ValueError("Invalid First Frame: Insufficient data.")
+            data_length = int.from_bytes(data[16:48].tobytes(), "big")
+            frame_data = data[48:]
         return FirstFrameMessage(dataLength=data_length, data=frame_data)
 
     elif frame_type == FrameType.ConsecutiveFrame.value:
@@ -64,17 +83,25 @@ def _parse_message(data: bitarray) -> Union[FrameMessage, None]:
 
 
 def message_to_bitarray(message: FrameMessage) -> bitarray:
+    """Bitarray based frame encoder, kept for compatibility. IsoTp itself uses FrameCodec.encode_frame."""
     bits = bitarray()
 
     if isinstance(message, SingleFrameMessage):
-        pci_byte = (FrameType.SingleFrame.value << 4) | message.dataLength
-        bits.frombytes(bytes([pci_byte]))  # PCI byte
+        if message.dataLength <= 7:
+            pci_byte = (FrameType.SingleFrame.value << 4) | message.dataLength
+            bits.frombytes(bytes([pci_byte]))  # PCI byte
+        else:
+            bits.frombytes(bytes([FrameType.SingleFrame.value << 4, message.dataLength]))  # CAN FD escape PCI
         bits.extend(message.data)  # Data bits
 
     elif isinstance(message, FirstFrameMessage):
-        pci_byte1 = (FrameType.FirstFrame.value << 4) | ((message.dataLength >> 8) & 0xF)
-        pci_byte2 = message.dataLength & 0xFF
-        bits.frombytes(bytes([pci_byte1, pci_byte2]))  # PCI bytes
+        if message.dataLength <= 0xFFF:
+            pci_byte1 = (FrameType.FirstFrame.value << 4) | ((message.dataLength >> 8) & 0xF)
+            pci_byte2 = message.dataLength & 0xFF
+            bits.frombytes(bytes([pci_byte1, pci_byte2]))  # PCI bytes
+        else:
+            # Escape sequence: 12-bit length of 0 followed by the 32-bit length
+            bits.frombytes(bytes([FrameType.FirstFrame.value << 4, 0]) + message.dataLength.to_bytes(4, "big"))
         bits.extend(message.data)  # Data bits
 
     elif isinstance(message, ConsecutiveFrameMessage):
@@ -94,14 +121,8 @@ def message_to_bitarray(message: FrameMessage) -> bitarray:
 
 
 def bytearray_to_bitarray(byte_data: bytearray) -> bitarray:
-    # Initialize an empty bitarray
     bits = bitarray()
-
-    # Loop through each byte and append its bits
-    for byte in byte_data:
-        # Convert the byte to bits and append to the bitarray
-        bits.frombytes(byte.to_bytes(1, 'big'))
-
+    bits.frombytes(bytes(byte_data))
     return bits
 
 
@@ -113,12 +134,25 @@ def bitarray_to_bytearray(bits: bitarray) -> bytearray:
 class IsoTp:
     def __init__(self, iso_tp_config: IsoTpConfig):
         self._config = iso_tp_config
-        self._recv_requests: List[RecvRequest] = []
-        self._send_requests: List[SendRequest] = []
-        self._control_frames: List[
-            tuple[Address, FlowControlFrameMessage]] = []  # List to store control frames and addresses
-        self.logger = Logger(ProtocolType.ISO_TP)
+        self._recv_requests: Dict[tuple, RecvRequest] = {}  # Active receive sessions by Address.key
+        self._send_requests: Dict[tuple, SendRequest] = {}  # Active send sessions by Address.key
+        self._control_frames: Dict[int, FlowControlMailbox] = {}  # Pending control frames per txid
+        # Address and Address.key of the frames received from every arbitration ID, built once
+        self._rx_addresses: Dict[int, tuple] = {}
+        self.logger = get_logger(ProtocolType.ISO_TP)
         self.lock = threading.Lock()
+        self._timer_service = TimerService()  # One thread serves the timeouts of all requests
+        self._dispatcher = None
+        self._trace = None  # Optional can_layer.trace.FrameTrace
+        self._governor: Optional[BusLoadGovernor] = None  # Bus load throttling of the senders, see set_bus_load_fn
+        self._rx_ids: Dict[int, int] = {}  # Arbitration IDs of the registered addresses, with their reference count
+        self._rx_ids_lock = threading.Lock()
+        self._on_rx_ids_changed: Optional[Callable] = None
+        if self._config.dispatcher_workers > 0:
+            self._dispatcher = RecvDispatcher(handler=self._process_can_message,
+                                              workers=self._config.dispatcher_workers,
+                                              queue_depth=self._config.dispatcher_queue_depth)
+            self._dispatcher.start()
         self.logger.log_message(log_type=LogType.INITIALIZATION, message="IsoTp instance initialized with provided configuration.")
 
 
@@ -137,10 +171,98 @@ class IsoTp:
         self.logger.log_message(log_type=LogType.CONFIGURATION,
                                 message=f"Send callable function from CAN has been set")
 
-    def send(self, data: bitarray, address: Address, on_success: Callable, on_error: Callable):
-        data = bytearray_to_bitarray(data)
+    def set_send_batch_fn(self, fn: Callable):
+        """
+        Set the batched send function of the CAN layer (e.g. CANCommunication.send_batch).
+        Consecutive frames are then queued a block at a time and paced by the CAN transmit queue
+        instead of being sent one by one from the sending thread.
+        """
+        self._config.send_batch_fn = fn
+        self.logger.log_message(log_type=LogType.CONFIGURATION,
+                                message=f"Batched send function from CAN has been set")
+
+    def set_on_rx_ids_changed(self, fn: Callable):
+        """
+        Set the function called with the registered receive IDs whenever they change, e.g.
+        CANCommunication.update_rx_filters. It is called once with the current IDs.
+        """
+        with self._rx_ids_lock:
+            self._on_rx_ids_changed = fn
+            if fn is not None:
+                fn(list(self._rx_ids))
+        self.logger.log_message(log_type=LogType.CONFIGURATION,
+                                message=f"Receive IDs callback function has been set")
+
+    def register_address(self, address: Address):
+        """
+        Register an address this node communicates with: the frames of its peer (flow control frames
+        and responses, sent to address._txid) must be received. Registrations are counted, every
+        call is undone by one unregister_address call.
+        """
+        with self._rx_ids_lock:
+            rx_id = address._txid
+            count = self._rx_ids.get(rx_id, 0)
+            self._rx_ids[rx_id] = count + 1
+            if count == 0:
+                self._notify_rx_ids()
+
+    def unregister_address(self, address: Address):
+        with self._rx_ids_lock:
+            rx_id = address._txid
+            count = self._rx_ids.get(rx_id, 0)
+            if count <= 1:
+                if self._rx_ids.pop(rx_id, None) is not None:
+                    self._notify_rx_ids()
+            else:
+                self._rx_ids[rx_id] = count - 1
+
+    def get_rx_ids(self) -> List[int]:
+        """Return the arbitration IDs of the registered addresses."""
+        with self._rx_ids_lock:
+            return sorted(self._rx_ids)
+
+    def _notify_rx_ids(self):
+        """Report the receive IDs, called with _rx_ids_lock held so that updates are applied in order."""
+        if self._on_rx_ids_changed is None:
+            return
+        try:
+            self._on_rx_ids_changed(sorted(self._rx_ids))
+        except Exception as e:
+            self.logger.log_message(log_type=LogType.ERROR, message=f"Failed to apply the receive IDs: {e}")
+
+    def set_bus_load_fn(self, fn: Callable[[], float]):
+        """
+        Set the source of the bus load used to throttle the senders (e.g. CANCommunication.bus_load.get_load).
+        Throttling is active only when the configuration has a bus_load_ceiling.
+        """
+        if self._config.bus_load_ceiling is None:
+            self.logger.log_message(log_type=LogType.CONFIGURATION,
+                                    message="Bus load source ignored, no bus load ceiling configured")
+            return
+        self._governor = BusLoadGovernor(load_fn=fn, ceiling=self._config.bus_load_ceiling,
+                                         max_extra_stmin=self._config.max_extra_stmin)
+        self.logger.log_message(log_type=LogType.CONFIGURATION,
+                                message=f"Bus load throttling enabled above {self._config.bus_load_ceiling:.0%}")
+
+    def get_governor_statistics(self) -> Union[dict, None]:
+        """Return the state of the bus load throttling, or None when it is disabled."""
+        if self._governor is None:
+            return None
+        return self._governor.get_statistics()
+
+    def set_trace(self, trace):
+        """
+        Record the frames sent and received by this layer in a binary trace (can_layer.trace.FrameTrace).
+        :param trace: The trace to append to, or None to stop tracing.
+        """
+        self._trace = trace
+        self.logger.log_message(log_type=LogType.CONFIGURATION,
+                                message=f"Frame trace {'set to ' + trace.path if trace else 'disabled'}")
+
+    def send(self, data: Union[bytes, bytearray, bitarray], address: Address, on_success: Callable, on_error: Callable):
+        data = data.tobytes() if isinstance(data, bitarray) else bytes(data)
         try:
-            self.logger.log_message(log_type=LogType.SEND, message=f"Sending message to {address} with data: 0x{data.tobytes().hex().upper()}")
+            self.logger.log_message(log_type=LogType.SEND, message=lambda: f"Sending message to {address} with data: 0x{data.hex().upper()}")
             send_request = SendRequest(
                 address=address,
                 txfn=self._send_to_can,  # Can send function ( takes hex frame as a parameter)
@@ -150,142 +272,294 @@ class IsoTp:
                 stmin=self._config.stmin,
                 timeout=self._config.timeout,
                 block_size=self._config.max_block_size,
+                timer_service=self._timer_service,
+                wakefn=self._wake_control_frame_waiter,
+                on_finished=self._evict_send_request,
+                tx_dl=self._config.tx_dl,
+                correlation_id=tracing.get_correlation_id() if tracing.ENABLED else None,
+                governor=self._governor,
+                batch_txfn=self._send_batch_to_can if self._config.send_batch_fn is not None else None,
             )
-            self._send_requests.append(send_request)
+            # Control frames left over from a previous transfer must not release this one
+            self._get_mailbox(address).clear()
+            # The flow control frames must pass the acceptance filters until the session ends
+            self.register_address(address)
+            with self.lock:
+                self._send_requests[address.key] = send_request
             send_request.send(data)
 
-            for request in self._send_requests:
-                if request.is_finished() or request.has_received_error_frame():
-                    self._send_requests.remove(request)
-
-
             self.logger.log_message(log_type=LogType.SEND, message=f"Successfully sent message to {address}")
 
         except Exception as e:
             self.logger.log_message(log_type=LogType.ERROR, message=f"Error while sending message to {address}: {e}")
             on_error(e)
 
-    def recv(self, message: bitarray, address: Address):
+    def recv(self, message: Union[bytes, bytearray, memoryview, bitarray], address: Address):
         try:
-            self.logger.log_message(log_type=LogType.RECEIVE, message=f"Receiving message: 0x{message.tobytes().hex().upper()} from {address}")
-
-            new_message = _parse_message(data=message)
-
-            with self.lock:  # Ensure thread safety
-                # Check if the message is a control frame
-                if isinstance(new_message, FlowControlFrameMessage):
-                    self.logger.log_message(log_type=LogType.DEBUG, message=f"Received Flow Control Frame from {address}: {new_message}")
-                    self._control_frames.append((address, new_message))  # Safe addition
-
-                    if new_message.flowStatus == FlowStatus.Abort:
-                        self.logger.log_message(log_type=LogType.WARNING, message=f"Flow control frame indicates abort from {address}")
-                        for request in self._send_requests:
-                            if request.get_address() == address:
-                                request.set_received_error_frame(True)
-                                return  # Exit
-                    return
-
-                # Check if there is an existing request with the same address
-                for request in self._recv_requests:
-                    if request.get_address()._txid == address._txid:
-                        if request.get_state() in {"ErrorState", "FinalState"}:
-                            self.logger.log_message(log_type=LogType.ACKNOWLEDGMENT, message=f"Removing completed request from {address}")
-                            self._recv_requests.remove(request)  # Safe removal
-                            break
-                        else:
-                            self.logger.log_message(log_type=LogType.ACKNOWLEDGMENT, message=f"Processing message with existing request for {address}")
-                            # Process the message using the existing request
-                            request.process(new_message)
-                            return  # Exit after processing
-
-                self.logger.log_message(log_type=LogType.RECEIVE, message=f"Created new receive request for {address}")
-                # If no existing request is found, create a new one
-                new_request = RecvRequest(
-                    address=address,
-                    block_size=self._config.max_block_size,
-                    timeout=self._config.timeout,
-                    stmin=self._config.stmin,
-                    on_success=self._config.on_recv_success,
-                    on_error=self._config.on_recv_error,
-                    send_frame=self._send_frame
-                )
-
-                # Add the new request to the list
-                self._recv_requests.append(new_request)  # Safe addition
-
-            # Process the message using the new request (outside the lock to avoid blocking other threads)
-            new_request.process(new_message)
+            if isinstance(message, bitarray):
+                message = message.tobytes()
+            self.logger.log_message(log_type=LogType.RECEIVE, message=lambda: f"Receiving message: 0x{message.hex().upper()} from {address}")
+
+            new_message = decode_frame(message)
+            RX_FRAMES_BY_PCI[message[0] >> 4].inc()
+
+            # Check if the message is a control frame
+            if isinstance(new_message, FlowControlFrameMessage):
+                self.logger.log_message(log_type=LogType.DEBUG, message=lambda: f"Received Flow Control Frame from {address}: {new_message}")
+                self._get_mailbox(address).put(new_message)  # Wakes the waiting sender
+
+                if new_message.flowStatus == FlowStatus.Abort:
+                    self.logger.log_message(log_type=LogType.WARNING, message=f"Flow control frame indicates abort from {address}")
+                    for request in list(self._send_requests.values()):
+                        if request.get_address()._txid == address._txid:
+                            request.set_received_error_frame(True)
+                return
+
+            # Fast path: an active session is found without taking the global lock
+            key = address.key
+            request = self._recv_requests.get(key)
+            if request is not None:
+                with request.lock:
+                    if not request.is_finished():
+                        if request.correlation_id is not None:
+                            tracing.set_correlation_id(request.correlation_id)
+                        self.logger.log_message(LogType.ACKNOWLEDGMENT, "Processing message with existing request for %s", address)
+                        request.process(new_message)
+                        return
+
+            with self.lock:
+                request = self._recv_requests.get(key)
+                if request is None or request.is_finished():
+                    # If no active request is found, create a new one
+                    request = RecvRequest(
+                        address=address,
+                        block_size=self._config.max_block_size,
+                        timeout=self._config.timeout,
+                        stmin=self._config.stmin,
+                        on_success=self._config.on_recv_success,
+                        on_error=self._recv_error_fn(address),
+                        send_frame=self._send_frame,
+                        timer_service=self._timer_service,
+                        on_finished=self._evict_recv_request,
+                        deliver_memoryview=self._config.deliver_memoryview
+                    )
+                    self._recv_requests[key] = request
+                    self.logger.log_message(log_type=LogType.RECEIVE, message=f"Created new receive request for {address}")
+
+            # Process the message using the session lock only, other sessions are not blocked
+            with request.lock:
+                request.process(new_message)
 
         except Exception as e:
             self.logger.log_message(log_type=LogType.ERROR, message=f"Error while Receiving message from {address}: {e}")
             self._config.on_recv_error(e)
 
-    def _get_control_frame_by_address(self, address: Address) -> Union[FlowControlFrameMessage, None]:
+    def _recv_error_fn(self, address: Address) -> Callable:
+        """Error callback of a new receive session with `address`."""
+        return self._config.on_recv_error
+
+    def _evict_recv_request(self, request: RecvRequest):
+        """Remove a finished receive session from the routing table."""
+        with self.lock:
+            key = request.get_address().key
+            if self._recv_requests.get(key) is request:
+                del self._recv_requests[key]
+        self.logger.log_message(log_type=LogType.ACKNOWLEDGMENT, message=f"Removed completed request from {request.get_address()}")
+
+    def _evict_send_request(self, request: SendRequest):
+        """Remove a finished send session from the routing table."""
+        with self.lock:
+            key = request.get_address().key
+            if self._send_requests.get(key) is request:
+                del self._send_requests[key]
+        self.unregister_address(request.get_address())
+
+    def _get_mailbox(self, address: Address) -> FlowControlMailbox:
+        mailbox = self._control_frames.get(address._txid)
+        if mailbox is None:
+            # setdefault is atomic, concurrent callers end up with the same mailbox
+            mailbox = self._control_frames.setdefault(address._txid, FlowControlMailbox())
+        return mailbox
+
+    def _get_control_frame_by_address(self, address: Address,
+                                      timeout: Optional[float] = None) -> Union[FlowControlFrameMessage, None]:
         """
-        Search for a control frame by its address in the control frame list.
-        :param address: The address to search for.
-        :return: The corresponding FlowControlFrameMessage if found, else None.
+        Wait for the next control frame received for an address and remove it from the mailbox.
+        :param address: The address to wait for.
+        :param timeout: Maximum time to wait in seconds, None waits until a frame arrives or
+                        the waiter is woken by _wake_control_frame_waiter.
+        :return: The corresponding FlowControlFrameMessage if received, else None.
         """
-        self.logger.log_message(log_type=LogType.DEBUG, message=f"Searching for control frame for address {address}")
-        with self.lock:
-            for addr, control_frame in self._control_frames:
-                if addr._txid == address._txid:
-                    self.logger.log_message(log_type=LogType.DEBUG, message=f"Found control frame for {address}")
-                    return control_frame
+        self.logger.log_message(log_type=LogType.DEBUG, message=f"Waiting for control frame for address {address}")
+        control_frame = self._get_mailbox(address).get(timeout)
+        if control_frame is None:
             self.logger.log_message(log_type=LogType.WARNING, message=f"No control frame found for address {address}")
-        return None
+        else:
+            self.logger.log_message(log_type=LogType.DEBUG, message=f"Found control frame for {address}")
+        return control_frame
+
+    def _wake_control_frame_waiter(self, address: Address):
+        """Wake a sender waiting for a control frame, e.g. when its N_Bs timeout expires."""
+        self._get_mailbox(address).interrupt()
 
     def _send_frame(self, address: Address, frame: FrameMessage):
-        message_in_bits = message_to_bitarray(frame)
-        message_in_bytes = bitarray_to_bytearray(message_in_bits)
-        self.logger.log_message(log_type=LogType.SEND, message=f"Sending frame {frame} to {address}")
+        message_in_bytes = encode_frame(frame)
+        self.logger.log_message(log_type=LogType.SEND, message=lambda: f"Sending frame {frame} to {address}")
+        TX_FRAMES_BY_PCI[message_in_bytes[0] >> 4].inc()
+        if self._trace is not None:
+            self._trace.record(DIRECTION_TX, address._rxid, message_in_bytes, FLAG_ISO_TP)
         self._config.send_fn(arbitration_id=address._rxid, data=message_in_bytes)
 
 
     def _send_to_can(self, address: Address, message):
-        message = bytearray.fromhex(message)  # Convert frame to bytearray
+        if isinstance(message, str):
+            message = bytearray.fromhex(message)  # Hex string frames are still accepted
         self.logger.log_message(log_type=LogType.ACKNOWLEDGMENT, message=f"ISO-TP calls CAN's send function")
+        TX_FRAMES_BY_PCI[message[0] >> 4].inc()
+        if self._trace is not None:
+            self._trace.record(DIRECTION_TX, address._rxid, message, FLAG_ISO_TP)
         self._config.send_fn(arbitration_id=address._rxid, data=message)
 
+    def _send_batch_to_can(self, address: Address, frames, separation_time: float, initial_separation: float,
+                           on_complete: Callable) -> bool:
+        TX_FRAMES_BY_PCI[frames[0][0] >> 4].inc(len(frames))
+        if self._trace is not None:
+            for frame in frames:
+                self._trace.record(DIRECTION_TX, address._rxid, frame, FLAG_ISO_TP)
+        return self._config.send_batch_fn(arbitration_id=address._rxid, frames=frames,
+                                          separation_time=separation_time,
+                                          initial_separation=initial_separation, on_complete=on_complete)
+
 
     def recv_can_message(self, message: can.Message):
         """
-        Process a received CAN message in a separate thread.
+        Process a received CAN message asynchronously.
+
+        When a dispatcher pool is configured, the message is queued on the ordered queue of its
+        arbitration ID. Otherwise, a new thread is started for the message (legacy behaviour).
 
         Args:
             message (can.Message): The CAN message object to process.
         """
+        arbitration_id = message.arbitration_id
+        if self._trace is not None:
+            self._trace.record(DIRECTION_RX, arbitration_id, message.data, FLAG_ISO_TP)
+        if tracing.ENABLED:
+            # The correlation ID of the receiving thread follows the frame to the worker
+            message = (message, tracing.get_correlation_id() or tracing.new_correlation_id())
+        if self._dispatcher is not None:
+            if not self._dispatcher.submit(arbitration_id, message):
+                self.logger.log_message(log_type=LogType.WARNING,
+                                        message=f"Receive queue full for ID 0x{arbitration_id:X}, frame dropped.")
+            return
 
-        def process_message():
-            """Function to process the message in a new thread."""
-            try:
-                # Extract arbitration ID
-                arbitration_id = message.arbitration_id
+        # Create a new thread and start it
+        thread = threading.Thread(target=self._process_can_message, args=(message,), daemon=True, name="WorkerThread")
+        self.logger.log_message(log_type=LogType.RECEIVE,
+                                message=f"Started new thread. Main thread continues listening to CAN bus.")
 
-                # Convert data to bitarray
-                data = message.data  # Data as bytes
-                data_bits = bitarray()
-                data_bits.frombytes(data)  # Convert bytes to bitarray
+        thread.start()
 
-                # Create Address object
-                address = Address(txid=arbitration_id, rxid=self._config.recv_id)
+    def process_can_message(self, message: can.Message):
+        """
+        Process a received CAN message in the calling thread, without the dispatcher pool or a new
+        thread, e.g. on the event loop of AsyncIsoTp.
 
-                # Process the message
-                self.recv(message=data_bits, address=address)
+        Args:
+            message (can.Message): The CAN message object to process.
+        """
+        if self._trace is not None:
+            self._trace.record(DIRECTION_RX, message.arbitration_id, message.data, FLAG_ISO_TP)
+        self._process_can_message(message)
 
-            except Exception as e:
-                self.logger.log_message(log_type=LogType.RECEIVE,
-                                        message=f"Error processing CAN message: {e}.")
+    def _process_can_message(self, message: Union[can.Message, tuple]):
+        """
+        Convert a received CAN message and pass it to the ISO-TP receive logic.
+        :param message: The CAN message, or (message, correlation ID) when tracing is enabled.
+        """
+        if type(message) is tuple:
+            self._process_traced_can_message(*message)
+            return
+        try:
+            address, key = self._rx_address(message.arbitration_id)
+            # Frames keep memoryview slices of the CAN payload, nothing is copied before reassembly
+            frame = memoryview(message.data)
+
+            if frame and frame[0] & 0xF0 == 0x20:
+                # Fast path: a consecutive frame of an active session is handled without decoding
+                request = self._recv_requests.get(key)
+                if request is not None:
+                    with request.lock:
+                        if request.correlation_id is not None:
+                            tracing.set_correlation_id(request.correlation_id)
+                        if request.process_consecutive(frame):
+                            RX_FRAMES_BY_PCI[2].inc()
+                            return
+
+            self.recv(message=frame, address=address)
 
-        # Create a new thread and start it
-        thread = threading.Thread(target=process_message, daemon=True, name="WorkerThread")
-        self.logger.log_message(log_type=LogType.RECEIVE,
-                                message=f"Started new thread. Main thread continues listening to CAN bus.")
+        except Exception as e:
+            self.logger.log_message(log_type=LogType.RECEIVE,
+                                    message=f"Error processing CAN message: {e}.")
 
-        thread.start()
+    def _rx_address(self, arbitration_id: int) -> tuple:
+        """
+        Return the (Address, Address.key) of the frames received from an arbitration ID. The pair is
+        created on the first frame and shared by all the following ones and by their sessions.
+        """
+        entry = self._rx_addresses.get(arbitration_id)
+        if entry is None:
+            address = Address(txid=arbitration_id, rxid=self._config.recv_id)
+            # setdefault is atomic, concurrent workers end up with the same address
+            entry = self._rx_addresses.setdefault(arbitration_id, (address, address.key))
+        return entry
+
+    def _process_traced_can_message(self, message: can.Message, correlation_id: int):
+        """Process a received CAN message as an "isotp.frame" span of its transaction."""
+        start = tracing.now()
+        previous = tracing.set_correlation_id(correlation_id)
+        try:
+            self._process_can_message(message)
+        finally:
+            # recv() switches to the transaction of the session the frame belongs to
+            tracing.record_span("isotp.frame", start, arbitration_id=message.arbitration_id, pci=message.data[0] >> 4 if message.data else None)
+            tracing.set_correlation_id(previous)
+
+    def get_dispatcher_statistics(self) -> Union[dict, None]:
+        """Return the backpressure counters of the dispatcher pool, or None in thread-per-frame mode."""
+        if self._dispatcher is None:
+            return None
+        return self._dispatcher.get_statistics()
+
+    def suspend(self):
+        """
+        Freeze the ISO-TP timeouts while the CAN bus is unavailable (e.g. reconnecting), so that the
+        active sessions do not expire and continue where they stopped on resume().
+        """
+        self._timer_service.pause()
+        self.logger.log_message(log_type=LogType.WARNING, message="ISO-TP timeouts suspended")
+
+    def resume(self):
+        self._timer_service.resume()
+        self.logger.log_message(log_type=LogType.ACKNOWLEDGMENT, message="ISO-TP timeouts resumed")
+
+    def on_connection_changed(self, connected: bool):
+        """Connection listener of CANCommunication: suspend while the bus is down, resume when it is back."""
+        if connected:
+            self.resume()
+        else:
+            self.suspend()
+
+    def close(self):
+        """Stop the background workers owned by this instance."""
+        self._timer_service.stop()
+        if self._dispatcher is not None:
+            self._dispatcher.stop()
+            self.logger.log_message(log_type=LogType.ACKNOWLEDGMENT, message="Receive dispatcher stopped")
 
     def set_recv_id(self, recv_id):
         self._config.recv_id = recv_id
+        self._rx_addresses = {}
         self.logger.log_message(log_type=LogType.CONFIGURATION,
                                 message=f"Recv id has been set: {recv_id}")
 
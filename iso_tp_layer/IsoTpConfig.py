@@ -6,6 +6,12 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 package_dir = os.path.abspath(os.path.join(current_dir, ".."))
 sys.path.append(package_dir)
 from iso_tp_layer.Address import Address
+from iso_tp_layer.frames.FrameCodec import CAN_FD_DATA_LENGTHS
+
+DEFAULT_DISPATCHER_QUEUE_DEPTH = 256
+# Frames of the longest message (4095 bytes) on classic CAN: the first frame carries 6 bytes, the
+# consecutive frames 7. A peer told block size 0 sends all of them without waiting.
+MAX_MESSAGE_FRAMES = 1 + -(-(4095 - 6) // 7)
 
 class IsoTpConfig:
     """
@@ -13,9 +19,43 @@ class IsoTpConfig:
     """
     def __init__(self, max_block_size, timeout, stmin,
                   on_recv_success: Callable, on_recv_error: Callable,
-                  recv_id: int):
+                  recv_id: int, dispatcher_workers: int = 0, dispatcher_queue_depth: int = None,
+                  deliver_memoryview: bool = False, tx_dl: int = 8, bus_load_ceiling: float = None,
+                  max_extra_stmin: float = 0.02):
+        """
+        :param dispatcher_workers: Number of worker threads used to process received CAN frames.
+                                   0 keeps the legacy behaviour of one thread per received frame.
+        :param dispatcher_queue_depth: Maximum number of pending frames per arbitration ID when the
+                                       dispatcher pool is used, frames beyond it are dropped. It must
+                                       hold a whole block (max_block_size frames), or a whole message
+                                       when max_block_size is 0. None derives it from max_block_size.
+        :param deliver_memoryview: Pass received messages to on_recv_success as a read-only memoryview
+                                   over the reassembly buffer instead of a bitarray.
+        :param tx_dl: Length of the transmitted CAN frames: 8 for classic CAN, or 12, 16, 20, 24, 32,
+                      48 or 64 for CAN FD (requires an FD enabled CAN configuration).
+        :param bus_load_ceiling: Bus load (0.0-1.0) above which consecutive frames are spaced further
+                                 apart than STmin, None disables the throttling. Needs a bus load
+                                 source, see IsoTp.set_bus_load_fn.
+        :param max_extra_stmin: Maximum separation time in seconds added to STmin by the throttling.
+        """
         if stmin > timeout:
             raise ValueError("stmin must be less than or equal to timeout.")
+        if dispatcher_workers < 0:
+            raise ValueError("dispatcher_workers must be greater than or equal to 0.")
+        # The peer sends up to a block of frames (a whole message with block size 0) before it
+        # waits for our flow control frame, a shorter queue drops frames of legitimate transfers
+        required_depth = max_block_size if max_block_size > 0 else MAX_MESSAGE_FRAMES
+        if dispatcher_queue_depth is None:
+            dispatcher_queue_depth = max(DEFAULT_DISPATCHER_QUEUE_DEPTH, required_depth)
+        if dispatcher_queue_depth <= 0:
+            raise ValueError("dispatcher_queue_depth must be greater than 0.")
+        if dispatcher_workers > 0 and dispatcher_queue_depth < required_depth:
+            raise ValueError(f"dispatcher_queue_depth must be at least {required_depth} for a block size "
+                             f"of {max_block_size}.")
+        if tx_dl not in CAN_FD_DATA_LENGTHS:
+            raise ValueError(f"tx_dl must be one of {CAN_FD_DATA_LENGTHS}.")
+        if bus_load_ceiling is not None and not 0.0 < bus_load_ceiling <= 1.0:
+            raise ValueError("bus_load_ceiling must be between 0 and 1.")
         # self.address = address
         self.max_block_size = max_block_size
         self.timeout = timeout
@@ -23,5 +63,12 @@ class IsoTpConfig:
         self.on_recv_success = on_recv_success
         self.on_recv_error = on_recv_error
         self.send_fn: Callable = None
+        self.send_batch_fn: Callable = None
         self.recv_id = recv_id
+        self.dispatcher_workers = dispatcher_workers
+        self.dispatcher_queue_depth = dispatcher_queue_depth
+        self.deliver_memoryview = deliver_memoryview
+        self.tx_dl = tx_dl
+        self.bus_load_ceiling = bus_load_ceiling
+        self.max_extra_stmin = max_extra_stmin
 
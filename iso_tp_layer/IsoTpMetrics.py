@@ -0,0 +1,23 @@
+import sys
+import os
+current_dir = os.path.dirname(os.path.abspath(__file__))
+package_dir = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(package_dir)
+from metrics import counter, histogram
+
+# ISO-TP metrics, registered in the process-wide metrics registry
+
+FRAMES = counter("isotp_frames_total", "ISO-TP frames by direction and frame type", ("direction", "type"))
+MESSAGES = counter("isotp_messages_total", "ISO-TP messages by direction and result", ("direction", "result"))
+FLOW_CONTROL_WAITS = counter("isotp_flow_control_wait_total", "Flow control frames with status Wait received")
+TIMEOUTS = counter("isotp_timeouts_total", "ISO-TP timeouts by timer (N_Bs on send, N_Cr on receive)", ("timer",))
+REASSEMBLY_SECONDS = histogram("isotp_reassembly_seconds",
+                               "Time from First Frame to the last Consecutive Frame of received messages")
+
+_FRAME_TYPE_NAMES = ("single", "first", "consecutive", "flow_control")
+
+# Counter of every frame type, indexed by the PCI byte's high nibble
+RX_FRAMES_BY_PCI = tuple(FRAMES.labels("rx", _FRAME_TYPE_NAMES[index] if index < 4 else "invalid")
+                         for index in range(16))
+TX_FRAMES_BY_PCI = tuple(FRAMES.labels("tx", _FRAME_TYPE_NAMES[index] if index < 4 else "invalid")
+                         for index in range(16))
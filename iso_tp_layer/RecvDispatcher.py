@@ -0,0 +1,161 @@
+from collections import deque
+from typing import Callable, Deque, Dict
+import threading
+import sys
+import os
+current_dir = os.path.dirname(os.path.abspath(__file__))
+package_dir = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(package_dir)
+from logger import get_logger, LogType, ProtocolType
+
+
+class RecvDispatcher:
+    """
+    Fixed pool of worker threads that processes received CAN frames.
+
+    Every source arbitration ID gets its own FIFO queue, and at most one worker
+    drains a given queue at a time, so frames from one ECU are handled strictly
+    in arrival order while frames from different ECUs are processed in parallel.
+    """
+
+    def __init__(self, handler: Callable, workers: int = 4, queue_depth: int = 256):
+        """
+        :param handler: Function called with each submitted frame (one argument).
+        :param workers: Number of worker threads in the pool.
+        :param queue_depth: Maximum number of pending frames per arbitration ID. Frames arriving
+                            while the queue of their ID is full are dropped and counted per ID;
+                            submit() never blocks, the caller is usually the only CAN receive thread.
+        """
+        if workers <= 0:
+            raise ValueError("workers must be greater than 0.")
+        if queue_depth <= 0:
+            raise ValueError("queue_depth must be greater than 0.")
+        self._handler = handler
+        self._workers_count = workers
+        self._queue_depth = queue_depth
+        self._queues: Dict[int, Deque] = {}
+        self._ready: Deque[int] = deque()  # Arbitration IDs with pending frames and no active worker
+        self._scheduled = set()  # Arbitration IDs that are either ready or being drained
+        self._condition = threading.Condition()
+        self._running = False
+        self._workers = []
+
+        # Backpressure counters
+        self._frames_submitted = 0
+        self._frames_processed = 0
+        self._frames_dropped = 0
+        self._dropped_by_id: Dict[int, int] = {}
+        self._handler_errors = 0
+        self._high_water_mark = 0
+
+        self.logger = get_logger(ProtocolType.ISO_TP)
+
+    def start(self):
+        """Start the worker threads. Calling start on a running dispatcher does nothing."""
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+            for index in range(self._workers_count):
+                worker = threading.Thread(target=self._worker_loop, daemon=True,
+                                          name=f"IsoTpDispatcher-{index}")
+                self._workers.append(worker)
+                worker.start()
+        self.logger.log_message(log_type=LogType.INITIALIZATION,
+                                message=f"Receive dispatcher started with {self._workers_count} workers, "
+                                        f"queue depth {self._queue_depth}")
+
+    def stop(self, timeout: float = 1.0):
+        """Stop the worker threads. Frames still queued are discarded."""
+        with self._condition:
+            if not self._running:
+                return
+            self._running = False
+            self._condition.notify_all()
+        for worker in self._workers:
+            worker.join(timeout)
+        self._workers = []
+        with self._condition:
+            self._queues.clear()
+            self._ready.clear()
+            self._scheduled.clear()
+
+    def is_running(self) -> bool:
+        return self._running
+
+    def submit(self, arbitration_id: int, frame) -> bool:
+        """
+        Queue a frame for processing.
+
+        :return: True if the frame was queued, False if it was dropped because the
+                 queue of its arbitration ID is full or the dispatcher is stopped.
+        """
+        with self._condition:
+            if not self._running:
+                self._frames_dropped += 1
+                return False
+            queue = self._queues.get(arbitration_id)
+            if queue is None:
+                queue = deque()
+                self._queues[arbitration_id] = queue
+            if len(queue) >= self._queue_depth:
+                # Only this ID loses the frame, the other IDs keep being received
+                self._frames_dropped += 1
+                self._dropped_by_id[arbitration_id] = self._dropped_by_id.get(arbitration_id, 0) + 1
+                return False
+            queue.append(frame)
+            self._frames_submitted += 1
+            if len(queue) > self._high_water_mark:
+                self._high_water_mark = len(queue)
+            if arbitration_id not in self._scheduled:
+                self._scheduled.add(arbitration_id)
+                self._ready.append(arbitration_id)
+                self._condition.notify()
+            return True
+
+    def get_statistics(self) -> Dict:
+        """Return a snapshot of the backpressure counters."""
+        with self._condition:
+            return {
+                "workers": self._workers_count,
+                "queue_depth": self._queue_depth,
+                "frames_submitted": self._frames_submitted,
+                "frames_processed": self._frames_processed,
+                "frames_dropped": self._frames_dropped,
+                "frames_dropped_by_id": dict(self._dropped_by_id),
+                "handler_errors": self._handler_errors,
+                "high_water_mark": self._high_water_mark,
+                "pending": sum(len(queue) for queue in self._queues.values()),
+            }
+
+    def _worker_loop(self):
+        while True:
+            with self._condition:
+                while self._running and not self._ready:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                arbitration_id = self._ready.popleft()
+                queue = self._queues[arbitration_id]
+
+            # Drain the queue of this arbitration ID; no other worker touches it meanwhile
+            while True:
+                with self._condition:
+                    if not self._running:
+                        return
+                    if not queue:
+                        self._scheduled.discard(arbitration_id)
+                        del self._queues[arbitration_id]
+                        break
+                    frame = queue.popleft()
+                failed = False
+                try:
+                    self._handler(frame)
+                except Exception as e:
+                    failed = True
+                    self.logger.log_message(log_type=LogType.ERROR,
+                                            message=f"Dispatcher handler failed for ID 0x{arbitration_id:X}: {e}")
+                with self._condition:
+                    self._frames_processed += 1
+                    if failed:
+                        self._handler_errors += 1
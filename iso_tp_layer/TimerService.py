@@ -0,0 +1,177 @@
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, List, Optional
+import sys
+import os
+current_dir = os.path.dirname(os.path.abspath(__file__))
+package_dir = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(package_dir)
+from logger import get_logger, LogType, ProtocolType
+
+
+class TimerHandle:
+    """
+    A deadline registered with a TimerService.
+
+    Resetting only moves the deadline stored in the handle (O(1)); the service notices the
+    new deadline lazily when the old heap entry expires and re-queues it. The handle fields are
+    only changed with the service lock held, like the timer thread does.
+    """
+
+    def __init__(self, service: "TimerService", timeout_ms: float, callback: Callable):
+        self._service = service
+        self._timeout = timeout_ms / 1000.0
+        self._callback = callback
+        self._deadline = service._now() + self._timeout
+        self._cancelled = False
+        self._fired = False
+
+    def reset(self, timeout_ms: Optional[float] = None):
+        """
+        Move the deadline to now + timeout.
+
+        :param timeout_ms: New timeout in milliseconds, the previous timeout is reused if None.
+        """
+        service = self._service
+        with service._condition:
+            if timeout_ms is not None:
+                self._timeout = timeout_ms / 1000.0
+            new_deadline = service._now() + self._timeout
+            if self._fired:
+                # An expired handle is re-armed like a new one
+                self._fired = False
+                self._cancelled = False
+                self._deadline = new_deadline
+                service._push(self)
+            elif new_deadline < self._deadline:
+                # Only shortening a deadline needs a new heap entry
+                self._deadline = new_deadline
+                service._push(self)
+            else:
+                self._deadline = new_deadline
+
+    def cancel(self):
+        """Cancel the deadline; the callback will not be called."""
+        with self._service._condition:
+            self._cancelled = True
+
+    def is_active(self) -> bool:
+        return not self._cancelled and not self._fired
+
+    def get_deadline(self) -> float:
+        return self._deadline
+
+
+class TimerService:
+    """
+    Deadline scheduler shared by all ISO-TP requests of an IsoTp instance.
+
+    Deadlines are kept in a heap and served by a single daemon thread, so the number of
+    threads stays constant no matter how many transfers are active.
+    """
+
+    def __init__(self):
+        self._heap: List = []
+        self._counter = itertools.count()  # Tie breaker for equal deadlines
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+        self._paused_at: Optional[float] = None
+        self.logger = get_logger(ProtocolType.ISO_TP)
+
+    def schedule(self, timeout_ms: float, callback: Callable) -> TimerHandle:
+        """
+        Register a deadline.
+
+        :param timeout_ms: Time in milliseconds until the callback is called.
+        :param callback: Function without arguments called from the timer thread on expiry.
+        :return: A handle used to reset or cancel the deadline.
+        """
+        with self._condition:
+            handle = TimerHandle(self, timeout_ms, callback)
+            self._push(handle)
+        return handle
+
+    def _now(self) -> float:
+        """
+        Current time of the deadlines: frozen while paused, so that a deadline set meanwhile counts
+        from the pause and resume() moves it like the others. Called with the lock held.
+        """
+        return self._paused_at if self._paused_at is not None else time.monotonic()
+
+    def pause(self):
+        """Stop the clock of every deadline, e.g. while the CAN bus is reconnected. Nothing expires until resume()."""
+        with self._condition:
+            if self._paused_at is None:
+                self._paused_at = time.monotonic()
+
+    def resume(self):
+        """Restart the clock: every pending deadline is moved by the time spent paused."""
+        with self._condition:
+            if self._paused_at is None:
+                return
+            shift = time.monotonic() - self._paused_at
+            self._paused_at = None
+            shifted = set()
+            heap = []
+            for deadline, order, handle in self._heap:
+                if id(handle) not in shifted:
+                    shifted.add(id(handle))
+                    handle._deadline += shift
+                heap.append((deadline + shift, order, handle))
+            heapq.heapify(heap)
+            self._heap = heap
+            self._condition.notify_all()
+
+    def is_paused(self) -> bool:
+        return self._paused_at is not None
+
+    def stop(self):
+        """Stop the timer thread. Pending deadlines are dropped."""
+        with self._condition:
+            self._running = False
+            self._heap.clear()
+            self._condition.notify_all()
+
+    def pending_count(self) -> int:
+        with self._condition:
+            return len(self._heap)
+
+    def _push(self, handle: TimerHandle):
+        with self._condition:
+            heapq.heappush(self._heap, (handle.get_deadline(), next(self._counter), handle))
+            if not self._running:
+                self._running = True
+                self._thread = threading.Thread(target=self._run, daemon=True, name="IsoTpTimerService")
+                self._thread.start()
+            elif self._heap[0][2] is handle:
+                # New earliest deadline, wake the thread so it sleeps for the right amount
+                self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._running:
+                    return
+                if not self._heap or self._paused_at is not None:
+                    self._condition.wait()
+                    continue
+                deadline, _, handle = self._heap[0]
+                now = time.monotonic()
+                if deadline > now:
+                    self._condition.wait(deadline - now)
+                    continue
+                heapq.heappop(self._heap)
+                if not handle.is_active() or handle.get_deadline() != deadline:
+                    if handle.is_active() and handle.get_deadline() > deadline:
+                        # The handle was reset after this entry was queued
+                        heapq.heappush(self._heap, (handle.get_deadline(), next(self._counter), handle))
+                    continue
+                handle._fired = True
+
+            try:
+                handle._callback()
+            except Exception as e:
+                self.logger.log_message(log_type=LogType.ERROR, message=f"Timer callback failed: {e}")
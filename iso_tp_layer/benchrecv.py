@@ -0,0 +1,109 @@
+import logging
+import threading
+import time
+import can
+import sys
+import os
+current_dir = os.path.dirname(os.path.abspath(__file__))
+package_dir = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.append(package_dir)
+from logger import set_log_level, flush_logs
+from iso_tp_layer.Address import Address
+from iso_tp_layer.IsoTp import IsoTp
+from iso_tp_layer.IsoTpConfig import IsoTpConfig
+from can_layer.can_communication import CANCommunication, CANConfiguration
+from can_layer.enums import CANInterface
+from can_layer.models import VirtualBusConfig
+
+# Receive benchmark: frames per second through the ISO-TP receive path, first with the frames
+# handed straight to the layer (legacy per-frame Address and decoding vs the zero-copy path),
+# then end to end between two nodes of the virtual bus.
+
+MESSAGE_LENGTH = 4095
+MESSAGES = 200
+TESTER_ID = 0x33
+ECU_ID = 0x55
+VIRTUAL_CHANNEL = 90
+
+
+def make_frames() -> list:
+    """The CAN frames of one MESSAGE_LENGTH bytes transfer, as received by the tester."""
+    data = bytes(index % 251 for index in range(MESSAGE_LENGTH))
+    frames = [bytes([0x10 | (MESSAGE_LENGTH >> 8), MESSAGE_LENGTH & 0xFF]) + data[:6]]
+    for offset, sequence in zip(range(6, MESSAGE_LENGTH, 7), range(1, MESSAGE_LENGTH)):
+        chunk = data[offset:offset + 7]
+        frames.append(bytes([0x20 | (sequence & 0x0F)]) + chunk + bytes(7 - len(chunk)))
+    return [can.Message(arbitration_id=ECU_ID, data=frame, is_extended_id=False) for frame in frames]
+
+
+def make_receiver(on_success, dispatcher_workers: int = 0) -> IsoTp:
+    isotp = IsoTp(IsoTpConfig(max_block_size=0, timeout=1000, stmin=0, on_recv_success=on_success,
+                              on_recv_error=lambda e: print(f"Receive error: {e}"), recv_id=TESTER_ID,
+                              dispatcher_workers=dispatcher_workers, deliver_memoryview=True))
+    isotp.set_send_fn(lambda arbitration_id, data: True)
+    return isotp
+
+
+def bench_direct(label: str, zero_copy: bool) -> float:
+    received = []
+    isotp = make_receiver(lambda message, address: received.append(len(message)))
+    frames = make_frames()
+    if zero_copy:
+        process = isotp._process_can_message
+    else:
+        # What the receive path did per frame: a new Address and a decoded frame object
+        def process(message):
+            isotp.recv(message=memoryview(message.data),
+                       address=Address(txid=message.arbitration_id, rxid=TESTER_ID))
+    start = time.perf_counter()
+    for _ in range(MESSAGES):
+        for message in frames:
+            process(message)
+    elapsed = time.perf_counter() - start
+    isotp.close()
+    assert received == [MESSAGE_LENGTH] * MESSAGES, "transfers lost"
+    rate = MESSAGES * len(frames) / elapsed
+    print(f"{label:<28}: {rate:12,.0f} frames/s")
+    return rate
+
+
+def bench_virtual_bus() -> float:
+    """Frames per second received by a tester from an ECU, over the virtual bus without bitrate timing."""
+    done = threading.Semaphore(0)
+    config = VirtualBusConfig(bitrate_timing=False)
+    tester = make_receiver(lambda message, address: done.release(), dispatcher_workers=2)
+    tester_can = CANCommunication(CANConfiguration(serial_number=0, interface=CANInterface.VIRTUAL, channel=VIRTUAL_CHANNEL,
+                                                   virtual_config=config, recv_callback=tester.recv_can_message))
+    tester.set_send_fn(tester_can.send_message)
+    ecu = IsoTp(IsoTpConfig(max_block_size=0, timeout=1000, stmin=0, on_recv_success=lambda message, address: None,
+                            on_recv_error=lambda e: None, recv_id=ECU_ID))
+    ecu_can = CANCommunication(CANConfiguration(serial_number=0, interface=CANInterface.VIRTUAL, channel=VIRTUAL_CHANNEL,
+                                                virtual_config=config, recv_callback=ecu.recv_can_message))
+    ecu.set_send_fn(ecu_can.send_message)
+    tester_can.start_receiving()
+    ecu_can.start_receiving()
+
+    data = bytes(index % 251 for index in range(MESSAGE_LENGTH))
+    frames_before = tester_can.statistics.rx_count
+    start = time.perf_counter()
+    for _ in range(MESSAGES // 4):
+        ecu.send(data, Address(txid=TESTER_ID, rxid=ECU_ID), lambda progress: None, lambda e: print(f"Send error: {e}"))
+        if not done.acquire(timeout=5):
+            raise RuntimeError("Transfer timed out")
+    elapsed = time.perf_counter() - start
+    frames = tester_can.statistics.rx_count - frames_before
+    for closable in (tester_can, ecu_can, tester, ecu):
+        closable.close()
+    rate = frames / elapsed
+    print(f"{'virtual bus, end to end':<28}: {rate:12,.0f} frames/s")
+    return rate
+
+
+if __name__ == "__main__":
+    # The log writer would dominate the measurement, keep the warnings and errors only
+    set_log_level(logging.WARNING)
+    before = bench_direct("per-frame Address + decode", zero_copy=False)
+    after = bench_direct("zero-copy path", zero_copy=True)
+    print(f"{'speed-up':<28}: {after / before:12.1f}x")
+    bench_virtual_bus()
+    flush_logs()
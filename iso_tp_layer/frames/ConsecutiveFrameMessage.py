@@ -1,5 +1,5 @@
-import numpy as np
 from dataclasses import dataclass
+from typing import Union
 from bitarray import bitarray
 import sys
 import os
@@ -15,9 +15,9 @@ from iso_tp_layer.frames.FrameType import FrameType
 class ConsecutiveFrameMessage(DataFrame):
     sequenceNumber: int
 
-    def __init__(self, sequenceNumber: int, data: bitarray):
+    def __init__(self, sequenceNumber: int, data: Union[bitarray, memoryview]):
         super().__init__(FrameType.ConsecutiveFrame, data)
-        self.sequenceNumber = np.uint8(sequenceNumber)
+        self.sequenceNumber = int(sequenceNumber)
 
     def __str__(self):
         """Return a human-readable string representation of the object."""
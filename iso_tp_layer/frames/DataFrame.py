@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import Union
 from bitarray import bitarray
 import sys
 import os
@@ -11,8 +12,22 @@ from iso_tp_layer.frames.FrameMessage import FrameMessage
 
 @dataclass
 class DataFrame(FrameMessage):
-    data: bitarray
+    data: Union[bitarray, memoryview]
 
-    def __init__(self, frameType: FrameType, data: bitarray):
+    def __init__(self, frameType: FrameType, data: Union[bitarray, memoryview]):
         super().__init__(frameType)
         self.data = data
+
+    def get_payload_length(self) -> int:
+        """Return the length of the carried data in bytes."""
+        if isinstance(self.data, bitarray):
+            return (len(self.data) + 7) // 8
+        return len(self.data)
+
+    def get_payload(self, length: int = None) -> Union[bitarray, memoryview]:
+        """Return the carried data, truncated to `length` bytes if given."""
+        if length is None:
+            return self.data
+        if isinstance(self.data, bitarray):
+            return self.data[:length * 8]
+        return self.data[:length]
@@ -1,4 +1,3 @@
-import numpy as np
 from dataclasses import dataclass
 import sys
 import os
@@ -20,7 +19,7 @@ class FlowControlFrameMessage(FrameMessage):
     def __init__(self, flowStatus: FlowStatus, blockSize: int, separationTime: int):
         super().__init__(FrameType.FlowControlFrame)
         self.flowStatus = flowStatus
-        self.blockSize = np.uint8(blockSize)
-        self.separationTime = np.uint8(separationTime)
+        self.blockSize = int(blockSize)
+        self.separationTime = int(separationTime)
 
 
@@ -0,0 +1,222 @@
+"""
+Byte oriented encoder/decoder for ISO-TP frames.
+
+Frames are decoded straight from the CAN payload (bytes, bytearray or memoryview) and the data
+of single/first/consecutive frames is kept as a memoryview slice of that payload, so no bit
+level conversion or copy happens on the hot path. Frames are encoded into a preallocated
+per-thread buffer.
+"""
+import threading
+from typing import Union
+from bitarray import bitarray
+import sys
+import os
+current_dir = os.path.dirname(os.path.abspath(__file__))
+package_dir = os.path.abspath(os.path.join(current_dir, ".."))
+package_dir = os.path.abspath(os.path.join(package_dir, ".."))
+sys.path.append(package_dir)
+from iso_tp_layer.frames.ConsecutiveFrameMessage import ConsecutiveFrameMessage
+from iso_tp_layer.frames.FirstFrameMessage import FirstFrameMessage
+from iso_tp_layer.frames.FlowControlFrameMessage import FlowControlFrameMessage
+from iso_tp_layer.frames.FlowStatus import FlowStatus
+from iso_tp_layer.frames.FrameMessage import FrameMessage
+from iso_tp_layer.frames.SingleFrameMessage import SingleFrameMessage
+
+MAX_FRAME_LENGTH = 64  # Largest CAN FD payload
+FF_DL_12BIT_MAX = 0xFFF  # Largest length announced in the classic 12-bit First Frame header
+FF_DL_MAX = 0xFFFFFFFF  # Largest length announced with the 32-bit escape header (ISO 15765-2:2016)
+CAN_FD_DATA_LENGTHS = (8, 12, 16, 20, 24, 32, 48, 64)  # Valid TX_DL values / FD frame lengths above 8
+
+# Smallest valid CAN (FD) frame length able to hold n bytes, indexed by n
+_PADDED_LENGTHS = tuple(
+    next(length for length in CAN_FD_DATA_LENGTHS if length >= max(n, 8)) for n in range(MAX_FRAME_LENGTH + 1)
+)
+
+_FLOW_STATUS = tuple(FlowStatus(value) for value in range(16))
+_thread_buffers = threading.local()
+
+
+def _decode_single(view: memoryview, pci: int) -> FrameMessage:
+    data_length = pci & 0x0F
+    if data_length == 0 and len(view) > 8:
+        # CAN FD escape sequence, the length is in the second byte
+        data_length = view[1]
+        return SingleFrameMessage(dataLength=data_length, data=view[2:2 + data_length])
+    return SingleFrameMessage(dataLength=data_length, data=view[1:1 + data_length])
+
+
+def _decode_first(view: memoryview, pci: int) -> FrameMessage:
+    if len(view) < 2:
+        raise ValueError("Invalid First Frame: Insufficient data.")
+    data_length = ((pci & 0x0F) << 8) | view[1]
+    if data_length:
+        return FirstFrameMessage(dataLength=data_length, data=view[2:])
+    # Escape sequence: a 12-bit length of 0 is followed by a 32-bit length
+    if len(view) < 6:
+        raise ValueError("Invalid First Frame: Insufficient data.")
+    data_length = (view[2] << 24) | (view[3] << 16) | (view[4] << 8) | view[5]
+    return FirstFrameMessage(dataLength=data_length, data=view[6:])
+
+
+def _decode_consecutive(view: memoryview, pci: int) -> FrameMessage:
+    return ConsecutiveFrameMessage(sequenceNumber=pci & 0x0F, data=view[1:])
+
+
+def _decode_flow_control(view: memoryview, pci: int) -> FrameMessage:
+    if len(view) < 3:
+        raise ValueError("Invalid Flow Control Frame: Insufficient data.")
+    return FlowControlFrameMessage(flowStatus=_FLOW_STATUS[pci & 0x0F], blockSize=view[1], separationTime=view[2])
+
+
+def _decode_unknown(view: memoryview, pci: int) -> FrameMessage:
+    raise ValueError(f"Unknown Frame Type: {pci >> 4}")
+
+
+# Decoder for every possible PCI byte, indexed by the byte itself
+_DECODERS = tuple(
+    (_decode_single, _decode_first, _decode_consecutive, _decode_flow_control)[pci >> 4] if (pci >> 4) < 4
+    else _decode_unknown
+    for pci in range(256)
+)
+
+
+def decode_frame(data: Union[bytes, bytearray, memoryview]) -> FrameMessage:
+    """
+    Decode a CAN payload into an ISO-TP frame.
+
+    :param data: The CAN payload.
+    :return: The decoded frame; its data (if any) is a memoryview over `data`.
+    """
+    view = data if isinstance(data, memoryview) else memoryview(data)
+    if not len(view):
+        raise ValueError("The input data is empty or invalid.")
+    pci = view[0]
+    return _DECODERS[pci](view, pci)
+
+
+def _get_buffer() -> bytearray:
+    buffer = getattr(_thread_buffers, "buffer", None)
+    if buffer is None:
+        buffer = bytearray(MAX_FRAME_LENGTH)
+        _thread_buffers.buffer = buffer
+    return buffer
+
+
+def _as_bytes(data) -> Union[bytes, memoryview]:
+    if isinstance(data, bitarray):
+        return data.tobytes()
+    return data
+
+
+def encode_frame(frame: FrameMessage, buffer: bytearray = None) -> memoryview:
+    """
+    Encode an ISO-TP frame without padding.
+
+    :param frame: The frame to encode.
+    :param buffer: Destination buffer, a per-thread preallocated buffer is used if None.
+    :return: A memoryview over the encoded bytes. It is only valid until the buffer is reused,
+             copy it if it has to outlive the next encode call of the same thread.
+    """
+    if buffer is None:
+        buffer = _get_buffer()
+
+    if isinstance(frame, FlowControlFrameMessage):
+        buffer[0] = 0x30 | frame.flowStatus.value
+        buffer[1] = frame.blockSize
+        buffer[2] = frame.separationTime
+        return memoryview(buffer)[:3]
+
+    data = _as_bytes(frame.data)
+    data_length = len(data)
+    if isinstance(frame, SingleFrameMessage):
+        if frame.dataLength <= 7:
+            buffer[0] = frame.dataLength
+            header_length = 1
+        else:
+            buffer[0] = 0x00
+            buffer[1] = frame.dataLength
+            header_length = 2
+    elif isinstance(frame, FirstFrameMessage):
+        header_length = _encode_first_header(buffer, frame.dataLength)
+    elif isinstance(frame, ConsecutiveFrameMessage):
+        buffer[0] = 0x20 | (frame.sequenceNumber & 0x0F)
+        header_length = 1
+    else:
+        raise ValueError("Unsupported message type for encoding.")
+
+    end = header_length + data_length
+    buffer[header_length:end] = data
+    return memoryview(buffer)[:end]
+
+
+def padded_length(length: int) -> int:
+    """Smallest valid CAN (FD) frame length, at least 8, able to hold `length` bytes."""
+    return _PADDED_LENGTHS[length]
+
+
+def single_frame_capacity(tx_dl: int) -> int:
+    """Largest payload carried by a single frame with the given TX_DL."""
+    return 7 if tx_dl <= 8 else tx_dl - 2
+
+
+def _pad(buffer: bytearray, end: int, padding: int) -> memoryview:
+    frame_length = _PADDED_LENGTHS[end]
+    for index in range(end, frame_length):
+        buffer[index] = padding
+    return memoryview(buffer)[:frame_length]
+
+
+def encode_single(buffer: bytearray, data, padding: int) -> memoryview:
+    """
+    Encode a padded single frame into `buffer`.
+    Up to 7 bytes use the classic layout, longer payloads (CAN FD only) the escape length byte.
+    """
+    data_length = len(data)
+    if data_length <= 7:
+        buffer[0] = data_length
+        header_length = 1
+    else:
+        buffer[0] = 0x00
+        buffer[1] = data_length
+        header_length = 2
+    end = header_length + data_length
+    buffer[header_length:end] = data
+    return _pad(buffer, end, padding)
+
+
+def first_frame_header_length(total_length: int) -> int:
+    """Number of PCI bytes of the first frame of a `total_length` bytes message."""
+    return 2 if total_length <= FF_DL_12BIT_MAX else 6
+
+
+def _encode_first_header(buffer: bytearray, total_length: int) -> int:
+    if total_length <= FF_DL_12BIT_MAX:
+        buffer[0] = 0x10 | (total_length >> 8)
+        buffer[1] = total_length & 0xFF
+        return 2
+    if total_length > FF_DL_MAX:
+        raise ValueError(f"First Frame length {total_length} exceeds the 32-bit FF_DL.")
+    buffer[0] = 0x10
+    buffer[1] = 0x00
+    buffer[2:6] = total_length.to_bytes(4, "big")
+    return 6
+
+
+def encode_first(buffer: bytearray, total_length: int, data) -> memoryview:
+    """
+    Encode a first frame announcing `total_length` bytes and carrying `data` into `buffer`.
+    Lengths above 4095 bytes use the 32-bit escape header, `data` must then be 4 bytes shorter.
+    """
+    header_length = _encode_first_header(buffer, total_length)
+    end = header_length + len(data)
+    buffer[header_length:end] = data
+    return memoryview(buffer)[:end]
+
+
+def encode_consecutive(buffer: bytearray, sequence_number: int, data, padding: int) -> memoryview:
+    """Encode a consecutive frame, padded to 8 bytes or the next valid CAN FD length, into `buffer`."""
+    data_length = len(data)
+    buffer[0] = 0x20 | (sequence_number & 0x0F)
+    end = 1 + data_length
+    buffer[1:end] = data
+    return _pad(buffer, end, padding)
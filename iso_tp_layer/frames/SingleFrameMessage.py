@@ -1,5 +1,5 @@
-import numpy as np
 from dataclasses import dataclass
+from typing import Union
 from bitarray import bitarray
 import sys
 import os
@@ -15,9 +15,9 @@ from iso_tp_layer.frames.FrameType import FrameType
 class SingleFrameMessage(DataFrame):
     dataLength: int
 
-    def __init__(self, dataLength: int, data: bitarray):
+    def __init__(self, dataLength: int, data: Union[bitarray, memoryview]):
         super().__init__(FrameType.SingleFrame, data)
-        self.dataLength = np.uint8(dataLength)
+        self.dataLength = int(dataLength)
 
     def __str__(self):
         """Return a human-readable string representation of the object."""
@@ -0,0 +1,46 @@
+import time
+from bitarray import bitarray
+import sys
+import os
+current_dir = os.path.dirname(os.path.abspath(__file__))
+package_dir = os.path.abspath(os.path.join(current_dir, ".."))
+package_dir = os.path.abspath(os.path.join(package_dir, ".."))
+sys.path.append(package_dir)
+from iso_tp_layer.IsoTp import _parse_message, message_to_bitarray, bytearray_to_bitarray
+from iso_tp_layer.frames.FrameCodec import decode_frame, encode_frame
+
+# Micro-benchmark: decode + re-encode a typical mix of ISO-TP frames, bitarray path vs byte codec.
+
+FRAMES = [
+    bytes([0x03, 0x22, 0xF1, 0x90, 0xAA, 0xAA, 0xAA, 0xAA]),  # Single frame
+    bytes([0x10, 0xC8, 0x36, 0x01, 0x00, 0x01, 0x02, 0x03]),  # First frame
+    bytes([0x30, 0x08, 0x00]),  # Flow control
+] + [bytes([0x20 | (seq & 0x0F), 1, 2, 3, 4, 5, 6, 7]) for seq in range(1, 30)]  # Consecutive frames
+
+ROUNDS = 2000
+
+
+def bench_bitarray() -> float:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for frame in FRAMES:
+            message = _parse_message(bytearray_to_bitarray(bytearray(frame)))
+            message_to_bitarray(message).tobytes()
+    return ROUNDS * len(FRAMES) / (time.perf_counter() - start)
+
+
+def bench_codec() -> float:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for frame in FRAMES:
+            message = decode_frame(frame)
+            encode_frame(message)
+    return ROUNDS * len(FRAMES) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    before = bench_bitarray()
+    after = bench_codec()
+    print(f"bitarray path : {before:12,.0f} frames/s")
+    print(f"byte codec    : {after:12,.0f} frames/s")
+    print(f"speed-up      : {after / before:12.1f}x")
@@ -1,4 +1,4 @@
-from math import ceil
+from bitarray import bitarray
 import sys
 import os
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -21,55 +21,69 @@ from logger import LogType
 
 class ConsecutiveFrameState(RequestState):
     def handle(self, request, message):
-        try:
-            if message.frameType == FrameType.ConsecutiveFrame:
-                request.logger.log_message(
-                    log_type=LogType.RECEIVE,
-                    message=f"[RecvRequest-{request._id}] Received {message}"
-                )
-                if message.sequenceNumber == request.get_expected_sequence_number():
-                    max_block_size = request.get_max_block_size()
-                    current_block_size = request.get_current_block_size()
-                    if max_block_size > 0:
-                        if current_block_size < max_block_size:
-                            current_block_size = request.get_current_block_size()
-                            current_block_size += 1
-                            request.set_current_block_size(current_block_size)
-
-                            if current_block_size == max_block_size:
-                                request.send_flow_control_frame()
+        if message.frameType != FrameType.ConsecutiveFrame:
+            # f"Was expecting {expected_type} and received {received_type}"
+            self._fail(request, UnexpectedFrameTypeException("FrameType.ConsecutiveFrame", message.frameType))
+            return
+        request.logger.log_message(
+            log_type=LogType.RECEIVE,
+            message=lambda: f"[RecvRequest-{request._id}] Received {message}"
+        )
+        self.handle_payload(request, message.sequenceNumber, message.data)
 
-                                request.set_current_block_size(0)
-                        else:
-                            # "Received ConsecutiveFrame before sending the control flow"
-                            raise ConsecutiveFrameBeforeFlowControlException()
+    def handle_payload(self, request, sequence_number: int, payload):
+        """
+        Handle a consecutive frame given by its sequence number and data, so that the receive fast
+        path of IsoTp does not have to build a ConsecutiveFrameMessage.
 
-                    request.reset_timeout_timer()
-                    request.start_timeout_timer()
-                    request.set_expected_sequence_number((message.sequenceNumber + 1) % 16)
-                    message_length = ceil(len(message.data) / 8)
+        :param request: The receive request.
+        :param sequence_number: Sequence number of the frame.
+        :param payload: Data of the frame (memoryview over the CAN payload, or bitarray).
+        """
+        try:
+            if sequence_number == request.get_expected_sequence_number():
+                max_block_size = request.get_max_block_size()
+                current_block_size = request.get_current_block_size()
+                if max_block_size > 0:
+                    if current_block_size < max_block_size:
+                        current_block_size += 1
+                        request.set_current_block_size(current_block_size)
 
-                    if (request.get_current_data_length() + message_length) > request.get_data_length():
-                        request.append_bits(message.data[
-                                            :(request.get_data_length() - request.get_current_data_length()) * 8])
+                        if current_block_size == max_block_size:
+                            request.send_flow_control_frame()
 
+                            request.set_current_block_size(0)
                     else:
-                        request.append_bits(message.data)
-                    if request.get_current_data_length() >= request.get_data_length():
-                        request.set_state(FinalState())
-                        try:
-                            request.on_success(request.get_message(), request.get_address())
-                        except Exception as e:
-                            pass
-                else:
-                    # f"Consecutive message out of sequence! Expected sequence number {expected_seq} and received {received_seq}"
-                    raise ConsecutiveFrameOutOfSequenceException(request.get_expected_sequence_number(),
-                                                                 message.sequenceNumber)
+                        # "Received ConsecutiveFrame before sending the control flow"
+                        raise ConsecutiveFrameBeforeFlowControlException()
+
+                request.reset_timeout_timer()
+                request.start_timeout_timer()
+                request.set_expected_sequence_number((sequence_number + 1) % 16)
+                remaining = request.get_data_length() - request.get_current_data_length()
+
+                if isinstance(payload, bitarray):
+                    payload = payload.tobytes()
+                if len(payload) > remaining:
+                    # The last frame is padded
+                    payload = payload[:remaining]
+                request.append_data(payload)
+                if request.get_current_data_length() >= request.get_data_length():
+                    request.set_state(FinalState())
+                    try:
+                        request.on_success(request.get_message(), request.get_address())
+                    except Exception as e:
+                        pass
             else:
-                # f"Was expecting {expected_type} and received {received_type}"
-                raise UnexpectedFrameTypeException("FrameType.ConsecutiveFrame", message.frameType)
+                # f"Consecutive message out of sequence! Expected sequence number {expected_seq} and received {received_seq}"
+                raise ConsecutiveFrameOutOfSequenceException(request.get_expected_sequence_number(),
+                                                             sequence_number)
 
         except Exception as e:
-            request.set_state(ErrorState())
-            request.send_error_frame(e)
-            request.on_error(e)
+            self._fail(request, e)
+
+    @staticmethod
+    def _fail(request, e: Exception):
+        request.set_state(ErrorState())
+        request.send_error_frame(e)
+        request.on_error(e)
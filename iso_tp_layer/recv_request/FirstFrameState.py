@@ -1,4 +1,3 @@
-from math import ceil
 import sys
 import os
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -24,20 +23,27 @@ class FirstFrameState(RequestState):
             if message.frameType == FrameType.ConsecutiveFrame:
                 request.logger.log_message(
                     log_type=LogType.RECEIVE,
-                    message=f"[RecvRequest-{request._id}] Received {message}"
+                    message=lambda: f"[RecvRequest-{request._id}] Received {message}"
                 )
                 if message.sequenceNumber == request.get_expected_sequence_number():
+                    # The first consecutive frame already counts towards the current block
+                    if request.get_max_block_size() > 0:
+                        request.set_current_block_size(1)
+                        if request.get_max_block_size() == 1:
+                            request.send_flow_control_frame()
+                            request.set_current_block_size(0)
+
                     request.reset_timeout_timer()
                     request.start_timeout_timer()
                     request.set_expected_sequence_number((message.sequenceNumber + 1) % 16)
-                    message_length = ceil(len(message.data) / 8)
+                    message_length = message.get_payload_length()
 
                     if (request.get_current_data_length() + message_length) > request.get_data_length():
-                        request.append_bits(message.data[
-                                            :(request.get_data_length() - request.get_current_data_length())*8])
+                        request.append_data(message.get_payload(
+                            request.get_data_length() - request.get_current_data_length()))
 
                     else:
-                        request.append_bits(message.data)
+                        request.append_data(message.get_payload())
                         # request.set_data_length(message.dataLength)
                     if request.get_current_data_length() >= request.get_data_length():
                         request.set_state(FinalState())
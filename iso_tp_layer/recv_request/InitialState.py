@@ -19,10 +19,10 @@ class InitialState(RequestState):
             if message.frameType == FrameType.SingleFrame:
                 request.logger.log_message(
                     log_type=LogType.RECEIVE,
-                    message=f"[RecvRequest-{request._id}] Received {message}"
+                    message=lambda: f"[RecvRequest-{request._id}] Received {message}"
                 )
                 request.set_data_length(message.dataLength)
-                request.append_bits(message.data)
+                request.append_data(message.get_payload())
                 request.set_state(FinalState())
                 try:
                     request.on_success(request.get_message(), request.get_address())
@@ -31,10 +31,10 @@ class InitialState(RequestState):
             elif message.frameType == FrameType.FirstFrame:
                 request.logger.log_message(
                     log_type=LogType.RECEIVE,
-                    message=f"[RecvRequest-{request._id}] Received {message}"
+                    message=lambda: f"[RecvRequest-{request._id}] Received {message}"
                 )
                 request.set_data_length(message.dataLength)
-                request.append_bits(message.data)
+                request.append_data(message.get_payload())
 
                 request.send_flow_control_frame()
 
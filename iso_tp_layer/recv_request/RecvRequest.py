@@ -1,6 +1,5 @@
 import uuid
-from math import ceil
-from typing import Callable
+from typing import Callable, Union
 from bitarray import bitarray
 import time
 import threading
@@ -17,8 +16,15 @@ from iso_tp_layer.frames.FrameMessage import FrameMessage
 from iso_tp_layer.Address import Address
 from iso_tp_layer.recv_request.InitialState import InitialState
 from iso_tp_layer.recv_request.ErrorState import ErrorState
-from logger import Logger, LogType, ProtocolType
+from iso_tp_layer.recv_request.ConsecutiveFrameState import ConsecutiveFrameState
+from iso_tp_layer.TimerService import TimerService
+from iso_tp_layer.IsoTpMetrics import MESSAGES, TIMEOUTS, REASSEMBLY_SECONDS
+from logger import get_logger, LogType, ProtocolType
+import tracing
 
+# Upper bound of the up-front allocation: a 32-bit First Frame length can announce up to 4 GiB,
+# beyond this the buffer grows as the data actually arrives
+PREALLOCATION_LIMIT = 1 << 20
 
 class RecvRequest:
     """
@@ -26,7 +32,8 @@ class RecvRequest:
     """
 
     def __init__(self, address: Address, block_size, timeout, stmin, on_success: Callable, on_error: Callable,
-                 send_frame: Callable):
+                 send_frame: Callable, timer_service: TimerService = None, on_finished: Callable = None,
+                 deliver_memoryview: bool = False):
         self._id = str(uuid.uuid4())[:8]   # Assign a unique ID
         self._address = address
         self._max_block_size = block_size
@@ -34,16 +41,29 @@ class RecvRequest:
         self._stmin = stmin  # in milliseconds
         self.on_success = on_success
         self.on_error = on_error
+        # Transaction of the first frame when tracing, the later frames and the delivery join it
+        self.correlation_id = tracing.get_correlation_id() if tracing.ENABLED else None
+        if self.correlation_id is not None:
+            self._trace_start = tracing.now()
+            self._on_success_callback = on_success
+            self.on_success = self._on_success_traced
         self._send_frame = send_frame
-        self._message = bitarray()  # Initialize with an empty bitarray
+        self._buffer = bytearray()  # Reassembly buffer, preallocated once the data length is known
+        self._offset = 0  # Number of bytes received so far, i.e. where the next frame is written
+        self._deliver_memoryview = deliver_memoryview  # Hand on_success a read-only memoryview instead of a bitarray
         self._state = InitialState()  # Start with the initial state
         self._expected_sequence_number = 1
         self._current_block_size = 0
         self._data_length = 0
         self._last_received_time = time.time()  # Store the time of last received message
+        self._start_time = time.monotonic()  # Arrival of the first frame
         self._flow_status = FlowStatus.Continue
         self._timeout_thread = None
-        self.logger = Logger(ProtocolType.ISO_TP)
+        self._timer_service = timer_service  # Shared deadline scheduler, a thread per timer is used if None
+        self._timeout_handle = None
+        self._on_finished = on_finished  # Called once with this request when it reaches FinalState or ErrorState
+        self.lock = threading.Lock()  # Serializes the processing of frames of this session
+        self.logger = get_logger(ProtocolType.ISO_TP)
         self.logger.log_message(
             log_type=LogType.RECEIVE,
             message=f"[RecvRequest-{self._id}] Initialized with address {self._address}, block_size={self._max_block_size}, timeout={self._timeout}ms"
@@ -60,7 +80,15 @@ class RecvRequest:
         return self._address
 
     def get_message(self):
-        return self._message
+        """
+        Return the received data: a read-only memoryview over the reassembly buffer in memoryview
+        mode, otherwise a bitarray (built once, when the message is requested).
+        """
+        if self._deliver_memoryview:
+            return memoryview(self._buffer)[:self._offset].toreadonly()
+        message = bitarray()
+        message.frombytes(memoryview(self._buffer)[:self._offset])
+        return message
 
     def send_flow_control_frame(self):
         flow_control_frame = FlowControlFrameMessage(flowStatus=self._flow_status,
@@ -93,19 +121,20 @@ class RecvRequest:
 
     def set_current_block_size(self, current_block_size):
         self._current_block_size = current_block_size
-        self.logger.log_message(
-            log_type=LogType.RECEIVE,
-            message=f"[RecvRequest-{self._id}] Current block size set to {self._current_block_size}"
-        )
+        self.logger.log_message(LogType.RECEIVE, "[RecvRequest-%s] Current block size set to %d",
+                                self._id, self._current_block_size)
 
     def get_data_length(self):
         return self._data_length
 
     def get_current_data_length(self):
-        return ceil(len(self._message) / 8)  # Convert bits to bytes
+        return self._offset
 
     def set_data_length(self, data_length):
         self._data_length = data_length
+        # Allocate the whole message at once, frames are then copied to their offset
+        self._buffer = bytearray(min(data_length, PREALLOCATION_LIMIT))
+        self._offset = 0
         self.logger.log_message(
             log_type=LogType.RECEIVE,
             message=f"[RecvRequest-{self._id}] Data length updated to {self._data_length} bytes"
@@ -119,10 +148,8 @@ class RecvRequest:
 
     def set_expected_sequence_number(self, number):
         self._expected_sequence_number = number
-        self.logger.log_message(
-            log_type=LogType.RECEIVE,
-            message=f"[RecvRequest-{self._id}] Expected sequence number set to {self._expected_sequence_number}"
-        )
+        self.logger.log_message(LogType.RECEIVE, "[RecvRequest-%s] Expected sequence number set to %d",
+                                self._id, self._expected_sequence_number)
 
     def get_expected_sequence_number(self):
         return self._expected_sequence_number
@@ -144,8 +171,24 @@ class RecvRequest:
         """
         Change the state of the recv_request.
         """
+        previous_state = self._state.__class__.__name__
         self._state = state
         if self._state.__class__.__name__ in {"ErrorState", "FinalState"}:
+            if self._timeout_handle is not None:
+                self._timeout_handle.cancel()
+            if self._state.__class__.__name__ == "FinalState":
+                MESSAGES.labels("rx", "success").inc()
+                if previous_state in {"FirstFrameState", "ConsecutiveFrameState"}:
+                    REASSEMBLY_SECONDS.observe(time.monotonic() - self._start_time)
+            else:
+                MESSAGES.labels("rx", "error").inc()
+            if self.correlation_id is not None:
+                tracing.record_span("isotp.reassembly", self._trace_start, correlation_id=self.correlation_id,
+                                    address=str(self._address), length=self._offset,
+                                    result=self._state.__class__.__name__)
+            if self._on_finished is not None:
+                on_finished, self._on_finished = self._on_finished, None
+                on_finished(self)
             self.logger.log_message(
                 log_type=LogType.RECEIVE,
                 message=f"[RecvRequest-{self._id}] State changed to {self._state.__class__.__name__}"
@@ -154,6 +197,13 @@ class RecvRequest:
     def get_state(self):
         return self._state.__class__.__name__
 
+    def _on_success_traced(self, message, address):
+        with tracing.span("isotp.on_recv_success", self.correlation_id, length=self._offset):
+            self._on_success_callback(message, address)
+
+    def is_finished(self) -> bool:
+        return self._state.__class__.__name__ in {"ErrorState", "FinalState"}
+
     def set_address(self, address: Address):
         self._address = address
         self.logger.log_message(
@@ -161,18 +211,26 @@ class RecvRequest:
             message=f"[RecvRequest-{self._id}] Address updated to {self._address}"
         )
 
-    def append_bits(self, bits: str):
+    def append_bits(self, bits: bitarray):
         """
         Append bits to the message.
         """
-        self._message.extend(bits)
-        self.logger.log_message(
-            log_type=LogType.RECEIVE,
-            message=f"[RecvRequest-{self._id}] Appended bits: 0x{bitarray(bits).tobytes().hex().upper()} | "
-                    f"Current message (HEX): 0x{self._message.tobytes().hex().upper()} | Length: {len(self._message)//8} bytes"
-        )
-
+        self.append_data(bits.tobytes())
 
+    def append_data(self, data: Union[bitarray, bytes, memoryview]):
+        """
+        Copy frame data to the current offset of the reassembly buffer.
+        """
+        if isinstance(data, bitarray):
+            data = data.tobytes()
+        end = self._offset + len(data)
+        if end > len(self._buffer):
+            # Data length unknown or exceeded, grow the buffer
+            self._buffer.extend(bytes(end - len(self._buffer)))
+        self._buffer[self._offset:end] = data
+        self._offset = end
+        self.logger.log_message(LogType.RECEIVE, "[RecvRequest-%s] Appended %d bytes | Length: %d/%d bytes",
+                                self._id, len(data), self._offset, self._data_length)
 
     def get_last_received_time(self):
         return self._last_received_time
@@ -181,7 +239,17 @@ class RecvRequest:
         """
         Starts a timer that monitors for timeouts.
         If no message is received within `self._timeout` milliseconds, an exception is raised.
+        With a shared timer service, the N_Cr deadline of this request is registered once and
+        only moved forward on later calls.
         """
+        if self._timer_service is not None:
+            if self._timeout == 0:
+                return
+            if self._timeout_handle is None:
+                self._timeout_handle = self._timer_service.schedule(self._timeout, self._on_timeout)
+            else:
+                self._timeout_handle.reset()
+            return
 
         def monitor_timeout():
             if self._timeout == 0:
@@ -198,6 +266,7 @@ class RecvRequest:
                     break
 
                 if elapsed_time_ms >= self._timeout:
+                    TIMEOUTS.labels("N_Cr").inc()
                     self.logger.log_message(
                         log_type=LogType.ERROR,
                         message=f"[RecvRequest-{self._id}] Timeout occurred after {elapsed_time_ms:.2f} ms"
@@ -214,11 +283,42 @@ class RecvRequest:
         Resets the timeout timer whenever a new message is received.
         """
         self._last_received_time = time.time()
-        self.logger.log_message(
-            log_type=LogType.RECEIVE,
-            message=f"[RecvRequest-{self._id}] Timeout timer reset"
-        )
+        if self._timeout_handle is not None:
+            self._timeout_handle.reset()
+        self.logger.log_message(LogType.RECEIVE, "[RecvRequest-%s] Timeout timer reset", self._id)
+
+    def _on_timeout(self):
+        """Called by the timer service when the N_Cr deadline expires."""
+        with self.lock:
+            if self.is_finished():
+                return
+            elapsed_time_ms = (time.time() - self._last_received_time) * 1000
+            TIMEOUTS.labels("N_Cr").inc()
+            self.logger.log_message(
+                log_type=LogType.ERROR,
+                message=f"[RecvRequest-{self._id}] Timeout occurred after {elapsed_time_ms:.2f} ms"
+            )
+            self.set_state(ErrorState())  # Transition to ErrorState
+        self.on_error(TimeoutException())
+
+
+    def process_consecutive(self, frame: memoryview) -> bool:
+        """
+        Fast path of process() for a consecutive frame, handled straight from the CAN payload
+        without building a ConsecutiveFrameMessage.
 
+        :param frame: The CAN payload, PCI byte included.
+        :return: False if the request is not waiting for consecutive frames; the frame must then
+                 go through decode_frame and process() to be rejected with the right error.
+        """
+        state = self._state
+        if type(state) is not ConsecutiveFrameState:
+            return False
+        try:
+            state.handle_payload(self, frame[0] & 0x0F, frame[1:])
+        except Exception as e:
+            self.logger.log_message(log_type=LogType.ERROR, message=f"{e}")
+        return True
 
     def process(self, frameMessage: FrameMessage):
         """
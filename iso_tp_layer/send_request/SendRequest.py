@@ -1,5 +1,6 @@
 import uuid
-from typing import Callable
+from functools import partial
+from typing import Callable, Union
 import threading
 import time
 from bitarray import bitarray
@@ -12,24 +13,47 @@ package_dir = os.path.abspath(os.path.join(package_dir, ".."))
 sys.path.append(package_dir)
 from iso_tp_layer.Address import Address
 from iso_tp_layer.Exceptions import MessageLengthExceededException, FlowStatusAbortException, \
-    InvalidFlowStatusException, TimeoutException
+    InvalidFlowStatusException, TimeoutException, TransmitQueueFullException
 from iso_tp_layer.frames.FlowStatus import FlowStatus
-from logger import Logger, LogType, ProtocolType
+from iso_tp_layer.TimerService import TimerService
+from iso_tp_layer.frames.FrameCodec import MAX_FRAME_LENGTH, FF_DL_MAX, CAN_FD_DATA_LENGTHS, encode_single, \
+    encode_first, encode_consecutive, first_frame_header_length, single_frame_capacity
+from iso_tp_layer.send_request.StminPacer import StminPacer
+from iso_tp_layer.BusLoadGovernor import BusLoadGovernor
+from iso_tp_layer.IsoTpMetrics import MESSAGES, FLOW_CONTROL_WAITS, TIMEOUTS
+from logger import get_logger, LogType, ProtocolType
+import tracing
 
+# Consecutive frames handed to the CAN layer in one batched call
+BATCH_FRAMES = 64
 
 
 class SendRequest:
 
     def __init__(self, txfn: Callable, rxfn: Callable, update_progress: Callable,
                  on_error: Callable, address: Address, timeout=0,
-                 stmin=0, block_size=0, tx_padding=0xFF):
+                 stmin=0, block_size=0, tx_padding=0xFF, timer_service: TimerService = None,
+                 wakefn: Callable = None, on_finished: Callable = None, tx_dl: int = 8,
+                 correlation_id: int = None, governor: BusLoadGovernor = None, batch_txfn: Callable = None):
+        if tx_dl not in CAN_FD_DATA_LENGTHS:
+            raise ValueError(f"Invalid TX_DL {tx_dl}, expected one of {CAN_FD_DATA_LENGTHS}.")
         self._id = str(uuid.uuid4())[:8]  # Assign a unique ID
         self._tx_padding = tx_padding  # Default padding value
         self._txfn = txfn
-        self._rxfn = rxfn
+        # Queues consecutive frames on the CAN transmit queue, optional:
+        # batch_txfn(address, frames, separation_time, initial_separation, on_complete) -> bool
+        self._batch_txfn = batch_txfn
+        self._batch_buffer = None  # Frames of one batch, allocated on the first batch
+        self._batch_failed = False
+        self._rxfn = rxfn  # Blocking read of the next control frame: rxfn(address, timeout_in_seconds)
+        self._wakefn = wakefn  # Wakes a blocked rxfn call: wakefn(address)
         self._update_progress = update_progress
-        self._on_error = on_error
-        self._stmin = stmin
+        self._error_callback = on_error
+        self._on_error = self._handle_error  # Every failure path goes through _handle_error
+        self._on_finished = on_finished  # Called once with this request when it completes or fails
+        self._stmin = stmin  # Raw STmin byte, decoded by the pacer
+        self._pacer = StminPacer(stmin)
+        self._governor = governor  # Adds separation time when the bus is busy, optional
         self._timeout = timeout
         self._block_size = block_size
         self._address = address
@@ -42,7 +66,15 @@ class SendRequest:
         self._received_error_frame = False  # New attribute for error frame tracking
         self._current_length = -1
         self._total_length = -1
-        self.logger = Logger(ProtocolType.ISO_TP)
+        self._first_frame_data_length = 6
+        self._timer_service = timer_service  # Shared deadline scheduler for the N_Bs timeout
+        self._control_frame_timed_out = False
+        self._frame_buffer = bytearray(MAX_FRAME_LENGTH)  # Reused for every frame of this request
+        self._tx_dl = tx_dl  # CAN frame length, 8 for classic CAN, up to 64 for CAN FD
+        self._cf_data_length = tx_dl - 1  # Data bytes per consecutive frame
+        self._correlation_id = correlation_id  # Tracing transaction, the frames sent by the listener threads join it
+        self._trace_start = tracing.now() if correlation_id is not None else 0
+        self.logger = get_logger(ProtocolType.ISO_TP)
         self.logger.log_message(
             log_type=LogType.SEND,
             message=f"SendRequest initialized: ID={self._id}, Address={self._address}, Timeout={self._timeout}, STmin={self._stmin}, BlockSize={self._block_size}"
@@ -60,17 +92,17 @@ class SendRequest:
     def has_received_error_frame(self):
         return self._received_error_frame
 
-    def send(self, data: bitarray):
+    def send(self, data: Union[bytes, bytearray, bitarray]):
         """Entry point to send data."""
         try:
-            self._data = data.tobytes()  # Set the class attribute
+            self._data = data.tobytes() if isinstance(data, bitarray) else bytes(data)  # Set the class attribute
             byte_length = len(self._data)
             self.logger.log_message(
                 log_type=LogType.SEND,
                 message=f"[SendRequest-{self._id}] Sending data of length {byte_length} bytes."
             )
 
-            if byte_length <= 7:
+            if byte_length <= single_frame_capacity(self._tx_dl):
                 self._send_single()
             else:
                 self._send_first()
@@ -81,15 +113,12 @@ class SendRequest:
     def _send_single(self):
         """Send a single frame message."""
         try:
-            first_byte = (0x0 << 4) | (len(self._data) & 0x0F)
-            frame = bytes([first_byte]) + self._data.ljust(7, self._tx_padding.to_bytes(1, 'little'))
-            hex_frame = frame.hex()
+            frame = encode_single(self._frame_buffer, self._data, self._tx_padding)
             self.logger.log_message(
                 log_type=LogType.SEND,
-                message=f"[SendRequest-{self._id}] Sending single frame - 0x{hex_frame}"
+                message=lambda: f"[SendRequest-{self._id}] Sending single frame - 0x{frame.hex()}"
             )
-            # print(f"Single frame (hex): {hex_frame}")
-            self._txfn(self._address, hex_frame)
+            self._txfn(self._address, frame)
 
             # PROGRESS BAR
             self._update_progress(1)
@@ -107,22 +136,19 @@ class SendRequest:
         """Send the first frame of a multi-frame message."""
         try:
             message_length = len(self._data)
-            if message_length > 4095:
-                # "Message length exceeds the maximum limit of 4095 bytes for ISO-TP."
+            if message_length > FF_DL_MAX:
+                # "Message length exceeds the maximum limit of 4294967295 bytes for ISO-TP."
                 raise MessageLengthExceededException()
             self._total_length = message_length
-            self._current_length = 6
-            first_byte = (0x1 << 4) | ((message_length >> 8) & 0x0F)
-            second_byte = message_length & 0xFF
-            first_frame_data = self._data[:6]
-            frame = bytes([first_byte, second_byte]) + first_frame_data
-            hex_frame = frame.hex()
+            # The first frame fills the whole TX_DL, minus the 2 or 6 (escape) header bytes
+            self._first_frame_data_length = self._tx_dl - first_frame_header_length(message_length)
+            self._current_length = self._first_frame_data_length
+            frame = encode_first(self._frame_buffer, message_length, self._data[:self._first_frame_data_length])
             self.logger.log_message(
                 log_type=LogType.SEND,
-                message=f"[SendRequest-{self._id}] Sending first frame - 0x{hex_frame}"
+                message=lambda: f"[SendRequest-{self._id}] Sending first frame - 0x{frame.hex()}"
             )
-            # print(f"First frame (hex): {hex_frame}")
-            self._txfn(self._address, hex_frame)
+            self._txfn(self._address, frame)
 
             # PROGRESS BAR
             self._update_progress(self._current_length/self._total_length)
@@ -142,9 +168,13 @@ class SendRequest:
 
     def _send_consecutive(self):
         """Send consecutive frames of a multi-frame message."""
+        if self._batch_txfn is not None:
+            self._send_consecutive_batch()
+            return
         try:
             if not self._remaining_data:
-                self._remaining_data = self._data[6:]  # Initialize with the remaining data after the first frame
+                # Initialize with the remaining data after the first frame, sliced without copying
+                self._remaining_data = memoryview(self._data)[self._first_frame_data_length:]
 
             self.logger.log_message(log_type=LogType.SEND,
                                     message=f"Starting consecutive frame transmission. Remaining data size: {len(self._remaining_data)} bytes.")
@@ -166,30 +196,26 @@ class SendRequest:
                     listener_thread.start()
                     return
 
-                if self._stmin > 0:
-                    self.logger.log_message(log_type=LogType.SEND,
-                                            message=f"Sleeping for {self._stmin / 1000.0} seconds before sending the next frame.")
-                    time.sleep(self._stmin / 1000.0)
+                # Waits until STmin (plus the governor's extra time) has elapsed since the previous consecutive frame
+                self._pacer.wait(self._governor.get_extra_stmin() if self._governor is not None else 0.0)
 
-                first_byte = (0x2 << 4) | (self._sequence_num & 0x0F)
-                frame = bytes([first_byte]) + self._remaining_data[self._index:self._index + 7].ljust(7,
-                                                                                                      self._tx_padding.to_bytes(
-                                                                                                          1, 'little'))
-                hex_frame = frame.hex()
+                frame = encode_consecutive(self._frame_buffer, self._sequence_num,
+                                           self._remaining_data[self._index:self._index + self._cf_data_length],
+                                           self._tx_padding)
 
                 self.logger.log_message(log_type=LogType.SEND,
-                                        message=f"Sending consecutive frame: 0x{hex_frame} (Sequence Num: {self._sequence_num})")
+                                        message=lambda: f"Sending consecutive frame: 0x{frame.hex()} (Sequence Num: {self._sequence_num})")
 
-                self._txfn(self._address, hex_frame)
+                self._txfn(self._address, frame)
 
                 # PROGRESS BAR
-                self._current_length += 7
+                self._current_length += self._cf_data_length
                 if self._current_length > self._total_length:
                     self._current_length = self._total_length
 
                 self._update_progress(self._current_length/self._total_length)
 
-                self._index += 7
+                self._index += self._cf_data_length
                 self._sequence_num = (self._sequence_num + 1) % 16
                 self._block_counter += 1
 
@@ -202,51 +228,148 @@ class SendRequest:
             self._on_error(e)
 
 
+    def _send_consecutive_batch(self):
+        """
+        Queue the consecutive frames of the current block on the CAN transmit queue, BATCH_FRAMES at a time.
+        The CAN writer thread keeps STmin (plus the governor's extra time) between them; the next block's
+        flow control is awaited, or the request ended, once the last frame of the block was sent.
+        """
+        try:
+            if not self._remaining_data:
+                self._remaining_data = memoryview(self._data)[self._first_frame_data_length:]
+            if self._batch_buffer is None:
+                self._batch_buffer = memoryview(bytearray(BATCH_FRAMES * MAX_FRAME_LENGTH))
+
+            data_length = len(self._remaining_data)
+            block_end = data_length
+            if self._block_size > 0:
+                block_end = min(data_length,
+                                self._index + (self._block_size - self._block_counter) * self._cf_data_length)
+            self.logger.log_message(log_type=LogType.SEND,
+                                    message=f"Queuing consecutive frames. Remaining data size: {data_length - self._index} bytes.")
+
+            first_batch = True
+            while self._index < block_end:
+                if self._received_error_frame or self._batch_failed:
+                    self.logger.log_message(log_type=LogType.ERROR,
+                                            message="Transmission stopped due to received error frame.")
+                    return
+                interval = self._pacer.get_interval()
+                if self._governor is not None:
+                    interval += self._governor.get_extra_stmin()
+
+                frames = []
+                offset = 0
+                while self._index < block_end and len(frames) < BATCH_FRAMES:
+                    frames.append(encode_consecutive(self._batch_buffer[offset:offset + MAX_FRAME_LENGTH],
+                                                     self._sequence_num,
+                                                     self._remaining_data[self._index:self._index + self._cf_data_length],
+                                                     self._tx_padding))
+                    offset += MAX_FRAME_LENGTH
+                    self._index += self._cf_data_length
+                    self._sequence_num = (self._sequence_num + 1) % 16
+                    self._block_counter += 1
+
+                sent_length = min(self._first_frame_data_length + self._index, self._total_length)
+                on_sent = partial(self._on_batch_sent, sent_length, self._index >= block_end,
+                                  self._index >= data_length)
+                # The first frame after a flow control frame is not delayed, see StminPacer.set_stmin
+                if not self._batch_txfn(self._address, frames, interval, 0.0 if first_batch else interval, on_sent):
+                    raise TransmitQueueFullException()
+                first_batch = False
+        except Exception as e:
+            self.logger.log_message(log_type=LogType.ERROR,
+                                    message=f"Error in _send_consecutive_batch: {e}")
+            self._batch_failed = True
+            self._on_error(e)
+
+    def _on_batch_sent(self, sent_length: int, end_of_block: bool, end_of_message: bool, error: Exception):
+        """Called from the CAN writer thread when a batch of consecutive frames was sent or given up."""
+        if self._batch_failed or self._received_error_frame:
+            return
+        if error is not None:
+            self._batch_failed = True
+            self.logger.log_message(log_type=LogType.ERROR,
+                                    message=f"[SendRequest-{self._id}] Consecutive frames not sent - {error}")
+            self._on_error(error)
+            return
+
+        # PROGRESS BAR
+        self._current_length = sent_length
+        self._update_progress(self._current_length / self._total_length)
+
+        if end_of_message:
+            self.logger.log_message(log_type=LogType.SEND,
+                                    message="All consecutive frames sent successfully. Ending request.")
+            self._end_request()
+        elif end_of_block:
+            self.logger.log_message(log_type=LogType.SEND,
+                                    message=f"Block size limit reached. Block size: {self._block_size}. Waiting for next control frame.")
+            threading.Thread(target=self.listen_for_control_frame, args=(self._reset_block_counter,),
+                             daemon=True).start()
+
     def listen_for_control_frame(self, callBackFn: Callable):
-        """Thread function to listen for control frames."""
+        """Thread function to wait for the next control frame and continue the transfer."""
+        if self._correlation_id is not None:
+            tracing.set_correlation_id(self._correlation_id)
         try:
             if self._received_error_frame:
                 return
             is_control_frame_received = False
             start_time = time.time()  # Record the start time
-            while not is_control_frame_received:
-                elapsed_time_ms = (time.time() - start_time) * 1000
-                if elapsed_time_ms > self._timeout:
-                    # "Timeout Elapsed!"
-                    raise TimeoutException()
-
-                control_frame = self._rxfn(self._address)
-                if not control_frame:
-                    # print("Still waiting for a valid control frame...")
-                    time.sleep(0.1)
-                    continue
-
-
-                flow_status = control_frame.flowStatus
-
-
-                block_size = control_frame.blockSize
-                stmin = control_frame.separationTime
-                self._stmin = stmin
-                self._block_size = block_size
-                self.logger.log_message(
-                    log_type=LogType.SEND,
-                    message=f"[SendRequest-{self._id}] Received flow control frame - Status={flow_status}, BlockSize={block_size}, STmin={stmin}"
-                )
-                if flow_status == FlowStatus.Continue:
-                    # print("Flow status: Continue to send.")
-                    is_control_frame_received = True
-                elif flow_status == FlowStatus.Wait:
-                    # print("Flow status: Wait.")
-                    while not is_control_frame_received:
-                        time.sleep(stmin / 1000.0)
+            timeout_handle = None
+            if self._timer_service is not None and self._timeout > 0:
+                self._control_frame_timed_out = False
+                timeout_handle = self._timer_service.schedule(self._timeout, self._on_control_frame_timeout)
+            try:
+                while not is_control_frame_received:
+                    if timeout_handle is not None:
+                        if self._control_frame_timed_out:
+                            # "Timeout Elapsed!"
+                            TIMEOUTS.labels("N_Bs").inc()
+                            raise TimeoutException()
+                        # The timer service wakes the wait when the N_Bs deadline expires
+                        wait_time = None
+                    else:
+                        elapsed_time_ms = (time.time() - start_time) * 1000
+                        if elapsed_time_ms > self._timeout:
+                            # "Timeout Elapsed!"
+                            TIMEOUTS.labels("N_Bs").inc()
+                            raise TimeoutException()
+                        wait_time = (self._timeout - elapsed_time_ms) / 1000.0
+
+                    control_frame = self._rxfn(self._address, wait_time)
+                    if self._received_error_frame:
+                        raise FlowStatusAbortException()
+                    if not control_frame:
+                        continue
+
+                    flow_status = control_frame.flowStatus
+                    self.logger.log_message(
+                        log_type=LogType.SEND,
+                        message=f"[SendRequest-{self._id}] Received flow control frame - Status={flow_status}, "
+                                f"BlockSize={control_frame.blockSize}, STmin={control_frame.separationTime}"
+                    )
+                    if flow_status == FlowStatus.Continue:
+                        self._stmin = control_frame.separationTime
+                        self._pacer.set_stmin(self._stmin)
+                        self._block_size = control_frame.blockSize
                         is_control_frame_received = True
-                elif flow_status == FlowStatus.Abort:
-                    # "Flow status: Abort received. Transmission terminated."
-                    raise FlowStatusAbortException()
-                else:
-                    # f"Invalid flow status received: {flow_status_value}"
-                    raise InvalidFlowStatusException(flow_status.value)
+                    elif flow_status == FlowStatus.Wait:
+                        # The receiver is not ready yet, wait for the next control frame with a fresh deadline
+                        FLOW_CONTROL_WAITS.inc()
+                        start_time = time.time()
+                        if timeout_handle is not None:
+                            timeout_handle.reset()
+                    elif flow_status == FlowStatus.Abort:
+                        # "Flow status: Abort received. Transmission terminated."
+                        raise FlowStatusAbortException()
+                    else:
+                        # f"Invalid flow status received: {flow_status_value}"
+                        raise InvalidFlowStatusException(flow_status.value)
+            finally:
+                if timeout_handle is not None:
+                    timeout_handle.cancel()
 
             if is_control_frame_received:
                 callBackFn()
@@ -256,15 +379,45 @@ class SendRequest:
                                     message=f"[SendRequest-{self._id}] Error in listen_for_control_frame - {e}")
             self._on_error(e)
 
+    def _on_control_frame_timeout(self):
+        """Called by the timer service when the N_Bs deadline expires."""
+        self._control_frame_timed_out = True
+        if self._wakefn is not None:
+            self._wakefn(self._address)
+
     def _reset_block_counter(self):
         """Callback function to reset the block counter and send consecutive frames."""
         self._block_counter = 0
         self._send_consecutive()
 
+    def _notify_finished(self):
+        if self._on_finished is not None:
+            on_finished, self._on_finished = self._on_finished, None
+            on_finished(self)
+
+    def _handle_error(self, e: Exception):
+        MESSAGES.labels("tx", "error").inc()
+        self._record_span("error")
+        self._notify_finished()
+        self._error_callback(e)
+
+    def _record_span(self, result: str):
+        if self._correlation_id is not None:
+            tracing.record_span("isotp.send", self._trace_start, correlation_id=self._correlation_id,
+                                address=str(self._address), length=len(self._data), result=result)
+
+    def get_pacing_statistics(self) -> dict:
+        """Return the measured consecutive frame gaps and jitter against STmin."""
+        return self._pacer.get_statistics()
+
     def _end_request(self):
         self._isFinished = True
+        MESSAGES.labels("tx", "success").inc()
+        self._record_span("success")
+        self._notify_finished()
         self.logger.log_message(log_type=LogType.SEND,
-                                message=f"[SendRequest-{self._id}] Request completed successfully.")
+                                message=f"[SendRequest-{self._id}] Request completed successfully. "
+                                        f"Pacing: {self._pacer.get_statistics()}")
 
 
         # self._update_progress()
@@ -0,0 +1,91 @@
+import time
+from typing import Dict
+
+
+def decode_stmin(value: int) -> float:
+    """
+    Decode an STmin byte as defined by ISO 15765-2.
+
+    :param value: Raw STmin byte of a flow control frame.
+    :return: The separation time in seconds. 0x00-0x7F are milliseconds, 0xF1-0xF9 are
+             100-900 microseconds; reserved values are treated as the maximum, 127 ms.
+    """
+    if 0x00 <= value <= 0x7F:
+        return value / 1000.0
+    if 0xF1 <= value <= 0xF9:
+        return (value - 0xF0) / 10000.0
+    return 0x7F / 1000.0
+
+
+class StminPacer:
+    """
+    Paces consecutive frames so that at least STmin elapses between two transmissions.
+
+    The next frame is due at a monotonic deadline (last transmission + STmin). The pacer sleeps
+    until shortly before the deadline, then spins for the remainder, which avoids the 50-100 us
+    (or more) overshoot of a plain time.sleep. The measured gaps are kept to report jitter.
+    """
+
+    def __init__(self, stmin: int = 0, spin_threshold: float = 0.0005):
+        """
+        :param stmin: Raw STmin byte.
+        :param spin_threshold: Time in seconds before the deadline at which sleeping stops and
+                               busy waiting starts.
+        """
+        self._spin_threshold = spin_threshold
+        self._interval = decode_stmin(stmin)
+        self._last_sent = None
+        self._gaps = 0
+        self._gap_sum = 0.0
+        self._overshoot_sum = 0.0
+        self._overshoot_max = 0.0
+        self._gap_min = None
+
+    def set_stmin(self, stmin: int):
+        """Apply the STmin of a new flow control frame; the next frame is not delayed."""
+        self._interval = decode_stmin(stmin)
+        self._last_sent = None
+
+    def get_interval(self) -> float:
+        return self._interval
+
+    def wait(self, extra: float = 0.0):
+        """
+        Block until the next frame may be sent, then record its transmission time.
+        :param extra: Separation time in seconds added to STmin for this frame, e.g. by a bus load governor.
+        """
+        now = time.perf_counter()
+        interval = self._interval + extra
+        if self._last_sent is not None and interval > 0:
+            deadline = self._last_sent + interval
+            remaining = deadline - now
+            if remaining > self._spin_threshold:
+                time.sleep(remaining - self._spin_threshold)
+            now = time.perf_counter()
+            while now < deadline:
+                now = time.perf_counter()
+            self._record(now - self._last_sent, interval)
+        self._last_sent = now
+
+    def _record(self, gap: float, interval: float):
+        overshoot = gap - interval
+        self._gaps += 1
+        self._gap_sum += gap
+        self._overshoot_sum += overshoot
+        if overshoot > self._overshoot_max:
+            self._overshoot_max = overshoot
+        if self._gap_min is None or gap < self._gap_min:
+            self._gap_min = gap
+
+    def get_statistics(self) -> Dict:
+        """Return the measured inter-frame gaps and their deviation from STmin, in microseconds."""
+        if not self._gaps:
+            return {"gaps": 0, "stmin_us": self._interval * 1e6}
+        return {
+            "gaps": self._gaps,
+            "stmin_us": self._interval * 1e6,
+            "mean_gap_us": self._gap_sum / self._gaps * 1e6,
+            "min_gap_us": self._gap_min * 1e6,
+            "mean_jitter_us": self._overshoot_sum / self._gaps * 1e6,
+            "max_jitter_us": self._overshoot_max * 1e6,
+        }
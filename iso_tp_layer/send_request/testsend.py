@@ -16,17 +16,17 @@ def mock_txfn(frame, message):
 
 
 # Mock receive functions
-def mock_rxfn_continue(address: Address):
+def mock_rxfn_continue(address: Address, timeout=None):
     """Simulating a Flow Control frame with Continue (0x30), BlockSize = 3, STmin = 5ms."""
     return bytes([0x30, 3, 5])
 
 
-def mock_rxfn_wait(address: Address):
+def mock_rxfn_wait(address: Address, timeout=None):
     """Simulating a Flow Control frame with Wait (0x31), BlockSize = 0, STmin = 10ms."""
     return bytes([0x31, 2, 10])
 
 
-def mock_rxfn_abort(address: Address):
+def mock_rxfn_abort(address: Address, timeout=None):
     """Simulating a Flow Control frame with Abort (0x32), BlockSize = 0, STmin = 0."""
     return bytes([0x32, 0x00, 0x00])
 
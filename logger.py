@@ -1,6 +1,11 @@
+import atexit
 import logging
 import os
+import queue
+import threading
+import time
 from enum import Enum
+from typing import Callable, Union
 
 
 class LogType(Enum):
@@ -23,76 +28,253 @@ class ProtocolType(Enum):
     HMI_CLIENT="HMI-CLIENT"
 
 
-class Logger:
-    def __init__(self, protocol: ProtocolType):
-        """
-        Initialize a logger with a separate directory and log files for the chosen protocol.
+# Level of every log type; messages below the active level are dropped before formatting
+_LOG_TYPE_LEVELS = {
+    LogType.DEBUG: logging.DEBUG,
+    LogType.WARNING: logging.WARNING,
+    LogType.ERROR: logging.ERROR,
+}
 
-        Args:
-            protocol (ProtocolType): The selected protocol (ISO-TP, UDS, CAN).
-        """
-        self.protocol = protocol.value  # Store protocol name as a string
+# Everything is written by default, like before the levels existed; performance sensitive
+# callers opt into logging.INFO or above with set_log_level
+_log_level = logging.DEBUG
+
+
+def set_log_level(level: int):
+    """
+    Set the minimum level (logging.DEBUG, logging.INFO, ...) of the messages that are written.
+    LogType.DEBUG messages are DEBUG, WARNING and ERROR match their name, all other types are INFO.
+    """
+    global _log_level
+    _log_level = level
+
+
+def get_log_level() -> int:
+    return _log_level
+
+
+class _BatchFileHandler(logging.FileHandler):
+    """File handler that leaves flushing to the writer thread, which flushes once per batch."""
+
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+
+class _BatchStreamHandler(logging.StreamHandler):
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+
+class _LogWriter:
+    """
+    Single background thread that performs the I/O of all loggers.
+
+    log_message only puts (logger, level, text, time) on a SimpleQueue; the writer drains the
+    queue in batches, emits the records and flushes every touched handler once per batch.
+    """
+
+    BATCH_SIZE = 512
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def put(self, logger: logging.Logger, level: int, text: str):
+        if self._thread is None:
+            self._start()
+        self._queue.put((logger, level, text, time.time()))
+
+    def flush(self, timeout: float = 5.0):
+        """Wait until every queued record has been written."""
+        if self._thread is not None:
+            done = threading.Event()
+            self._queue.put(done)  # Set by the writer once everything queued before it is written
+            done.wait(timeout)
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="LogWriter")
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < self.BATCH_SIZE:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            handlers = set()
+            markers = []
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    markers.append(item)
+                    continue
+                logger, level, text, created = item
+                record = logger.makeRecord(logger.name, level, "", 0, text, None, None)
+                record.created = created
+                record.msecs = (created - int(created)) * 1000
+                try:
+                    logger.handle(record)
+                except Exception:
+                    pass
+                handlers.update(logger.handlers)
+            for handler in handlers:
+                try:
+                    getattr(handler, "flush_batch", handler.flush)()
+                except Exception:
+                    pass
+            for marker in markers:
+                marker.set()
 
-        # Define log directory based on protocol
+
+_writer = _LogWriter()
+
+
+def flush_logs(timeout: float = 5.0):
+    """Block until all messages logged so far are written to their files."""
+    _writer.flush(timeout)
+
+
+class _ProtocolSinks:
+    """The standard library loggers (and their handlers) of one protocol, built once per process."""
+
+    def __init__(self, protocol: str, shared_handlers: list):
         current_dir = os.path.dirname(os.path.abspath(__file__))
-        self.log_directory = os.path.join(current_dir, "logs", self.protocol)
+        self.log_directory = os.path.join(current_dir, "logs", protocol)
         self.success_log = os.path.join(self.log_directory, "success.log")
         self.error_log = os.path.join(self.log_directory, "error.log")
-        self.communication_log = os.path.join(current_dir, "logs", "general_logs.log")
 
         # **Ensure the log directory exists before creating loggers**
-        self._create_log_structure()
-
-        # Create separate loggers for each protocol instance
-        self.success_logger = self._create_logger(f"{self.protocol}_success", self.success_log, logging.INFO, False)
-        self.error_logger = self._create_logger(f"{self.protocol}_error", self.error_log, logging.ERROR, False)
-        self.communication_logger = self._create_logger(f"{self.protocol}_communication", self.communication_log, logging.INFO, True)
-
-    def _create_log_structure(self):
-        """Create the log directory structure for the protocol."""
         os.makedirs(self.log_directory, exist_ok=True)
 
+        self.success_logger = self._create_logger(f"{protocol}_success", logging.INFO,
+                                                  [self._file_handler(self.success_log)])
+        self.error_logger = self._create_logger(f"{protocol}_error", logging.ERROR,
+                                                [self._file_handler(self.error_log)])
+        # The general log file and the console are shared by all protocols
+        self.communication_logger = self._create_logger(f"{protocol}_communication", logging.INFO, shared_handlers)
+
+    @staticmethod
+    def _file_handler(filename: str) -> logging.Handler:
+        # Flushed by the writer thread
+        handler = _BatchFileHandler(filename)
+        handler.setFormatter(_FORMATTER)
+        return handler
 
-    def _create_logger(self, name: str, filename: str, level: int, add_console: bool) -> logging.Logger:
-        """Create a unique logger for each protocol instance."""
+    @staticmethod
+    def _create_logger(name: str, level: int, handlers: list) -> logging.Logger:
         logger = logging.getLogger(name)
         logger.setLevel(level)
 
-        # Remove existing handlers if re-initialized
-        if logger.hasHandlers():
-            logger.handlers.clear()
+        # Handlers left by another configuration of the same name are closed, not leaked
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
+        for handler in handlers:
+            logger.addHandler(handler)
+        return logger
 
-        formatter = logging.Formatter('%(asctime)s - %(message)s', datefmt="%Y-%m-%d %H:%M:%S")
 
-        # File handler (this now works since directory exists)
-        file_handler = logging.FileHandler(filename)
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+_FORMATTER = logging.Formatter('%(asctime)s - %(message)s', datefmt="%Y-%m-%d %H:%M:%S")
+_registry_lock = threading.Lock()
+_sinks = {}  # ProtocolType -> _ProtocolSinks
+_shared_handlers = []  # General log file handler and console handler
+_loggers = {}  # ProtocolType -> Logger, returned by get_logger
 
-        # Console handler (only for communication log)
-        if add_console:
-            console_handler = logging.StreamHandler()
-            console_handler.setFormatter(formatter)
-            logger.addHandler(console_handler)
 
-        return logger
+def _get_sinks(protocol: ProtocolType) -> _ProtocolSinks:
+    sinks = _sinks.get(protocol)
+    if sinks is not None:
+        return sinks
+    with _registry_lock:
+        sinks = _sinks.get(protocol)
+        if sinks is None:
+            if not _shared_handlers:
+                current_dir = os.path.dirname(os.path.abspath(__file__))
+                os.makedirs(os.path.join(current_dir, "logs"), exist_ok=True)
+                communication_handler = _BatchFileHandler(os.path.join(current_dir, "logs", "general_logs.log"))
+                communication_handler.setFormatter(_FORMATTER)
+                console_handler = _BatchStreamHandler()
+                console_handler.setFormatter(_FORMATTER)
+                _shared_handlers.extend([communication_handler, console_handler])
+            sinks = _ProtocolSinks(protocol.value, _shared_handlers)
+            _sinks[protocol] = sinks
+    return sinks
+
+
+def get_logger(protocol: ProtocolType) -> "Logger":
+    """Return the process-wide Logger of a protocol."""
+    logger = _loggers.get(protocol)
+    if logger is None:
+        logger = _loggers.setdefault(protocol, Logger(protocol))
+    return logger
+
 
-    def log_message(self, log_type: LogType, message: str):
+class Logger:
+    def __init__(self, protocol: ProtocolType):
+        """
+        Initialize a logger writing to the directory and log files of the chosen protocol.
+
+        The files and handlers are opened once per protocol and process and shared by every
+        Logger of that protocol, so creating a Logger is cheap.
+
+        Args:
+            protocol (ProtocolType): The selected protocol (ISO-TP, UDS, CAN).
+        """
+        self.protocol = protocol.value  # Store protocol name as a string
+
+        sinks = _get_sinks(protocol)
+        self.log_directory = sinks.log_directory
+        self.success_log = sinks.success_log
+        self.error_log = sinks.error_log
+        self.communication_log = _shared_handlers[0].baseFilename
+        self.success_logger = sinks.success_logger
+        self.error_logger = sinks.error_logger
+        self.communication_logger = sinks.communication_logger
+
+    def is_enabled(self, log_type: LogType) -> bool:
+        """Return True if messages of this type are currently written."""
+        return _LOG_TYPE_LEVELS.get(log_type, logging.INFO) >= _log_level
+
+    def log_message(self, log_type: LogType, message: Union[str, Callable[[], str]], *args):
         """
         Logs a message in the format:
         YYYY-MM-DD HH:MM:SS - PROTOCOL - LOG_TYPE - message
 
+        The message is only formatted if its type is enabled, and the file writes happen on
+        the background writer thread.
+
         Args:
             log_type (LogType): Type of log message.
-            message (str): The actual log message.
+            message: The actual log message, a %-style format string used with `args`, or a
+                     callable returning the message (e.g. a lambda building an expensive hex dump).
+            args: Arguments of a %-style format string.
         """
+        level = _LOG_TYPE_LEVELS.get(log_type, logging.INFO)
+        if level < _log_level:
+            return
+        if callable(message):
+            message = message()
+        elif args:
+            message = message % args
         formatted_message = f"{self.protocol} - {log_type.name} - {message}"
 
         # Log to respective log files
         if log_type == LogType.ERROR:
-            self.error_logger.error(formatted_message)
+            _writer.put(self.error_logger, logging.ERROR, formatted_message)
         else:
-            self.success_logger.info(formatted_message)
+            _writer.put(self.success_logger, logging.INFO, formatted_message)
 
         # Always log to communication.log and print once
-        self.communication_logger.info(formatted_message)
+        _writer.put(self.communication_logger, logging.INFO, formatted_message)
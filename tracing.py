@@ -0,0 +1,188 @@
+"""
+Optional latency tracing across the CAN, ISO-TP and UDS layers.
+
+Spans are timed sections of work tagged with a correlation ID. The ID is created when a frame
+is received (or a UDS request is sent) and carried through the layers, so that all the spans of
+one transaction can be followed from the CAN receive loop up to the UDS handler. Finished spans
+are kept in memory and exported as Chrome trace-event JSON (chrome://tracing, Perfetto).
+
+Tracing is disabled by default. The layers check the module-level ENABLED flag before doing any
+work, so a disabled tracer costs one attribute read per call site.
+"""
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+ENABLED = False
+
+_correlation_ids = itertools.count(1)
+_spans: deque = deque(maxlen=100000)
+_context = threading.local()
+
+
+class Span:
+    __slots__ = ("name", "start_ns", "end_ns", "correlation_id", "thread_id", "thread_name", "args")
+
+    def __init__(self, name: str, start_ns: int, end_ns: int, correlation_id: Optional[int], args: Dict):
+        self.name = name
+        self.start_ns = start_ns
+        self.end_ns = end_ns
+        self.correlation_id = correlation_id
+        thread = threading.current_thread()
+        self.thread_id = thread.ident
+        self.thread_name = thread.name
+        self.args = args
+
+    def duration_ns(self) -> int:
+        return self.end_ns - self.start_ns
+
+
+def enable(max_spans: int = 100000):
+    """Start recording spans, keeping at most `max_spans` (the oldest are dropped first)."""
+    global ENABLED, _spans
+    if _spans.maxlen != max_spans:
+        _spans = deque(_spans, maxlen=max_spans)
+    ENABLED = True
+
+
+def disable():
+    """Stop recording spans; the spans recorded so far are kept until clear()."""
+    global ENABLED
+    ENABLED = False
+
+
+def clear():
+    _spans.clear()
+
+
+def now() -> int:
+    """Current time in nanoseconds on the clock used by the spans."""
+    return time.perf_counter_ns()
+
+
+def new_correlation_id() -> int:
+    return next(_correlation_ids)
+
+
+def get_correlation_id() -> Optional[int]:
+    """Return the correlation ID of the work running on the current thread, if any."""
+    return getattr(_context, "correlation_id", None)
+
+
+def set_correlation_id(correlation_id: Optional[int]) -> Optional[int]:
+    """
+    Set the correlation ID of the work running on the current thread.
+
+    :return: The previous correlation ID, to be restored when the work is done.
+    """
+    previous = getattr(_context, "correlation_id", None)
+    _context.correlation_id = correlation_id
+    return previous
+
+
+def record_span(name: str, start_ns: int, end_ns: Optional[int] = None, correlation_id: Optional[int] = None,
+                **args):
+    """
+    Record a finished span.
+
+    :param name: Span name, e.g. "isotp.reassembly".
+    :param start_ns: Start time from now().
+    :param end_ns: End time from now(), the current time if None.
+    :param correlation_id: Transaction the span belongs to, the current thread's if None.
+    :param args: Extra values shown with the span.
+    """
+    if not ENABLED:
+        return
+    if end_ns is None:
+        end_ns = time.perf_counter_ns()
+    if correlation_id is None:
+        correlation_id = getattr(_context, "correlation_id", None)
+    _spans.append(Span(name, start_ns, end_ns, correlation_id, args))
+
+
+class span:
+    """
+    Context manager timing a block of code as a span.
+
+    The correlation ID (a new one if `correlation_id` is None and the thread has none, or if
+    `new_transaction` is set) is the thread's current ID for the duration of the block. When
+    tracing is disabled nothing is recorded.
+    """
+    __slots__ = ("_name", "_correlation_id", "_new_transaction", "_args", "_start", "_previous")
+
+    def __init__(self, name: str, correlation_id: Optional[int] = None, new_transaction: bool = False, **args):
+        self._name = name
+        self._correlation_id = correlation_id
+        self._new_transaction = new_transaction
+        self._args = args
+        self._start = 0
+
+    def __enter__(self):
+        if ENABLED:
+            if self._correlation_id is None:
+                self._correlation_id = (None if self._new_transaction else get_correlation_id()) \
+                                       or new_correlation_id()
+            self._previous = set_correlation_id(self._correlation_id)
+            self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._start:
+            if exc_type is not None:
+                self._args["error"] = repr(exc_val)
+            record_span(self._name, self._start, correlation_id=self._correlation_id, **self._args)
+            set_correlation_id(self._previous)
+        return False
+
+    @property
+    def correlation_id(self) -> Optional[int]:
+        return self._correlation_id
+
+
+def get_spans(correlation_id: Optional[int] = None) -> List[Span]:
+    """Return the recorded spans, optionally only those of one correlation ID, in start order."""
+    spans = [recorded for recorded in list(_spans)
+             if correlation_id is None or recorded.correlation_id == correlation_id]
+    spans.sort(key=lambda recorded: recorded.start_ns)
+    return spans
+
+
+def export_chrome_trace(path: str):
+    """
+    Write the recorded spans as Chrome trace-event JSON.
+
+    Each span is a complete ("X") event on its thread; the spans of one correlation ID are linked
+    by flow events, so a transaction can be followed across threads in the viewer.
+    """
+    pid = os.getpid()
+    events = []
+    thread_names = {}
+    last_span_by_correlation = {}
+    for recorded in get_spans():
+        thread_names[recorded.thread_id] = recorded.thread_name
+        args = dict(recorded.args)
+        args["correlation_id"] = recorded.correlation_id
+        timestamp = recorded.start_ns / 1000.0
+        events.append({"name": recorded.name, "cat": recorded.name.split(".")[0], "ph": "X", "ts": timestamp,
+                       "dur": recorded.duration_ns() / 1000.0, "pid": pid, "tid": recorded.thread_id,
+                       "args": args})
+        if recorded.correlation_id is None:
+            continue
+        previous = last_span_by_correlation.get(recorded.correlation_id)
+        if previous is not None:
+            flow = {"name": "transaction", "cat": "flow", "id": recorded.correlation_id, "pid": pid}
+            events.append(dict(flow, ph="s", ts=previous.start_ns / 1000.0, tid=previous.thread_id))
+            events.append(dict(flow, ph="f", bp="e", ts=timestamp, tid=recorded.thread_id))
+        last_span_by_correlation[recorded.correlation_id] = recorded
+    for thread_id, thread_name in thread_names.items():
+        events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": thread_id,
+                       "args": {"name": thread_name}})
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as file:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
@@ -9,7 +9,7 @@ from uds_layer.uds_enums import CommunicationControlSubFunction, CommunicationCo
 from uds_layer.operation import Operation
 from uds_layer.transfer_request import TransferRequest
 from uds_layer.transfer_enums import CheckSumMethod, TransferStatus, EncryptionMethod, CompressionMethod, FlashingECUStatus
-from logger import Logger, LogType, ProtocolType
+from logger import get_logger, LogType, ProtocolType
 import zlib  # For CRC32 calculation
 from crccheck.crc import Crc16
 from hex_parser.SRecordParser import DataRecord
@@ -27,7 +27,7 @@ class Server:
         self._p2_star_timing = 0
         self.transfer_requests: List[TransferRequest] = []
         self.Flash_ECU_Segments_Request: List[FlashingECU] = []
-        self._logger = Logger(ProtocolType.UDS)
+        self._logger = get_logger(ProtocolType.UDS)
         self.clientSend:Callable=client_send
         self.client_Segment_send:Callable=client_Segment_send
         self._ID=Server.server_request+1000
@@ -1,7 +1,7 @@
 from typing import Optional
 import math
 from uds_layer.transfer_enums import EncryptionMethod,CompressionMethod, TransferStatus
-from logger import Logger, LogType, ProtocolType
+from logger import get_logger, LogType, ProtocolType
 from uds_layer.FlashingECU import FlashingECU, FlashingECUStatus
 
 class TransferRequest:
@@ -33,7 +33,7 @@ class TransferRequest:
         self.checksum_value: Optional[int] = None
         self.status = TransferStatus.CREATED
         self.NRC: Optional[int] = None
-        self._logger = Logger(ProtocolType.UDS)
+        self._logger = get_logger(ProtocolType.UDS)
 
 
         self.current_trans_ind=0
@@ -1,6 +1,7 @@
-from time import sleep
+from collections import deque
+from time import sleep, perf_counter
 from bitarray import bitarray
-from typing import Callable, List, Optional, Tuple
+from typing import Callable, List, Optional, Tuple, Union
 import sys
 import os
 from uds_layer.transfer_enums import TransferStatus, EncryptionMethod, CompressionMethod, CheckSumMethod, FlashingECUStatus
@@ -11,11 +12,21 @@ sys.path.append(package_dir)
 from uds_layer.server import Server
 from uds_layer.operation import Operation
 from uds_layer.uds_enums import SessionType, OperationStatus, OperationType
-from logger import Logger, LogType, ProtocolType
+from logger import get_logger, LogType, ProtocolType
+from metrics import counter, histogram
+import tracing
 from iso_tp_layer.Address import Address
 from uds_layer.FlashingECU import FlashingECU
 from hex_parser.SRecordParser import DataRecord
 from compressor.compressor import Compressor,CompressionAlgorithm
+RESPONSE_SECONDS = histogram("uds_response_seconds", "Time from a UDS request to its final response",
+                             ("sid", "nrc"))
+RESPONSE_PENDING = counter("uds_response_pending_total", "NRC 0x78 (response pending) responses received", ("sid",))
+UNSOLICITED_RESPONSES = counter("uds_unsolicited_responses_total", "UDS responses without a pending request")
+
+# Services whose second byte is a sub-function, bit 7 of which suppresses the positive response
+_SUBFUNCTION_SERVICES = {0x10, 0x11, 0x27, 0x28, 0x31, 0x3E, 0x85, 0x87}
+
 # class Address:
 #     def __init__(self, addressing_mode: int = 0, txid: Optional[int] = None, rxid: Optional[int] = None):
 #         self.addressing_mode = addressing_mode
@@ -29,7 +40,8 @@ class UdsClient:
         self._servers: List[Server] = []
         self._pending_servers: List[Server] = []
         self._isotp_send: Callable = None
-        self._logger = Logger(ProtocolType.UDS)
+        self._logger = get_logger(ProtocolType.UDS)
+        self._request_times = {}  # SID -> send times of the requests waiting for a response, oldest first
         self.num:int=0
         self._logger.log_message(
             log_type=LogType.INITIALIZATION,
@@ -60,6 +72,25 @@ class UdsClient:
             log_type=LogType.ACKNOWLEDGMENT,
             message=f"[REQ-{server.current_req_id}] to add Server with DA: {hex(address._rxid)} and open session control : {session_type.name} send successfully with message:{[hex(x) for x in message]}")
 
+    def remove_server(self, server_can_id: int) -> bool:
+        """Forget a server (connected or pending). Return False if it is not known."""
+        server = self._find_server_by_can_id(server_can_id, self._servers)
+        server_list = self._servers
+        if server is None:
+            server = self._find_server_by_can_id(server_can_id, self._pending_servers)
+            server_list = self._pending_servers
+        if server is None:
+            return False
+        server_list.remove(server)
+        self._logger.log_message(
+            log_type=LogType.ACKNOWLEDGMENT,
+            message=f"Server with DA: {hex(server_can_id)} removed")
+        return True
+
+    def _server_address(self, server_can_id: int) -> Address:
+        """ISO-TP address of the requests to a server, its responses come to the client's ID."""
+        return Address(addressing_mode=0, txid=self._client_id, rxid=server_can_id)
+
     def process_message(self, address: Address, data: bytearray):
         
         self._logger.log_message(
@@ -236,28 +267,56 @@ class UdsClient:
         # Convert the bitarray to bytes and then to bytearray
         return bytearray(bits.tobytes())
 
-    def receive_message(self, data: bitarray, address: Address):
+    def _observe_response(self, data: bytes):
+        """Record the round-trip time of the request answered by `data`."""
+        if not data:
+            return
+        if data[0] == 0x7F:
+            if len(data) < 3:
+                return
+            service_id, nrc = data[1], f"0x{data[2]:02X}"
+            if data[2] == 0x78:
+                RESPONSE_PENDING.labels(f"0x{service_id:02X}").inc()
+                return  # The final response is still to come
+        elif data[0] >= 0x40:
+            service_id, nrc = data[0] - 0x40, "none"
+        else:
+            return
+        pending = self._request_times.get(service_id)
+        if not pending:
+            UNSOLICITED_RESPONSES.inc()
+            return
+        RESPONSE_SECONDS.labels(f"0x{service_id:02X}", nrc).observe(perf_counter() - pending.popleft())
+
+    def receive_message(self, data: Union[bitarray, memoryview], address: Address):
         data = data.tobytes()
-        self.process_message(address, data)
+        self._observe_response(data)
+        if tracing.ENABLED:
+            # Joins the transaction of the ISO-TP message, the span covers the Server handlers
+            with tracing.span("uds.process_message", sid=data[0] if data else None):
+                self.process_message(address, data)
+        else:
+            self.process_message(address, data)
         self._logger.log_message(
             log_type=LogType.ACKNOWLEDGMENT,
-            message=f"Message {hex(data)} received successfully")
+            message=lambda: f"Message 0x{data.hex()} received successfully")
 
     def send_message(self, server_can_id: int, message: List[int]):
-        address = Address(addressing_mode=0, txid=self._client_id, rxid=server_can_id)
-
-        if len(message) <= 4095:
-            message = bytearray(message)
-            # message=self.append_diagnostic_address(server_can_id=server_can_id,message=message)
-
-            self._isotp_send(message, address, self.on_success_send, self.on_fail_send)
+        address = self._server_address(server_can_id)
+
+        # Messages above 4095 bytes are sent as one ISO-TP message using the 32-bit First Frame length
+        message = bytearray(message)
+        if message and not (len(message) > 1 and message[0] in _SUBFUNCTION_SERVICES and message[1] & 0x80):
+            self._request_times.setdefault(message[0], deque(maxlen=64)).append(perf_counter())
+        # message=self.append_diagnostic_address(server_can_id=server_can_id,message=message)
+
+        if tracing.ENABLED:
+            # Every request starts a transaction, also when sent from the handler of a response
+            with tracing.span("uds.send_message", new_transaction=True, sid=message[0] if message else None,
+                              server=f"0x{server_can_id:X}"):
+                self._isotp_send(message, address, self.on_success_send, self.on_fail_send)
         else:
-            # Split message into chunks of 4095 bytes
-            for i in range(0, len(message), 4095):
-                chunk = message[i:i + 4095]
-                message = bytearray(message)
-                # chunk=self.append_diagnostic_address(server_can_id=server_can_id,message=chunk)
-                self._isotp_send(chunk, address, self.on_success_send, self.on_fail_send)
+            self._isotp_send(message, address, self.on_success_send, self.on_fail_send)
 
         self._logger.log_message(
             log_type=LogType.ACKNOWLEDGMENT,